@@ -0,0 +1,242 @@
+"""
+ASGI: the async front door for the web app 🚪
+
+Under plain gunicorn every request owns a worker thread from start to
+finish, so a Spotify call taking its sweet time parks that thread for the
+duration. Here the event loop does the waiting:
+
+1. A request comes in. If it's going to call integrations (see
+   ``main.providers_needed``), they're fetched right here on the loop with
+   the assistant's native async provider methods. Thousands of these can be
+   in flight at once, each costing a coroutine rather than a thread.
+2. The Flask view then runs on a small thread pool with those answers
+   already in hand (``main.PREFETCHED_ENVIRON_KEY``). The view only does
+   milliseconds of CPU work, so a few threads serve a lot of traffic.
+
+Every route, cookie and error page is still the Flask app's - this module
+only bridges ASGI to WSGI and moves the network waits onto the loop.
+
+Serve it with:
+    gunicorn -k uvicorn.workers.UvicornWorker asgi:app
+    uvicorn asgi:app --port 5000
+
+The CLI (``python main.py cli`` / ``DigitalDetoxAssistant.run()``) doesn't
+touch any of this.
+"""
+import asyncio
+import io
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs
+
+from main import (PREFETCHED_ENVIRON_KEY, SESSION_COOKIE, DigitalDetoxAssistant, app as flask_app,
+                  providers_needed, sessions)
+from metrics import register_collector
+from providers import default_clients
+from sessions import InMemorySessionStore
+
+# Threads running Flask views - they no longer wait on integrations, so a few go a long way
+FLASK_THREADS = int(os.environ.get("DETOX_ASGI_THREADS", "32"))
+# Bodies up to this size are read before the view runs (to see which integrations a form wants);
+# bigger ones, like usage uploads, are streamed to the view as they arrive
+PEEK_BODY_BYTES = 64 * 1024
+READ_BUFFER_BYTES = 64 * 1024
+
+_flask_pool = ThreadPoolExecutor(max_workers=FLASK_THREADS, thread_name_prefix="flask")
+_counters = {"requests": 0, "in_flight": 0, "prefetches": 0}
+
+
+class _RequestBody(io.RawIOBase):
+    """wsgi.input for a view on a worker thread: pulls body chunks from the event loop on demand."""
+
+    def __init__(self, receive, loop, body: bytes = b"", more_body: bool = True):
+        self._receive = receive
+        self._loop = loop
+        self._chunk = memoryview(body)
+        self._more = more_body
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._chunk and self._more:
+            message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+            if message["type"] == "http.disconnect":
+                self._more = False
+            else:
+                self._chunk = memoryview(message.get("body", b""))
+                self._more = message.get("more_body", False)
+        count = min(len(buffer), len(self._chunk))
+        buffer[:count] = self._chunk[:count]
+        self._chunk = self._chunk[count:]
+        return count
+
+
+def _environ(scope: dict, body_stream) -> dict:
+    """A PEP 3333 environ for an ASGI http scope."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client")
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin-1"),
+        "PATH_INFO": scope["path"].encode().decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "REMOTE_ADDR": client[0] if client else "",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body_stream,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for raw_name, raw_value in scope["headers"]:
+        name, value = raw_name.decode("latin-1").upper().replace("-", "_"), raw_value.decode("latin-1")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = "HTTP_" + name
+        if name in environ:
+            value = environ[name] + ("; " if name == "HTTP_COOKIE" else ",") + value
+        environ[name] = value
+    if "CONTENT_LENGTH" not in environ:
+        environ["wsgi.input_terminated"] = True  # Chunked upload - read until the body ends
+    return environ
+
+
+def _params(environ: dict, body: bytes) -> dict:
+    """Form or JSON fields of a small body (all the routing decision needs)."""
+    content_type = environ.get("CONTENT_TYPE", "")
+    try:
+        if content_type.startswith("application/x-www-form-urlencoded"):
+            return {key: values[0] for key, values in parse_qs(body.decode()).items()}
+        if content_type.startswith("application/json"):
+            data = json.loads(body)
+            return data if isinstance(data, dict) else {}
+    except ValueError:
+        pass  # Let the view complain about it properly
+    return {}
+
+
+def _session_id(environ: dict):
+    if environ.get("HTTP_X_SESSION_ID"):
+        return environ["HTTP_X_SESSION_ID"]
+    morsel = SimpleCookie(environ.get("HTTP_COOKIE", "")).get(SESSION_COOKIE)
+    return morsel.value if morsel else None
+
+
+async def _prefetch(environ: dict, names: list) -> dict:
+    """Fetches the integrations a request needs, as the caller (their cache keys are per user)."""
+    session_id = _session_id(environ)
+    state = None
+    if session_id and isinstance(sessions, InMemorySessionStore):
+        state = sessions.get(session_id)  # A dict lookup - not worth a thread hop
+    elif session_id:
+        state = await asyncio.get_running_loop().run_in_executor(_flask_pool, sessions.get, session_id)
+    assistant = DigitalDetoxAssistant(usage_key=session_id or "").load_state(state or {})
+    _counters["prefetches"] += 1
+    return await assistant.fetch_providers_async(names)
+
+
+def _run_view(environ: dict, send, loop) -> None:
+    """Runs the Flask app on a worker thread, streaming its response back through the loop."""
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response["start"] = {"type": "http.response.start", "status": int(status.split(" ", 1)[0]),
+                             "headers": [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                                         for name, value in headers]}
+
+    async def emit(*messages):
+        for message in messages:
+            await send(message)
+
+    def push(*messages):
+        asyncio.run_coroutine_threadsafe(emit(*messages), loop).result()
+
+    body = flask_app(environ, start_response)
+    try:
+        chunks = iter(body)
+        pending = next(chunks, b"")
+        started = False
+        for chunk in chunks:  # Streamed response: one message per chunk
+            messages = [{"type": "http.response.body", "body": pending, "more_body": True}]
+            push(*([] if started else [response["start"]]), *messages)
+            started, pending = True, chunk
+        # The usual case - a single body - goes out as one hop: headers and body together
+        push(*([] if started else [response["start"]]), {"type": "http.response.body", "body": pending})
+    finally:
+        if hasattr(body, "close"):
+            body.close()
+
+
+async def _http(scope: dict, receive, send) -> None:
+    loop = asyncio.get_running_loop()
+    body, more_body = b"", True
+    length = next((value for name, value in scope["headers"] if name == b"content-length"), None)
+    if length is not None and length.isdigit() and int(length) <= PEEK_BODY_BYTES:
+        chunks = []
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        body = b"".join(chunks)
+
+    stream = io.BufferedReader(_RequestBody(receive, loop, body, more_body), READ_BUFFER_BYTES)
+    environ = _environ(scope, stream)
+    names = providers_needed(scope["method"], scope["path"], {} if more_body else _params(environ, body))
+    if names:
+        try:
+            environ[PREFETCHED_ENVIRON_KEY] = await _prefetch(environ, names)
+        except Exception:
+            pass  # Only an optimization - the view can still make the calls itself
+    await loop.run_in_executor(_flask_pool, _run_view, environ, send, loop)
+
+
+async def _lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            default_clients().async_http()  # Build the transport now, not inside the first request's budget
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await default_clients().aclose()  # The async transport has to be closed on its own loop
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope: dict, receive, send) -> None:
+    """The ASGI application."""
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return  # No websockets here; reminders stream over SSE (see reminder_stream)
+    _counters["requests"] += 1
+    _counters["in_flight"] += 1
+    try:
+        await _http(scope, receive, send)
+    finally:
+        _counters["in_flight"] -= 1
+
+
+def stats() -> dict:
+    return {**_counters, "view_threads": FLASK_THREADS}
+
+
+def collect_metrics() -> list:
+    return [
+        ('asgi_requests_in_flight', 'gauge', "Requests being served by the async worker.",
+         [({}, _counters["in_flight"])]),
+        ('asgi_prefetches_total', 'counter', "Requests whose integrations were fetched on the event loop.",
+         [({}, _counters["prefetches"])]),
+    ]
+
+
+register_collector(collect_metrics)
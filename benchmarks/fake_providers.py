@@ -0,0 +1,162 @@
+"""
+Fake providers: local stand-ins for Spotify, Fitbit and OpenAI 🎭
+
+Each fake is a small threaded HTTP server that answers the one endpoint the
+assistant calls, after a configurable delay, and fails a configurable share
+of requests with a 503. Point the app at them with the DETOX_*_API_URL
+variables (``env()`` builds them) and load tests exercise the real client,
+cache and circuit-breaker code without touching the internet.
+
+Standalone:
+    python benchmarks/fake_providers.py [--latency-ms 80] [--jitter-ms 40] [--failure-rate 0.02]
+
+prints the environment to export, then serves until interrupted.
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PLAYLISTS = ["Deep Focus", "Lo-fi Focus Beats", "Peaceful Piano", "Nature Sounds", "Brain Food"]
+PROMPTS = ["Describe a day without notifications", "Write a letter to your future, offline self",
+           "Sketch the view from your favourite window", "Invent a board game for a rainy afternoon"]
+
+
+class FakeProvider(ThreadingHTTPServer):
+    """One provider: its routes, its latency and its bad days."""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, name: str, latency_ms: float = 50.0, jitter_ms: float = 0.0,
+                 failure_rate: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), _Handler)
+        self.name = name
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.requests = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def start(self) -> "FakeProvider":
+        threading.Thread(target=self.serve_forever, name=f"fake-{self.name}", daemon=True).start()
+        return self
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "failures": self.failures}
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):  # The app gave up waiting - that's its right
+            super().handle_error(request, client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real APIs
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _serve(self, route: dict) -> None:
+        server = self.server
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        with server._lock:
+            server.requests += 1
+            failing = random.random() < server.failure_rate
+            server.failures += failing
+        delay = server.latency_ms + random.uniform(-server.jitter_ms, server.jitter_ms)
+        time.sleep(max(0.0, delay) / 1000)
+        if failing:
+            self._respond(503, {"error": {"status": 503, "message": "Service temporarily unavailable"}})
+            return
+        handler = route.get((self.command, self.path.split("?")[0]))
+        if handler is None:
+            self._respond(404, {"error": {"status": 404, "message": "Not found"}})
+            return
+        self._respond(200, handler())
+
+    def do_GET(self):
+        self._serve(ROUTES[self.server.name])
+
+    def do_POST(self):
+        self._serve(ROUTES[self.server.name])
+
+
+def _playlists() -> dict:
+    names = random.sample(PLAYLISTS, 3)
+    return {"items": [{"name": name, "id": f"fake-{i}"} for i, name in enumerate(names)],
+            "limit": 50, "offset": 0, "total": 3, "next": None}
+
+
+def _goals() -> dict:
+    return {"goals": {"activeMinutes": random.choice([10, 15, 20, 30]), "steps": 10000,
+                      "caloriesOut": 2500, "distance": 8.05}}
+
+
+def _completion() -> dict:
+    return {"id": "cmpl-fake", "object": "text_completion", "created": int(time.time()),
+            "model": "gpt-3.5-turbo-instruct",
+            "choices": [{"text": " " + random.choice(PROMPTS), "index": 0, "logprobs": None,
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 6, "completion_tokens": 12, "total_tokens": 18}}
+
+
+ROUTES = {
+    "spotify": {("GET", "/v1/users/spotify/playlists"): _playlists},
+    "fitbit": {("GET", "/1/user/-/activities/goals/daily.json"): _goals},
+    "openai": {("POST", "/v1/completions"): _completion},
+}
+
+
+def start_fake_providers(latency_ms: float = 50.0, jitter_ms: float = 0.0, failure_rate: float = 0.0) -> dict:
+    """Starts one fake per provider; returns {name: FakeProvider}."""
+    return {name: FakeProvider(name, latency_ms, jitter_ms, failure_rate).start() for name in ROUTES}
+
+
+def env(fakes: dict) -> dict:
+    """Environment that points the app (and dummy API keys) at the fakes."""
+    return {
+        "DETOX_SPOTIFY_API_URL": fakes["spotify"].url + "/v1/",
+        "DETOX_FITBIT_API_URL": fakes["fitbit"].url,
+        "DETOX_OPENAI_API_URL": fakes["openai"].url + "/v1",
+        "SPOTIFY_API_KEY": "fake-spotify-key",
+        "FITBIT_API_KEY": "fake-fitbit-key",
+        "OPENAI_API_KEY": "fake-openai-key",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--latency-ms", type=float, default=80.0)
+    parser.add_argument("--jitter-ms", type=float, default=40.0)
+    parser.add_argument("--failure-rate", type=float, default=0.02)
+    args = parser.parse_args()
+
+    fakes = start_fake_providers(args.latency_ms, args.jitter_ms, args.failure_rate)
+    for key, value in env(fakes).items():
+        print(f"export {key}={value}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        print(json.dumps({name: fake.stats() for name, fake in fakes.items()}))
+
+
+if __name__ == "__main__":
+    main()
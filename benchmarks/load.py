@@ -0,0 +1,207 @@
+"""
+HTTP load test: concurrent users against the web app 🚦
+
+Starts the fake providers (see fake_providers.py) and the app wired to them
+- the Flask dev server, gunicorn threads or the async worker, per --server -
+then runs --users concurrent virtual users for --duration seconds. Each user
+logs in with its own session and then loops over a weighted mix of what the
+dashboard and API clients actually do: dashboard actions, menu fetches with
+If-None-Match, numbered responses, activity suggestions and random tips.
+
+Point --url at an already-running deployment to skip starting anything
+(its providers are whatever it was configured with).
+
+Usage:
+    python benchmarks/load.py [--users 16] [--duration 20] [--latency-ms 80] [--jitter-ms 40]
+                              [--failure-rate 0.02] [--server flask|gunicorn|uvicorn]
+                              [--url http://host:port]
+                              [--output load.json] [--compare baseline.json]
+
+Prints per-endpoint throughput, latency percentiles and status counts, then
+one JSON line per endpoint. --compare exits 1 when an endpoint's p95
+regressed by more than --threshold.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_providers import env, start_fake_providers  # noqa: E402
+from results import ROOT, add_arguments, finish, summarize  # noqa: E402
+
+FORM = {"Content-Type": "application/x-www-form-urlencoded"}
+JSON = {"Content-Type": "application/json"}
+
+# (name, weight, method, path, body, headers) - bodies are dicts (form or JSON per headers)
+MIX = [
+    ("POST /start focus_tip", 10, "POST", "/start", {"action": "focus_tip"}, FORM),
+    ("POST /start physical", 8, "POST", "/start", {"action": "physical"}, FORM),
+    ("POST /start progress", 6, "POST", "/start", {"action": "progress"}, FORM),
+    ("GET /api/menus/main", 20, "GET", "/api/menus/main", None, {}),
+    ("POST /api/respond", 12, "POST", "/api/respond", {"choice": "1"}, JSON),
+    ("POST /api/activities/a", 10, "POST", "/api/activities/a", None, {}),
+    ("POST /api/activities/b", 8, "POST", "/api/activities/b", None, {}),
+    ("POST /api/activities/c", 10, "POST", "/api/activities/c", None, {}),
+    ("GET /api/tips/random", 16, "GET", "/api/tips/random", None, {}),
+]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# How to serve the app: the Flask dev server, gunicorn threads, or the async worker (asgi.py)
+SERVERS = {
+    "flask": lambda port: [sys.executable, os.path.join(ROOT, "main.py")],
+    "gunicorn": lambda port: [sys.executable, "-m", "gunicorn", "-w", "1", "--threads", "32",
+                              "-b", f"127.0.0.1:{port}", "main:app"],
+    "uvicorn": lambda port: [sys.executable, "-m", "uvicorn", "asgi:app", "--port", str(port),
+                             "--log-level", "warning"],
+}
+
+
+def start_app(environment: dict, server: str = "flask", timeout: float = 30.0) -> tuple:
+    """Serves the app on a free port; returns (process, base url) once it answers."""
+    port = free_port()
+    process = subprocess.Popen(SERVERS[server](port), cwd=ROOT,
+                               env={**os.environ, **environment, "PORT": str(port),
+                                    "DETOX_SSE_PORT": str(free_port())},
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"{server} exited with status {process.returncode}")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/start")
+            connection.getresponse().read()
+            return process, url
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise SystemExit(f"{server} didn't answer on {url} within {timeout:.0f}s")
+
+
+class VirtualUser(threading.Thread):
+    """One session hammering the app with the weighted mix until the deadline."""
+
+    def __init__(self, index: int, url: str, deadline: float, record):
+        super().__init__(name=f"user-{index}", daemon=True)
+        address = urlsplit(url)
+        self.connection = http.client.HTTPConnection(address.hostname, address.port, timeout=30)
+        self.session = {"X-Session-Id": f"load-{index}-{random.getrandbits(32):08x}"}
+        self.etags = {}
+        self.deadline = deadline
+        self.record = record
+        self.rng = random.Random(index)
+
+    def request(self, method: str, path: str, body=None, headers=None) -> tuple:
+        headers = {**self.session, **(headers or {})}
+        if body is not None:
+            body = json.dumps(body) if headers.get("Content-Type") == JSON["Content-Type"] else urlencode(body)
+        if method == "GET" and path in self.etags:
+            headers["If-None-Match"] = self.etags[path]
+        started = time.perf_counter()
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException) as e:
+            self.connection.close()
+            return time.perf_counter() - started, type(e).__name__
+        elapsed = time.perf_counter() - started
+        if response.getheader("ETag"):
+            self.etags[path] = response.getheader("ETag")
+        return elapsed, response.status
+
+    def run(self) -> None:
+        self.record("POST /login", *self.request("POST", "/login", {"name": self.name, "ideal_time": "3"}, FORM))
+        names = [entry[0] for entry in MIX]
+        weights = [entry[1] for entry in MIX]
+        routes = {entry[0]: entry[2:] for entry in MIX}
+        while time.monotonic() < self.deadline:
+            name = self.rng.choices(names, weights)[0]
+            self.record(name, *self.request(*routes[name]))
+        self.connection.close()
+
+
+def run_load(url: str, users: int, duration: float) -> tuple:
+    samples = {}  # endpoint -> [seconds]
+    statuses = {}  # endpoint -> {status: count}
+    lock = threading.Lock()
+
+    def record(name: str, seconds: float, status) -> None:
+        with lock:
+            samples.setdefault(name, []).append(seconds)
+            counts = statuses.setdefault(name, {})
+            counts[str(status)] = counts.get(str(status), 0) + 1
+
+    started = time.monotonic()
+    workers = [VirtualUser(i, url, started + duration, record) for i in range(users)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    wall = time.monotonic() - started
+
+    results = []
+    for name in sorted(samples):
+        stats = summarize(samples[name])
+        stats["ops_per_second"] = round(len(samples[name]) / wall, 1)  # Throughput, not 1/latency
+        results.append({"name": name, **stats, "statuses": statuses[name]})
+    everything = [seconds for endpoint in samples.values() for seconds in endpoint]
+    total = {"name": "all", **summarize(everything),
+             "statuses": {status: sum(counts.get(status, 0) for counts in statuses.values())
+                          for status in sorted({s for counts in statuses.values() for s in counts})}}
+    total["ops_per_second"] = round(len(everything) / wall, 1)
+    return results + [total], wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--users", type=int, default=16, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds to run")
+    parser.add_argument("--latency-ms", type=float, default=80.0, help="Fake provider latency")
+    parser.add_argument("--jitter-ms", type=float, default=40.0, help="Fake provider latency jitter (±)")
+    parser.add_argument("--failure-rate", type=float, default=0.02, help="Share of provider calls that 503")
+    parser.add_argument("--server", choices=SERVERS, default="flask", help="How to serve the app under test")
+    parser.add_argument("--url", help="Load an already-running app instead of starting one")
+    add_arguments(parser, "p95")
+    args = parser.parse_args()
+
+    fakes, process, url = {}, None, args.url
+    if url is None:
+        fakes = start_fake_providers(args.latency_ms, args.jitter_ms, args.failure_rate)
+        process, url = start_app(env(fakes), args.server)
+    try:
+        results, wall = run_load(url, args.users, args.duration)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    print(f"{'endpoint':<26} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  statuses")
+    for row in results:
+        print(f"{row['name']:<26} {row['ops_per_second']:>8} {row['p50_us'] / 1000:>8.1f} "
+              f"{row['p95_us'] / 1000:>8.1f} {row['p99_us'] / 1000:>8.1f}  {row['statuses']}")
+    providers = {name: fake.stats() for name, fake in fakes.items()}
+    if providers:
+        print(f"providers: {json.dumps(providers)}")
+    finish(args, "load", results, "p95_us", server=None if args.url else args.server, users=args.users, duration=round(wall, 1),
+           provider_latency_ms=args.latency_ms, provider_failure_rate=args.failure_rate, providers=providers)
+
+
+if __name__ == "__main__":
+    main()
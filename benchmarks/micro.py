@@ -0,0 +1,133 @@
+"""
+Micro-benchmarks for the assistant's hot paths ⏱️
+
+* ``read_and_focus_image`` across image sizes and analysis modes, cold
+  (result cache cleared before every call) and warm.
+* ``get_activity_suggestion`` for every category - with the integrations
+  falling back to their defaults, or through local fake providers with
+  --fakes (see fake_providers.py).
+* ``get_smart_response`` dispatch for each menu option plus invalid input.
+
+Usage:
+    python benchmarks/micro.py [--min-time 0.5] [--only image,activity,response]
+                               [--fakes] [--output micro.json] [--compare baseline.json]
+
+Prints a table, then one JSON line per benchmark. --compare exits 1 when a
+benchmark's p50 regressed by more than --threshold.
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from results import add_arguments, finish, summarize  # noqa: E402
+
+IMAGE_SIZES = {"vga": (640, 480), "1080p": (1920, 1080), "4k": (3840, 2160)}
+MAX_ITERATIONS = 100_000
+
+
+def run(fn, min_time: float, setup=None) -> dict:
+    """Calls fn() until min_time seconds of samples (at least 5), timing each call."""
+    samples = []
+    spent = 0.0
+    while (spent < min_time or len(samples) < 5) and len(samples) < MAX_ITERATIONS:
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        samples.append(elapsed)
+        spent += elapsed
+    return summarize(samples)
+
+
+def make_screenshot(path: str, size: tuple) -> None:
+    """A noisy, screenshot-ish PNG (flat panels plus text-like speckle)."""
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(size[0])
+    img = Image.new("RGB", size, (245, 245, 245))
+    draw = ImageDraw.Draw(img)
+    for _ in range(40):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        draw.rectangle([x, y, x + rng.randrange(50, 400), y + rng.randrange(20, 200)],
+                       fill=tuple(rng.randrange(256) for _ in range(3)))
+    noise = Image.effect_noise(size, 40).convert("RGB")
+    Image.blend(img, noise, 0.15).save(path, format="PNG")
+
+
+def bench_images(assistant, min_time: float) -> list:
+    import image_analysis
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for label, size in IMAGE_SIZES.items():
+            path = os.path.join(directory, f"{label}.png")
+            make_screenshot(path, size)
+            for mode in ("metadata", "fast", "full"):
+                stats = run(lambda: assistant.read_and_focus_image(path, mode), min_time,
+                            setup=image_analysis.result_cache.memory.clear)
+                results.append({"name": f"read_and_focus_image/{label}/{mode}/cold", **stats})
+            stats = run(lambda: assistant.read_and_focus_image(path, "full"), min_time)
+            results.append({"name": f"read_and_focus_image/{label}/full/warm", **stats})
+    return results
+
+
+def bench_activities(assistant, min_time: float) -> list:
+    from catalog import catalog
+
+    categories = list(catalog().categories) + ["f"]
+    return [{"name": f"get_activity_suggestion/{category}",
+             **run(lambda: assistant.get_activity_suggestion(category), min_time)}
+            for category in categories]
+
+
+def bench_responses(assistant, min_time: float) -> list:
+    choices = ["1", "2", "3", "4", "5", "6", "nope"]
+    return [{"name": f"get_smart_response/{choice}", **run(lambda: assistant.get_smart_response(choice), min_time)}
+            for choice in choices]
+
+
+SUITES = {"image": bench_images, "activity": bench_activities, "response": bench_responses}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--min-time", type=float, default=0.5, help="Seconds of samples per benchmark")
+    parser.add_argument("--only", default=",".join(SUITES), help="Comma-separated subset of: " + ", ".join(SUITES))
+    parser.add_argument("--fakes", action="store_true", help="Route integrations to local fake providers")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Fake provider latency (with --fakes)")
+    add_arguments(parser, "p50")
+    args = parser.parse_args()
+
+    if args.fakes:
+        from fake_providers import env, start_fake_providers
+
+        os.environ.update(env(start_fake_providers(args.latency_ms)))  # Before main reads its config
+
+    import main as app_main
+
+    assistant = app_main.DigitalDetoxAssistant()
+    assistant.user_name, assistant.screen_time_goal = "bench", 3.0
+    sys.stdout, real_stdout = io.StringIO(), sys.stdout  # Some paths print; keep the table clean
+    try:
+        results = []
+        for suite in args.only.split(","):
+            results += SUITES[suite.strip()](assistant, args.min_time)
+    finally:
+        sys.stdout = real_stdout
+    assistant.shutdown()
+
+    print(f"{'benchmark':<44} {'ops':>7} {'p50 µs':>10} {'p95 µs':>10} {'p99 µs':>10}")
+    for row in results:
+        print(f"{row['name']:<44} {row['ops']:>7} {row['p50_us']:>10} {row['p95_us']:>10} {row['p99_us']:>10}")
+    finish(args, "micro", results, "p50_us", min_time=args.min_time, fakes=args.fakes)
+
+
+if __name__ == "__main__":
+    main()
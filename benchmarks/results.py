@@ -0,0 +1,103 @@
+"""
+Shared plumbing for the benchmark scripts: timing summaries, a JSON results
+file with enough context to trust a comparison, and a regression check
+against an earlier run.
+
+Results files look like:
+
+    {"suite": "micro", "environment": {...}, "results": [{"name": ..., "p50_us": ...}, ...]}
+
+and any two files of the same suite can be compared by result name.
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def summarize(samples: list) -> dict:
+    """Latency percentiles (µs) and throughput from per-operation durations in seconds."""
+    ordered = sorted(samples)
+    count = len(ordered)
+    if not count:
+        return {"ops": 0}
+
+    def percentile(fraction: float) -> float:
+        return round(ordered[min(count - 1, int(count * fraction))] * 1e6, 1)
+
+    total = sum(ordered)
+    return {
+        "ops": count,
+        "mean_us": round(total / count * 1e6, 1),
+        "p50_us": percentile(0.50),
+        "p95_us": percentile(0.95),
+        "p99_us": percentile(0.99),
+        "max_us": round(ordered[-1] * 1e6, 1),
+        "ops_per_second": round(count / total, 1) if total else None,
+    }
+
+
+def environment() -> dict:
+    """Where and on what these numbers were measured."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def write_results(path: str, suite: str, results: list, **extra) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"suite": suite, "environment": environment(), **extra, "results": results}, f, indent=2)
+        f.write("\n")
+
+
+def compare(results: list, baseline_path: str, metric: str, threshold: float) -> list:
+    """
+    Results whose metric got worse than the baseline by more than threshold
+    (a fraction: 0.2 means 20% slower). Unknown names are skipped.
+    """
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {row["name"]: row for row in json.load(f)["results"]}
+    regressions = []
+    for row in results:
+        before = baseline.get(row["name"], {}).get(metric)
+        after = row.get(metric)
+        if before and after is not None and after > before * (1 + threshold):
+            regressions.append({"name": row["name"], "metric": metric, "baseline": before, "current": after,
+                                "change": round(after / before - 1, 3)})
+    return regressions
+
+
+def add_arguments(parser, metric: str) -> None:
+    """--output / --compare / --threshold, shared by every suite."""
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", metavar="BASELINE", help="Results file from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help=f"Allowed {metric} slowdown before --compare fails (default 0.25 = 25%%)")
+
+
+def finish(args, suite: str, results: list, metric: str, **extra) -> None:
+    """Prints one JSON line per result, writes --output, and exits 1 on --compare regressions."""
+    for row in results:
+        print(json.dumps({"benchmark": suite, **row}))
+    if args.output:
+        write_results(args.output, suite, results, **extra)
+    if args.compare:
+        regressions = compare(results, args.compare, metric, args.threshold)
+        for regression in regressions:
+            print(f"⚠️ regression: {regression['name']} {metric} {regression['baseline']} -> "
+                  f"{regression['current']} ({regression['change']:+.0%})", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
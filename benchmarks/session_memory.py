@@ -0,0 +1,121 @@
+"""
+Session memory benchmark: bytes per user, before and after the diet 🏋️
+
+Compares three ways of holding one user's state:
+
+* legacy  - the old layout: an assistant instance with its own copies of the
+            tips / suggestions / responses catalogs, an api_keys dict and an
+            ever-growing activity_history list.
+* record  - the slotted UserState with its fixed-size ActivityLog ring.
+* stored  - what the in-memory session store actually keeps (compact JSON).
+
+Usage:
+    python benchmarks/session_memory.py [--sessions 5000] [--activities 0 50 500]
+
+Prints a table, then one JSON line per scenario for machine comparison.
+"""
+import argparse
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import catalog  # noqa: E402
+from sessions import InMemorySessionStore  # noqa: E402
+from user_state import UserState  # noqa: E402
+
+TITLES = [activity.title for activity in catalog().activities]
+
+
+class LegacySession:
+    """Mirrors the per-instance attributes of the original assistant."""
+
+    def __init__(self):
+        self.screen_time_goal = None
+        self.reminder_interval = None
+        self.running = True
+        self.interaction_count = 0
+        self.last_mood = "neutral"
+        self.user_name = None
+        self.activity_history = []
+        self.api_keys = {'spotify': '', 'fitbit': '', 'openai': ''}
+        self.tips = list(catalog().tip_texts)
+        self.deep_work_suggestions = list(catalog().deep_work_suggestions)
+        self.responses = {key: list(value) for key, value in catalog().responses.items()}
+
+
+def build_legacy(index: int, activities: int):
+    session = LegacySession()
+    session.user_name = f"user-{index}"
+    session.screen_time_goal = 3.0
+    for i in range(activities):
+        session.activity_history.append(TITLES[i % len(TITLES)])
+    return session
+
+
+def build_record(index: int, activities: int):
+    state = UserState()
+    state.user_name = f"user-{index}"
+    state.screen_time_goal = 3.0
+    for i in range(activities):
+        state.activities.append(TITLES[i % len(TITLES)])
+    return state
+
+
+def measure(build, sessions: int, activities: int) -> float:
+    """Average traced bytes per session for objects made by build()."""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    kept = [build(i, activities) for i in range(sessions)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    total = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del kept
+    return total / sessions
+
+
+def measure_store(sessions: int, activities: int) -> float:
+    records = [build_record(i, activities).to_dict() for i in range(sessions)]
+    store = InMemorySessionStore(max_sessions=sessions + 1)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for i, record in enumerate(records):
+        store.update(f"session-{i:08d}", lambda _, record=record: record)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    return sum(stat.size_diff for stat in after.compare_to(before, "filename")) / sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sessions", type=int, default=5000)
+    parser.add_argument("--activities", type=int, nargs="+", default=[0, 50, 500])
+    args = parser.parse_args()
+
+    results = []
+    for activities in args.activities:
+        legacy = measure(build_legacy, args.sessions, activities)
+        record = measure(build_record, args.sessions, activities)
+        stored = measure_store(args.sessions, activities)
+        results.append({
+            "benchmark": "session_memory",
+            "sessions": args.sessions,
+            "activities_per_user": activities,
+            "legacy_bytes": round(legacy),
+            "record_bytes": round(record),
+            "stored_bytes": round(stored),
+            "record_savings": round(1 - record / legacy, 3),
+        })
+
+    print(f"{'activities':>10} {'legacy B':>10} {'record B':>10} {'stored B':>10} {'saved':>7}")
+    for row in results:
+        print(f"{row['activities_per_user']:>10} {row['legacy_bytes']:>10} {row['record_bytes']:>10} "
+              f"{row['stored_bytes']:>10} {row['record_savings']:>7.0%}")
+    for row in results:
+        print(json.dumps(row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+SSE load test: thousands of idle reminder subscribers on one box 📣
+
+Starts the reminder stream server in this process, then a child process
+opens N EventSource-style connections (one session each) and sits idle.
+Once everyone is connected we record the server's thread count and memory,
+push one reminder to every session, and the child reports how long
+delivery took.
+
+Usage:
+    python benchmarks/sse_idle.py [--clients 5000] [--port 0]
+
+Prints a summary, then one JSON line for machine comparison.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reminder_stream import STREAM_PATH, ReminderBroker  # noqa: E402
+
+
+def raise_fd_limit(needed: int) -> None:
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, needed), hard))
+
+
+def rss_kb() -> int:
+    """Resident memory of this process (Linux), or peak RSS elsewhere."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+# -- child: the idle subscribers ---------------------------------------------
+
+async def subscribe(port: int, session: str, ready: asyncio.Event, latencies: list, connected: list) -> None:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port, limit=64 * 1024)
+    writer.write(f"GET {STREAM_PATH} HTTP/1.1\r\nHost: bench\r\nX-Session-Id: {session}\r\n\r\n".encode())
+    await writer.drain()
+    await reader.readuntil(b"retry: 5000\n\n")  # Headers plus the server's hello
+    connected.append(session)
+    if len(connected) == ready.total:
+        ready.set()
+    while True:
+        line = await reader.readline()
+        if not line:
+            return
+        if line.startswith(b"data: "):
+            sent = json.loads(json.loads(line[6:])["text"])["sent"]
+            latencies.append(time.time() - sent)
+            writer.close()
+            return
+
+
+async def run_clients(port: int, clients: int, timeout: float) -> None:
+    ready = asyncio.Event()
+    ready.total = clients
+    latencies, connected = [], []
+    tasks = []
+    for i in range(clients):
+        tasks.append(asyncio.create_task(subscribe(port, f"bench-{i}", ready, latencies, connected)))
+        if i % 200 == 199:
+            await asyncio.sleep(0)  # Let the accept queue drain
+    await asyncio.wait_for(ready.wait(), timeout)
+    print("ready", flush=True)
+    await asyncio.wait(tasks, timeout=timeout)
+    latencies.sort()
+    print(json.dumps({
+        "received": len(latencies),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+        "p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 1) if latencies else None,
+        "max_ms": round(latencies[-1] * 1000, 1) if latencies else None,
+    }), flush=True)
+
+
+# -- parent: the server ------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--clients", type=int, default=5000)
+    parser.add_argument("--port", type=int, default=0, help="0 picks a free port")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    raise_fd_limit(args.clients + 256)
+
+    if args.child:
+        asyncio.run(run_clients(args.port, args.clients, args.timeout))
+        return
+
+    broker = ReminderBroker()
+    if not broker.start("127.0.0.1", args.port):
+        raise SystemExit(f"Could not start the stream server: {broker.start_error}")
+    port = broker.address[1]
+    threads_before, rss_before = threading.active_count(), rss_kb()
+
+    started = time.perf_counter()
+    child = subprocess.Popen([sys.executable, __file__, "--child", "--port", str(port),
+                              "--clients", str(args.clients), "--timeout", str(args.timeout)],
+                             stdout=subprocess.PIPE, text=True)
+    if child.stdout.readline().strip() != "ready":
+        child.kill()
+        raise SystemExit("Subscribers never finished connecting")
+    connect_seconds = time.perf_counter() - started
+    time.sleep(0.5)  # Let the last handlers settle into their idle wait
+    idle = broker.stats()
+    threads_idle, rss_idle = threading.active_count(), rss_kb()
+
+    for i in range(args.clients):
+        broker.publish(f"bench-{i}", json.dumps({"sent": time.time()}))
+    delivery = json.loads(child.stdout.readline())
+    child.wait()
+    broker.stop()
+
+    result = {
+        "benchmark": "sse_idle",
+        "clients": args.clients,
+        "connected": idle["connections"],
+        "connect_seconds": round(connect_seconds, 2),
+        "server_threads": threads_idle,
+        "threads_added": threads_idle - threads_before,
+        "server_rss_kb_per_client": round((rss_idle - rss_before) / args.clients, 1),
+        **delivery,
+    }
+    print(f"{result['connected']} idle subscribers held by {result['server_threads']} threads "
+          f"(+{result['threads_added']}), ~{result['server_rss_kb_per_client']} KB each")
+    print(f"fan-out to {result['received']} streams: p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms, "
+          f"max {result['max_ms']} ms")
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Startup benchmark: how long until the first menu shows up? 🚀
+
+Launches a fresh interpreter (no warm module cache in memory) that imports
+``main``, builds an assistant and renders the main menu - everything the CLI
+does before it asks its first question, and everything a gunicorn worker does
+before it can serve. Python's ``-X importtime`` report is folded into a
+per-module table so a new top-level import that costs 300 ms stands out.
+
+The run also fails if any of the heavy integration libraries (openai,
+spotipy, Pillow, requests, httpx) got imported on the way: those are meant to
+load on first use only.
+
+Usage:
+    python benchmarks/startup.py [--runs 5] [--top 15] [--budget-ms 400] [--check]
+
+With --check the exit status is 1 when the median cold start blows the
+budget (or a heavy module sneaks in), so CI can hold the line.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cold start to first menu, in milliseconds (median over runs)
+STARTUP_BUDGET_MS = float(os.environ.get("DETOX_STARTUP_BUDGET_MS", "400"))
+
+# Must not be imported before someone actually needs them
+HEAVY_MODULES = ("openai", "spotipy", "PIL", "requests", "httpx")
+
+# What the child process does: exactly the CLI's path to its first menu
+_CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import main
+assistant = main.DigitalDetoxAssistant()
+assistant.show_menu()
+print(json.dumps({
+    "to_menu_ms": (time.perf_counter() - started) * 1000,
+    "heavy_loaded": [name for name in %r if name in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def parse_importtime(stderr: str) -> dict:
+    """
+    Cumulative import time (ms) from -X importtime output, for top-level
+    imports and their direct children (``main`` and what main imports).
+    Deeper imports are already counted in their parent's cumulative time.
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth <= 1:
+            modules[name.strip()] = modules.get(name.strip(), 0.0) + int(cumulative) / 1000
+    return modules
+
+
+def measure_once() -> dict:
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    env.pop("OPENAI_API_KEY", None)  # A key would start the prompt pool, which imports openai on purpose
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", _CHILD], cwd=ROOT, env=env,
+                          capture_output=True, text=True, check=True)
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["modules"] = parse_importtime(proc.stderr)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="How many modules to list")
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS)
+    parser.add_argument("--check", action="store_true", help="Exit 1 when over budget")
+    args = parser.parse_args()
+
+    runs = [measure_once() for _ in range(args.runs)]
+    to_menu = statistics.median(run["to_menu_ms"] for run in runs)
+    modules = {name: statistics.median(run["modules"].get(name, 0.0) for run in runs)
+               for name in runs[0]["modules"]}
+    heavy = sorted({name for run in runs for name in run["heavy_loaded"]})
+
+    print(f"{'module':<28} {'import ms':>10}")
+    for name, ms in sorted(modules.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{name:<28} {ms:>10.1f}")
+    print(f"\ncold start to first menu: {to_menu:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    if heavy:
+        print(f"⚠️ heavy modules imported at startup: {', '.join(heavy)}")
+
+    ok = to_menu <= args.budget_ms and not heavy
+    print(json.dumps({
+        "benchmark": "startup",
+        "runs": args.runs,
+        "to_menu_ms": round(to_menu, 1),
+        "budget_ms": args.budget_ms,
+        "heavy_loaded": heavy,
+        "ok": ok,
+    }))
+    if args.check and not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Usage report benchmark: does the wellness report stay fast as history grows? 📈
+
+Fills an in-memory usage store with N days of synthetic events for one user
+(a few apps, a session every waking hour) and times ``report()``. The rings
+are fixed-size, so the numbers should barely move between 7 and 3650 days.
+
+Usage:
+    python benchmarks/usage_report.py [--days 7 90 365 3650] [--apps 8] [--reports 2000]
+
+Prints a table, then one JSON line per scenario for machine comparison.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from usage_store import UsageStore  # noqa: E402
+
+
+def build(days: int, apps: int) -> UsageStore:
+    store = UsageStore()
+    now = time.time()
+    events = [(now - day * 86400 - hour * 3600, f"app-{(day + hour) % apps}", 300.0 + hour)
+              for day in range(days) for hour in range(16)]
+    events.reverse()  # Oldest first, the way a tracker would upload them
+    for start in range(0, len(events), 2000):
+        store.add_batch("user", events[start:start + 2000])
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--days", type=int, nargs="+", default=[7, 90, 365, 3650])
+    parser.add_argument("--apps", type=int, default=8)
+    parser.add_argument("--reports", type=int, default=2000)
+    args = parser.parse_args()
+
+    results = []
+    for days in args.days:
+        store = build(days, args.apps)
+        timings = []
+        for _ in range(args.reports):
+            started = time.perf_counter()
+            store.report("user", goal_hours=3.0)
+            timings.append((time.perf_counter() - started) * 1e6)
+        timings.sort()
+        results.append({
+            "benchmark": "usage_report",
+            "days": days,
+            "apps": args.apps,
+            "events": days * 16,
+            "p50_us": round(timings[len(timings) // 2], 1),
+            "p99_us": round(timings[int(len(timings) * 0.99)], 1),
+        })
+
+    print(f"{'days':>6} {'events':>8} {'p50 µs':>8} {'p99 µs':>8}")
+    for row in results:
+        print(f"{row['days']:>6} {row['events']:>8} {row['p50_us']:>8} {row['p99_us']:>8}")
+    for row in results:
+        print(json.dumps(row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,478 @@
+"""
+Caching: because the best work is the work you don't have to do twice 🗄️
+
+Small cache building blocks shared across the assistant (redis only if you ask for it):
+
+* ``LRUCache`` - in-process, thread-safe, evicts least recently used entries
+  once a byte budget is exceeded.
+* ``DiskCache`` - one JSON file per key in a directory, survives restarts.
+* ``TieredCache`` - memory first, disk second, with hit/miss counters so we
+  can actually see the savings.
+* ``TTLCache`` - time-based, serves stale answers while one background
+  refresh runs, optionally shared across workers through redis. Works with
+  coroutine loaders too (``get_or_load_async``).
+"""
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+def json_size(value) -> int:
+    """Approximate footprint of a JSON-friendly value, in bytes."""
+    return len(json.dumps(value, separators=(",", ":")))
+
+
+class LRUCache:
+    """
+    A least-recently-used cache with a byte budget instead of an entry count -
+    one 4K histogram shouldn't cost the same as a tiny string.
+    """
+
+    def __init__(self, max_bytes: int, sizeof=json_size):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value) -> None:
+        size = self.sizeof(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            if size > self.max_bytes:
+                return  # Bigger than the whole budget - not worth evicting everything for
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class DiskCache:
+    """
+    A directory of JSON files, one per key. Writes are atomic (temp file +
+    rename), so a crash mid-write never leaves a half-baked entry behind.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        # Keys may contain ':' and friends - hash them into safe file names
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest() + ".json")
+
+    def get(self, key, default=None):
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return default
+
+    def set(self, key, value) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(value, f, separators=(",", ":"))
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+
+class TieredCache:
+    """
+    Memory first, disk second. Disk hits are promoted back into memory so
+    the next lookup is a dictionary access instead of a file read.
+    """
+
+    def __init__(self, memory: LRUCache, disk: DiskCache = None):
+        self.memory = memory
+        self.disk = disk
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+        if self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                self.memory.set(key, value)
+                return value
+        with self._lock:
+            self.misses += 1
+        return default
+
+    def set(self, key, value) -> None:
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def stats(self) -> dict:
+        memory = self.memory.stats()
+        hits = memory["hits"] + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "hits": hits,
+            "memory_hits": memory["hits"],
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory": memory,
+            "disk_enabled": self.disk is not None,
+        }
+
+
+# ---------------------------------------------------------------------------
+# TTL cache with stale-while-revalidate, for provider responses
+# ---------------------------------------------------------------------------
+
+class MemoryBackend:
+    """In-process LRU storage for TTLCache: (value, fetched_at) per key."""
+
+    blocking = False  # Lock-and-dict fast: fine to call straight from an event loop
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, value, fetched_at: float, expire_in: float) -> None:
+        with self._lock:
+            self._entries[key] = (value, fetched_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def try_lock(self, key, seconds: float) -> bool:
+        return True  # In-process coalescing already guarantees one refresher
+
+    def unlock(self, key) -> None:
+        pass
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisBackend:
+    """
+    Shared storage for TTLCache so every gunicorn worker sees the same
+    entries. Redis evicts by TTL (and by its own maxmemory LRU policy), and a
+    SET NX lock makes sure only one worker refreshes a stale key at a time.
+    """
+
+    blocking = True  # Every call is a network round-trip - coroutines run them off the event loop
+
+    def __init__(self, url: str, prefix: str = "detox:cache:"):
+        import redis  # Only needed when a shared cache is configured
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        return entry["value"], entry["fetched_at"]
+
+    def set(self, key, value, fetched_at: float, expire_in: float) -> None:
+        payload = json.dumps({"value": value, "fetched_at": fetched_at})
+        self.client.set(self.prefix + key, payload, ex=max(1, int(expire_in)))
+
+    def try_lock(self, key, seconds: float) -> bool:
+        return bool(self.client.set(self.prefix + "lock:" + key, "1", nx=True, ex=max(1, int(seconds))))
+
+    def unlock(self, key) -> None:
+        self.client.delete(self.prefix + "lock:" + key)
+
+
+class TTLCache:
+    """
+    Time-based cache that prefers a slightly stale answer over a slow one.
+
+    * Younger than ``ttl``: served straight from the cache.
+    * Older, but within ``stale_ttl`` more: served stale while exactly one
+      background refresh runs for that key.
+    * Missing or too old: loaded on the caller's thread - and concurrent
+      callers for the same key share that one load instead of stampeding.
+
+    Uses wall-clock timestamps so entries stay meaningful across workers.
+    """
+
+    def __init__(self, ttl: float = 300, stale_ttl: float = 3600, backend=None, refresh_workers: int = 4):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.backend = backend if backend is not None else MemoryBackend()
+        self._lock = threading.Lock()
+        self._loading = {}  # key -> Future shared by everyone waiting on a cold load
+        self._loading_async = {}  # (event loop, key) -> asyncio.Future, the same for coroutine loaders
+        self._tasks = set()  # Background refresh tasks in flight
+        self._refreshing = set()
+        self._refresher = None
+        self._refresh_workers = refresh_workers
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.refreshes = 0
+        self.errors = 0
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    async def _off_loop(self, fn, *args):
+        """fn(*args) from a coroutine: a blocking (redis) backend's calls go to a thread, not the event loop."""
+        if not getattr(self.backend, "blocking", False):
+            return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    def _get(self, key: str):
+        try:
+            return self.backend.get(key)
+        except Exception:
+            return None  # A flaky shared cache shouldn't take requests down with it
+
+    def _lookup(self, key: str) -> tuple:
+        """(entry or None, "fresh" / "stale" / "miss") for key, counted."""
+        return self._classify(self._get(key))
+
+    async def _lookup_async(self, key: str) -> tuple:
+        return self._classify(await self._off_loop(self._get, key))
+
+    def _classify(self, entry) -> tuple:
+        if entry is not None:
+            age = time.time() - entry[1]
+            if age < self.ttl:
+                self._count("hits")
+                return entry, "fresh"
+            if age < self.ttl + self.stale_ttl:
+                self._count("stale_hits")
+                return entry, "stale"
+        self._count("misses")
+        return entry, "miss"
+
+    def get_or_load(self, key: str, loader):
+        """Returns the cached value for key, calling loader() only when needed."""
+        entry, status = self._lookup(key)
+        if status == "fresh":
+            return entry[0]
+        if status == "stale":
+            self._refresh_in_background(key, loader)
+            return entry[0]
+        return self._load(key, loader, stale=entry)
+
+    async def get_or_load_async(self, key: str, loader):
+        """
+        get_or_load for a coroutine loader, sharing the same entries. Cold
+        loads are coalesced per event loop and stale refreshes run as tasks.
+        A redis backend is only ever called from a worker thread.
+        """
+        entry, status = await self._lookup_async(key)
+        if status == "fresh":
+            return entry[0]
+        if status == "stale":
+            self._refresh_in_background_async(key, loader)
+            return entry[0]
+        return await self._load_async(key, loader, stale=entry)
+
+    def _load(self, key: str, loader, stale=None):
+        with self._lock:
+            future = self._loading.get(key)
+            owner = future is None
+            if owner:
+                future = self._loading[key] = Future()
+            else:
+                self.coalesced += 1
+        if not owner:
+            return future.result()
+
+        try:
+            value = loader()
+            self._store(key, value)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            self._count("errors")
+            if stale is not None:
+                future.set_result(stale[0])  # Better late-ish than never
+                return stale[0]
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+
+    async def _load_async(self, key: str, loader, stale=None):
+        slot = (asyncio.get_running_loop(), key)
+        future = self._loading_async.get(slot)
+        if future is not None:
+            self._count("coalesced")
+            return await asyncio.shield(future)  # One waiter giving up mustn't cancel everyone's load
+        future = self._loading_async[slot] = slot[0].create_future()
+        try:
+            value = await loader()
+            await self._off_loop(self._store, key, value)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            self._count("errors")
+            if stale is not None:
+                future.set_result(stale[0])
+                return stale[0]
+            future.set_exception(e)
+            future.exception()  # Retrieved - nobody else may be waiting
+            raise
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        finally:
+            self._loading_async.pop(slot, None)
+
+    def _store(self, key: str, value) -> None:
+        try:
+            self.backend.set(key, value, time.time(), self.ttl + self.stale_ttl)
+        except Exception:
+            self._count("errors")
+
+    def _refresh_in_background(self, key: str, loader) -> None:
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+            if self._refresher is None:
+                self._refresher = ThreadPoolExecutor(max_workers=self._refresh_workers,
+                                                     thread_name_prefix="cache-refresh")
+            refresher = self._refresher
+        refresher.submit(self._refresh, key, loader)
+
+    def _refresh(self, key: str, loader) -> None:
+        try:
+            try:
+                locked = self.backend.try_lock(key, self.ttl)
+            except Exception:
+                locked = True  # Shared lock unavailable - refreshing twice beats never refreshing
+            if not locked:
+                return  # Another worker is already on it
+            try:
+                value = loader()
+                self._store(key, value)
+                self._count("refreshes")
+            except Exception:
+                self._count("errors")  # Keep serving the stale value
+            finally:
+                try:
+                    self.backend.unlock(key)
+                except Exception:
+                    pass
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _refresh_in_background_async(self, key: str, loader) -> None:
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        task = asyncio.get_running_loop().create_task(self._refresh_async(key, loader))
+        self._tasks.add(task)  # The loop only keeps weak references
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh_async(self, key: str, loader) -> None:
+        try:
+            try:
+                locked = await self._off_loop(self.backend.try_lock, key, self.ttl)
+            except Exception:
+                locked = True
+            if not locked:
+                return
+            try:
+                value = await loader()
+                await self._off_loop(self._store, key, value)
+                self._count("refreshes")
+            except Exception:
+                self._count("errors")
+            finally:
+                try:
+                    await self._off_loop(self.backend.unlock, key)
+                except Exception:
+                    pass
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "refreshes": self.refreshes,
+                "errors": self.errors,
+                "hit_rate": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+                "backend": type(self.backend).__name__,
+            }
+
+
+def backend_from_env(max_entries: int = 4096):
+    """Redis when REDIS_URL is set (shared across workers), in-process LRU otherwise."""
+    url = os.environ.get("REDIS_URL")
+    return RedisBackend(url) if url else MemoryBackend(max_entries)
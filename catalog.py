@@ -0,0 +1,154 @@
+"""
+Content Catalog: all our wisdom, loaded once and filed properly 📚
+
+Every tip, activity, technique and challenge lives in ``content.json``. It is
+parsed once into immutable, indexed structures (tuples, named tuples and
+read-only mappings) with the response bodies already rendered, so building
+a reply is a lookup plus, at most, one small string join.
+
+Edit the data file while the server is running and the change is picked up
+on the next request (we glance at the file's mtime at most once per
+``RELOAD_CHECK_INTERVAL``). A broken edit keeps the last good catalog.
+"""
+import json
+import os
+import threading
+import time
+from types import MappingProxyType
+from typing import NamedTuple
+
+CONTENT_FILE = os.environ.get(
+    "DETOX_CONTENT_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "content.json"))
+
+# Seconds between mtime checks - the hot path never pays for more than a clock read
+RELOAD_CHECK_INTERVAL = 1.0
+
+
+class Tip(NamedTuple):
+    id: str
+    text: str
+    guidance: str
+    rendered: str  # The full focus tip response
+
+
+class Activity(NamedTuple):
+    id: str
+    category: str
+    title: str
+    description: str  # May contain a '{provider}' placeholder
+    provider: str  # Integration that fills the placeholder, or None
+    head: str  # Rendered response up to the provider text...
+    tail: str  # ...and after it (the whole response when provider is None)
+
+    def render(self, provided: str = "") -> str:
+        """The finished activity response - one concatenation, tops."""
+        return self.head + provided + self.tail if self.provider else self.tail
+
+
+class Challenge(NamedTuple):
+    id: str
+    text: str
+    rendered: str  # The full reality check response
+
+
+def _text(value) -> str:
+    """Multi-line content is stored as a list of lines for a readable data file."""
+    return "\n".join(value) if isinstance(value, list) else value
+
+
+class ContentCatalog:
+    """Immutable, indexed view of one version of content.json."""
+
+    def __init__(self, data: dict, mtime: float = 0.0):
+        self.mtime = mtime
+        default_guidance = _text(data["default_guidance"])
+
+        self.tips = tuple(
+            Tip(item["id"], item["text"], guidance, f"\n🎯 Focus Wisdom:\n{item['text']}\n\n{guidance}")
+            for item in data["tips"]
+            for guidance in [_text(item.get("guidance")) or default_guidance]
+        )
+        self.tips_by_id = MappingProxyType({tip.id: tip for tip in self.tips})
+        self.tip_texts = tuple(tip.text for tip in self.tips)
+
+        self.categories = MappingProxyType({
+            key: MappingProxyType(dict(value)) for key, value in data["activity_categories"].items()
+        })
+        activities = []
+        for item in data["activities"]:
+            provider = self.categories[item["category"]]["provider"]
+            description = _text(item["description"])
+            rendered = f"\n🌟 {item['title']}\n\n{description}"
+            head, _, tail = rendered.partition("{provider}") if provider else ("", "", rendered)
+            activities.append(Activity(item["id"], item["category"], item["title"], description,
+                                       provider, head, tail))
+        self.activities = tuple(activities)
+        self.activities_by_id = MappingProxyType({activity.id: activity for activity in activities})
+        self.activities_by_category = MappingProxyType({
+            category: tuple(a for a in activities if a.category == category) for category in self.categories
+        })
+
+        self.techniques = MappingProxyType({key: _text(value) for key, value in data["techniques"].items()})
+
+        self.challenges = tuple(
+            Challenge(item["id"], text, f"\n📱 Social Media Reality Check Challenge:\n{text}"
+                                        "\n\n→ Ready to level up your digital wellness?")
+            for item in data["challenges"]
+            for text in [_text(item["text"])]
+        )
+        self.challenges_by_id = MappingProxyType({challenge.id: challenge for challenge in self.challenges})
+
+        self.time_of_day = MappingProxyType({key: tuple(value) for key, value in data["time_of_day"].items()})
+        self.deep_work_suggestions = tuple(data["deep_work_suggestions"])
+        self.responses = MappingProxyType({key: tuple(value) for key, value in data["responses"].items()})
+
+    @classmethod
+    def load(cls, path: str = CONTENT_FILE) -> "ContentCatalog":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f), os.path.getmtime(path))
+
+
+class CatalogLoader:
+    """Keeps the current catalog and swaps in a new one when the file changes."""
+
+    def __init__(self, path: str = CONTENT_FILE):
+        self.path = path
+        self._catalog = ContentCatalog.load(path)
+        self._next_check = time.monotonic() + RELOAD_CHECK_INTERVAL
+        self._lock = threading.Lock()
+        self.reloads = 0
+        self.reload_errors = 0
+
+    def get(self) -> ContentCatalog:
+        if time.monotonic() >= self._next_check:
+            self._maybe_reload()
+        return self._catalog
+
+    def _maybe_reload(self) -> None:
+        if not self._lock.acquire(blocking=False):
+            return  # Someone else is already checking - serve the current catalog
+        try:
+            self._next_check = time.monotonic() + RELOAD_CHECK_INTERVAL
+            try:
+                if os.path.getmtime(self.path) == self._catalog.mtime:
+                    return
+                self._catalog = ContentCatalog.load(self.path)
+                self.reloads += 1
+            except (OSError, ValueError, KeyError, TypeError):
+                self.reload_errors += 1  # Half-saved or broken file: keep the last good catalog
+        finally:
+            self._lock.release()
+
+
+_loader = None
+_loader_lock = threading.Lock()
+
+
+def catalog() -> ContentCatalog:
+    """The current content catalog (loaded on first use, hot-reloaded after)."""
+    global _loader
+    if _loader is None:
+        with _loader_lock:
+            if _loader is None:
+                _loader = CatalogLoader()
+    return _loader.get()
@@ -0,0 +1,154 @@
+"""
+CLI: the terminal front ends for the assistant ⌨️
+
+* ``interactive`` - the event-driven session behind ``python main.py cli``
+  (and ``DigitalDetoxAssistant.run()``). One asyncio loop juggles three
+  things at once: lines from the keyboard (read on their own thread),
+  reminders from the shared scheduler, and answers that wait on integrations
+  (run on a worker thread). A pending Spotify or OpenAI call never freezes
+  the prompt, and a reminder never lands in the middle of a response.
+* ``run_batch`` - replays scripted menu selections (``python main.py batch
+  script.txt``, or ``-`` for stdin) as fast as the assistant can answer,
+  reading the script as it goes. Made for replay tests (``--seed`` makes the
+  answers repeatable) and for measuring ``get_smart_response`` throughput.
+
+Both walk the menus through ``DigitalDetoxAssistant.cli_step``, so they
+agree on what every line means.
+"""
+import asyncio
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class _Console:
+    """Output for the interactive CLI: keeps track of the open prompt so notices can re-show it."""
+
+    def __init__(self, out):
+        self.out = out
+        self.prompt = None  # The prompt currently waiting for input, if any
+
+    def ask(self, prompt: str) -> None:
+        self.prompt = prompt
+        self.out.write(prompt)
+        self.out.flush()
+
+    def answered(self) -> None:
+        self.prompt = None  # The user hit enter - the cursor is on a fresh line
+
+    def say(self, text: str) -> None:
+        self.out.write(text + "\n")
+        self.out.flush()
+
+    def notice(self, text: str) -> None:
+        """Something arrived on its own (a reminder, a slow answer): show it, then the prompt again."""
+        if self.prompt is None:
+            self.say(text)
+            return
+        self.out.write("\n" + text + "\n" + self.prompt)
+        self.out.flush()
+
+
+def _read_lines(stream, loop, lines: asyncio.Queue) -> None:
+    """Feeds input lines to the loop from a daemon thread; None marks the end of input."""
+    try:
+        for line in iter(stream.readline, ""):
+            loop.call_soon_threadsafe(lines.put_nowait, line)
+        loop.call_soon_threadsafe(lines.put_nowait, None)
+    except RuntimeError:
+        pass  # The loop closed first - nobody's listening any more
+
+
+async def interactive(assistant, stdin=None, stdout=None) -> None:
+    """Runs one CLI session to the farewell (or end of input)."""
+    loop = asyncio.get_running_loop()
+    console = _Console(stdout or sys.stdout)
+    lines = asyncio.Queue()
+    threading.Thread(target=_read_lines, args=(stdin or sys.stdin, loop, lines),
+                     name="cli-input", daemon=True).start()
+    # One thread for slow answers: they run beside the prompt, but never beside each other
+    slow = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cli-answer")
+    pending = set()
+
+    async def answer_later(respond) -> None:
+        console.notice(await loop.run_in_executor(slow, respond))
+
+    assistant.notify = lambda text: loop.call_soon_threadsafe(console.notice, text)
+    try:
+        conversation = assistant.onboarding()
+        try:
+            question = next(conversation)
+            while True:
+                console.ask(question)
+                line = await lines.get()
+                if line is None:
+                    return
+                console.answered()
+                question = conversation.send(line)
+        except StopIteration as done:
+            console.say(done.value)
+
+        assistant.start_reminders()
+        menu = "main"
+        while assistant.running:
+            console.ask(assistant.cli_prompt(menu))
+            line = await lines.get()
+            if line is None:
+                break
+            console.answered()
+            answering, (menu, respond) = menu, assistant.cli_step(menu, line)
+            if assistant.cli_waits_on_providers(answering, line):
+                task = loop.create_task(answer_later(respond))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                continue
+            if pending and menu == answering:
+                # Anything but moving between menus may read what those answers change (or say farewell)
+                await asyncio.wait(pending)
+            console.say(respond())
+            if answering == "main" and menu == "main" and assistant.running:
+                console.say("\nWhat's next on your digital wellness journey?")
+                console.say(assistant.show_menu())
+        if pending:
+            await asyncio.wait(pending)  # Answers already on their way still get shown
+    finally:
+        assistant.stop_reminders()
+        assistant.notify = print
+        slow.shutdown(wait=False, cancel_futures=True)
+
+
+def run_batch(assistant, lines, out=None) -> dict:
+    """
+    Answers each scripted selection in order, writing responses to out (if
+    given). Blank lines and # comments are skipped; an 8 at the main menu
+    ends the run like it ends a session. Returns timing numbers.
+    """
+    menu = "main"
+    samples = []
+    started = time.perf_counter()
+    for line in lines:
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        begun = time.perf_counter()
+        menu, respond = assistant.cli_step(menu, line)
+        response = respond()
+        samples.append(time.perf_counter() - begun)
+        if out is not None:
+            out.write(response + "\n")
+        if not assistant.running:
+            break
+    elapsed = time.perf_counter() - started
+    samples.sort()
+
+    def percentile(fraction: float) -> float:
+        return round(samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1e6, 1) if samples else 0.0
+
+    return {
+        "selections": len(samples),
+        "seconds": round(elapsed, 3),
+        "per_second": round(len(samples) / elapsed, 1) if elapsed else None,
+        "p50_us": percentile(0.50),
+        "p99_us": percentile(0.99),
+    }
+
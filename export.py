@@ -0,0 +1,166 @@
+"""
+Export: everybody's wellness journey, to go 📦
+
+Streams one row per user - activity history, interaction count and
+progress against their screen time goal - as CSV or NDJSON, straight off
+the session store's ``iter_states``. Rows are built and encoded one at a
+time and flushed in small chunks, so an export's memory doesn't grow with
+the number of users - ten million cost what ten do.
+
+Every row carries a ``cursor``. Hand the last one you received back (the
+``cursor`` query parameter, or ``python main.py export --resume``) and the
+export carries on from there. On the in-memory store that's right after
+that user; on redis it's the start of that user's SCAN page, so a few rows
+may come again - dedupe on ``session_id`` if that matters.
+"""
+import csv
+import io
+import json
+from datetime import date
+
+from user_state import UserState
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+COLUMNS = ["session_id", "user_name", "screen_time_goal", "interaction_count", "last_mood",
+           "mindful_moments", "recent_activities", "activity_counts", "tracked_events",
+           "today_hours", "total_tracked_hours", "goal_progress", "cursor"]
+# Rows per chunk written to the response - big enough to keep per-chunk overhead down, small enough to stream
+ROWS_PER_CHUNK = 200
+
+
+def export_row(session_id: str, state: dict, cursor: str, today: int) -> dict:
+    """One user's exportable numbers. ``goal_progress`` is today's tracked hours / goal (None without both)."""
+    record = UserState.from_dict(state)
+    today_hours = record.screen_time.hours_on(today)
+    goal = record.screen_time_goal
+    return {
+        "session_id": session_id,
+        "user_name": record.user_name,
+        "screen_time_goal": goal,
+        "interaction_count": record.interaction_count,
+        "last_mood": record.last_mood,
+        "mindful_moments": record.activities.total,
+        "recent_activities": list(record.activities),
+        "activity_counts": record.activities.by_title,
+        "tracked_events": record.screen_time.events,
+        "today_hours": round(today_hours, 3),
+        "total_tracked_hours": round(record.screen_time.total_seconds / 3600, 3),
+        "goal_progress": round(today_hours / goal, 3) if goal and record.screen_time.events else None,
+        "cursor": cursor,
+    }
+
+
+def iter_rows(store, cursor: str = None, limit: int = None):
+    """Export rows for every session after cursor (at most limit of them)."""
+    today = date.today().toordinal()
+    for count, (session_id, state, position) in enumerate(store.iter_states(cursor)):
+        if limit is not None and count >= limit:
+            return
+        yield export_row(session_id, state, position, today)
+
+
+def _ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+def _csv(rows, header: bool):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if header:
+        writer.writerow(COLUMNS)
+    for row in rows:
+        # Lists and dicts go in as JSON, so nothing is lost on the way to a spreadsheet
+        writer.writerow([json.dumps(row[column], ensure_ascii=False)
+                         if isinstance(row[column], (list, dict)) else row[column] for column in COLUMNS])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def iter_export(store, fmt: str = "ndjson", cursor: str = None, limit: int = None, header: bool = True):
+    """
+    The export as text chunks of up to ROWS_PER_CHUNK rows. CSV starts
+    with a header row unless header=False (e.g. when appending to a file).
+    """
+    rows = iter_rows(store, cursor, limit)
+    lines = _csv(rows, header) if fmt == "csv" else _ndjson(rows)
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= ROWS_PER_CHUNK:
+            yield "".join(chunk)
+            chunk.clear()
+    if chunk:
+        yield "".join(chunk)
+
+
+def _last_ndjson_row(tail: bytes, at_start: bool):
+    """(cursor, end offset) of the last complete line in tail, or None if tail doesn't hold one whole."""
+    end = tail.rfind(b"\n")
+    start = tail.rfind(b"\n", 0, max(end, 0)) + 1
+    if end < 0 or (start == 0 and not at_start):
+        return None
+    return json.loads(tail[start:end])["cursor"], end + 1
+
+
+def _csv_records(lines: list) -> tuple:
+    """
+    (last complete record or None, physical lines it ends on) parsing lines
+    as CSV. Raises ValueError when lines[0] doesn't start a record - we're
+    inside a quoted field, so the rows come out the wrong shape.
+    """
+    reader = csv.reader((line.decode("utf-8") + "\n" for line in lines), strict=True)
+    last, consumed = None, 0
+    try:
+        for fields in reader:
+            if len(fields) != len(COLUMNS):
+                raise ValueError("not a record boundary")
+            last, consumed = fields, reader.line_num
+    except csv.Error:
+        if reader.line_num < len(lines):
+            raise ValueError("not a record boundary")
+        # Ran out inside a quoted field: the last record is torn
+    return last, consumed
+
+
+def _last_csv_row(tail: bytes, at_start: bool):
+    """
+    (cursor, end offset) of the last complete record in tail, or None. A
+    quoted field (a user name, say) may hold newlines, so a record can span
+    lines: tail is parsed from the first line that really starts one.
+    """
+    lines = tail.split(b"\n")[:-1]  # Whatever follows the last newline is torn
+    for first in range(0 if at_start else 1, len(lines)):  # Mid-window, line 0 is probably a fragment
+        try:
+            fields, consumed = _csv_records(lines[first:])
+        except (ValueError, UnicodeDecodeError):
+            continue
+        if fields is None:
+            return None
+        end = sum(len(line) + 1 for line in lines[:first + consumed])
+        return (None if fields == COLUMNS else fields[-1]), end
+    return None
+
+
+def resume_point(path: str, fmt: str) -> tuple:
+    """
+    Where an interrupted export file left off: (cursor of its last complete
+    row or None, byte length of the complete part). Anything after that is a
+    torn row and should be cut before appending.
+    """
+    last_row = _last_csv_row if fmt == "csv" else _last_ndjson_row
+    with open(path, "rb") as f:
+        size = f.seek(0, io.SEEK_END)
+        window = 64 * 1024
+        while True:
+            offset = max(0, size - window)
+            f.seek(offset)
+            found = last_row(f.read(), offset == 0)
+            if found is not None or offset == 0:
+                break
+            window *= 4  # A very long last row - look further back
+    if found is None:
+        return None, 0
+    cursor, end = found
+    return cursor, offset + end
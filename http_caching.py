@@ -0,0 +1,141 @@
+"""
+HTTP Caching: say it once, then just nod 📨
+
+Menus and technique write-ups are the same for everyone until the content
+changes, so there's no reason to rebuild, re-serialize and re-compress them
+on every request. Each static payload is encoded once - compact JSON plus
+gzip (and brotli, if the ``brotli`` package is installed) - and stamped with
+a strong ETag taken from the bytes. A repeat visit sends ``If-None-Match``
+and gets a body-less 304; a first visit gets the pre-compressed body that
+best matches its ``Accept-Encoding``.
+
+Dynamic replies (random tips, per-user progress) are marked ``no-store``
+and carry no ETag. They're only ever sent once, so they're compressed after
+negotiation - in the one coding the client gets, at a quick level.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+from typing import NamedTuple
+
+from flask import Response, request
+
+try:
+    import brotli  # Optional - gzip covers every browser anyway
+except ImportError:
+    brotli = None
+
+# How long browsers and proxies may reuse a static payload without asking (seconds)
+STATIC_MAX_AGE = int(os.environ.get("DETOX_STATIC_MAX_AGE", "300"))
+# Anything smaller isn't worth the compression headers
+MIN_COMPRESS_BYTES = 256
+# Distinct static payloads kept encoded (menus, techniques, tips... a few dozen in practice)
+MAX_STATIC_ENTRIES = 512
+# Compression levels for per-request bodies: most of the savings of the maximum, at a fraction of the CPU
+DYNAMIC_GZIP_LEVEL = 6
+DYNAMIC_BROTLI_QUALITY = 4
+
+STATIC_CACHE_CONTROL = f"public, max-age={STATIC_MAX_AGE}"
+DYNAMIC_CACHE_CONTROL = "private, no-store"
+
+
+class EncodedPayload(NamedTuple):
+    tag: str  # Strong validator for the identity body (unquoted)
+    bodies: dict  # content-coding -> bytes; always has 'identity'
+
+
+def _serialize(payload) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def encode_payload(payload) -> EncodedPayload:
+    """Serializes once and pre-compresses every coding we can offer."""
+    body = _serialize(payload)
+    bodies = {"identity": body}
+    if len(body) >= MIN_COMPRESS_BYTES:
+        bodies["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+        if brotli is not None:
+            bodies["br"] = brotli.compress(body, quality=11)
+    return EncodedPayload(hashlib.sha256(body).hexdigest()[:32], bodies)
+
+
+def _negotiate(codings) -> str:
+    """The best of codings that the client accepts (identity is always acceptable)."""
+    offered = [coding for coding in ("br", "gzip") if coding in codings]
+    if offered:
+        best = request.accept_encodings.best_match(offered)
+        if best:
+            return best
+    return "identity"
+
+
+def _etag(payload: EncodedPayload, coding: str) -> str:
+    # Strong ETags must differ between codings of the same content
+    return payload.tag if coding == "identity" else f"{payload.tag}-{coding}"
+
+
+def payload_response(payload: EncodedPayload, cache_control: str, status: int = 200,
+                     conditional: bool = True) -> Response:
+    """
+    Sends an encoded payload, or a 304 when the client's If-None-Match
+    already names any coding of it (the content is what's being validated).
+    """
+    coding = _negotiate(payload.bodies)
+    headers = {"Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if conditional:
+        headers["ETag"] = f'"{_etag(payload, coding)}"'
+        if any(request.if_none_match.contains_weak(_etag(payload, known)) for known in payload.bodies):
+            return Response(status=304, headers=headers)
+    if coding != "identity":
+        headers["Content-Encoding"] = coding
+    return Response(payload.bodies[coding], status=status, headers=headers, mimetype="application/json")
+
+
+_static = {}  # key -> EncodedPayload
+_static_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def static_json(key, build) -> Response:
+    """
+    A cacheable JSON response for a payload that depends only on key.
+    build() runs once per key; include a content version in the key when
+    the payload comes from the (hot-reloaded) catalog. A build() returning
+    None means "no such thing" and yields a 404 that isn't cached.
+    """
+    with _static_lock:
+        payload = _static.get(key)
+    if payload is None:
+        data = build()
+        if data is None:
+            return dynamic_json({"error": "Not found"}, status=404)
+        payload = encode_payload(data)
+        with _static_lock:
+            if len(_static) >= MAX_STATIC_ENTRIES:
+                _static.clear()  # Only happens when content versions pile up - start fresh
+            _static[key] = payload
+            _stats["misses"] += 1
+    else:
+        _stats["hits"] += 1
+    return payload_response(payload, STATIC_CACHE_CONTROL)
+
+
+def dynamic_json(data, status: int = 200) -> Response:
+    """A per-request JSON response: compressed when worth it (in the negotiated coding only), never cached."""
+    body = _serialize(data)
+    headers = {"Cache-Control": DYNAMIC_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    if len(body) >= MIN_COMPRESS_BYTES:
+        coding = _negotiate(("br", "gzip") if brotli is not None else ("gzip",))
+        if coding == "br":
+            body = brotli.compress(body, quality=DYNAMIC_BROTLI_QUALITY)
+        elif coding == "gzip":
+            body = gzip.compress(body, compresslevel=DYNAMIC_GZIP_LEVEL, mtime=0)
+        if coding != "identity":
+            headers["Content-Encoding"] = coding
+    return Response(body, status=status, headers=headers, mimetype="application/json")
+
+
+def static_cache_stats() -> dict:
+    return {"entries": len(_static), **_stats}
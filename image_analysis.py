@@ -0,0 +1,434 @@
+"""
+Image Analysis Engine: brightness checks without the pixel-by-pixel busywork 📸
+
+Pillow already knows how to count pixels in C, so we let it: every statistic
+here is derived from a 256-bin grayscale histogram instead of a Python loop
+over ``getdata()``. Think of it as a census taker who reads the summary table
+instead of knocking on every door.
+
+Three analysis levels are available, cheapest first:
+
+* ``metadata`` - size, format and EXIF straight from the file header. No
+  pixels are decoded at all, which is all the resolution check ever needed.
+* ``full`` - exact statistics over every pixel. The image is converted to
+  grayscale in horizontal strips, so peak extra memory is one strip rather
+  than a second full-size copy of the picture.
+* ``fast`` - decodes at reduced scale (JPEG DCT scaling via ``draft``) and
+  box-downsamples to at most ``FAST_MAX_PIXELS`` before counting.
+
+Error bound for ``fast`` mode: box averaging preserves the mean, so the only
+drift comes from per-pixel rounding (at most 0.5 levels per resampling step)
+and from partially filled edge boxes that get the same weight as full ones.
+With a reduction factor ``f`` on a ``W x H`` image the average brightness is
+within ``1 + 255 * f * (1/W + 1/H)`` levels of the exact value - under two
+levels for a typical 12MP phone screenshot. Contrast (standard deviation) is
+*not* bounded: averaging smooths fine detail, so the fast figure is a
+lower-bound estimate.
+
+Every level checks the header dimensions against ``MAX_IMAGE_PIXELS`` before
+decoding, so decompression-bomb-sized uploads are turned away while they are
+still just a few kilobytes of header.
+"""
+import atexit
+import hashlib
+import io
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from PIL import ExifTags, Image
+
+from caching import DiskCache, LRUCache, TieredCache
+
+# Fast mode never counts more than this many pixels (~65K, a 256x256 thumbnail)
+FAST_MAX_PIXELS = 256 * 256
+
+# Rows converted to grayscale at a time in full mode (memory vs. call overhead)
+STRIP_HEIGHT = 256
+
+# Modes Image.reduce() can box-filter directly; everything else goes grayscale first
+_REDUCIBLE_MODES = ("L", "LA", "RGB", "RGBA", "RGBX", "CMYK", "I", "F")
+
+ANALYSIS_MODES = ("metadata", "fast", "full")
+
+# Anything bigger is refused before decoding (default 50MP - well past any phone screenshot)
+MAX_IMAGE_PIXELS = int(os.environ.get("DETOX_MAX_IMAGE_PIXELS", str(50_000_000)))
+
+# Result cache sizing: ~1.5KB per entry, so the default 16MB holds ~10K images
+CACHE_MAX_BYTES = int(os.environ.get("DETOX_IMAGE_CACHE_MB", "16")) * 1024 * 1024
+CACHE_DIR = os.environ.get("DETOX_IMAGE_CACHE_DIR")  # Set it to keep results across restarts
+
+# Bump when analysis output changes so stale on-disk results are ignored
+_CACHE_VERSION = "1"
+
+
+def histogram_stats(histogram: list) -> tuple:
+    """
+    Returns (pixel_count, mean, standard_deviation) for a 256-bin histogram.
+    Pure arithmetic over 256 numbers - the image size no longer matters.
+    """
+    pixels = sum(histogram)
+    if not pixels:
+        return 0, 0.0, 0.0
+    total = sum(level * count for level, count in enumerate(histogram))
+    mean = total / pixels
+    variance = sum(count * (level - mean) ** 2 for level, count in enumerate(histogram)) / pixels
+    return pixels, mean, math.sqrt(variance)
+
+
+def _grayscale_histogram(img: Image.Image) -> list:
+    """Builds the grayscale histogram strip by strip (bounded extra memory)."""
+    if img.mode == "L":
+        return img.histogram()
+
+    width, height = img.size
+    histogram = [0] * 256
+    for top in range(0, height, STRIP_HEIGHT):
+        strip = img.crop((0, top, width, min(top + STRIP_HEIGHT, height))).convert("L")
+        for level, count in enumerate(strip.histogram()):
+            histogram[level] += count
+    return histogram
+
+
+def _fast_sample(img: Image.Image) -> Image.Image:
+    """
+    Shrinks the image to at most FAST_MAX_PIXELS using the cheapest decoder
+    tricks available, then returns it in grayscale.
+    """
+    width, height = img.size
+    factor = max(1, math.ceil(math.sqrt(width * height / FAST_MAX_PIXELS)))
+    if factor == 1:
+        return img.convert("L")
+
+    # JPEG can skip most of the decode work entirely (no-op for other formats)
+    img.draft("L", (max(1, width // factor), max(1, height // factor)))
+
+    if img.mode not in _REDUCIBLE_MODES:
+        img = img.convert("L")
+    draft_width, draft_height = img.size
+    remaining = max(1, math.ceil(math.sqrt(draft_width * draft_height / FAST_MAX_PIXELS)))
+    if remaining > 1:
+        img = img.reduce(remaining)
+    return img.convert("L")
+
+
+class ImageTooLargeError(ValueError):
+    """Raised when an image's header promises more pixels than we're willing to decode."""
+
+
+def check_dimensions(img: Image.Image) -> None:
+    """Rejects oversized images using only the header-reported size."""
+    width, height = img.size
+    if width * height > MAX_IMAGE_PIXELS:
+        raise ImageTooLargeError(
+            f"Image is {width}x{height} ({width * height:,} pixels); "
+            f"the limit is {MAX_IMAGE_PIXELS:,} pixels"
+        )
+
+
+def _exif_summary(img: Image.Image) -> dict:
+    """Readable EXIF tags with JSON-friendly values (binary blobs are skipped)."""
+    summary = {}
+    for tag, value in img.getexif().items():
+        if isinstance(value, bytes):
+            continue
+        if not isinstance(value, (int, float, str)):
+            try:
+                value = float(value)  # IFDRational and friends
+            except (TypeError, ValueError, ZeroDivisionError):
+                value = str(value)
+        summary[ExifTags.TAGS.get(tag, str(tag))] = value
+    return summary
+
+
+def read_metadata(img: Image.Image) -> dict:
+    """Header-only facts about an image - never decodes a single pixel."""
+    width, height = img.size
+    return {
+        "width": width,
+        "height": height,
+        "format": img.format,
+        "color_mode": img.mode,
+        "exif": _exif_summary(img),
+        "mode": "metadata",
+    }
+
+
+def analyze_image(img: Image.Image, mode: str = "full") -> dict:
+    """
+    Computes brightness statistics for an open image.
+
+    With ``mode="metadata"`` only header facts are returned (see
+    read_metadata). Otherwise returns a dict with the original ``width``/``height``, ``brightness``
+    (mean gray level, 0-255), ``contrast`` (standard deviation), the 256-bin
+    ``histogram``, the ``mode`` used and how many pixels were ``sampled``.
+    """
+    if mode not in ANALYSIS_MODES:
+        raise ValueError(f"Unknown analysis mode '{mode}' (choose from {', '.join(ANALYSIS_MODES)})")
+
+    check_dimensions(img)
+    if mode == "metadata":
+        return read_metadata(img)
+
+    width, height = img.size
+    if mode == "fast":
+        histogram = _fast_sample(img).histogram()
+    else:
+        histogram = _grayscale_histogram(img)
+
+    sampled, brightness, contrast = histogram_stats(histogram)
+    return {
+        "width": width,
+        "height": height,
+        "brightness": brightness,
+        "contrast": contrast,
+        "histogram": histogram,
+        "format": img.format,
+        "mode": mode,
+        "sampled": sampled,
+    }
+
+
+def format_focus_report(result: dict) -> str:
+    """
+    Turns analysis numbers into the classic focus report text.
+    The wording is unchanged from the original loop-based version - clients
+    parsing it won't notice a thing (except the speed).
+    """
+    width, height = result["width"], result["height"]
+    avg_brightness = result.get("brightness")  # Absent for header-only metadata results
+
+    # Generate focus recommendations based on image properties
+    recommendations = []
+    if avg_brightness is not None and avg_brightness < 128:
+        recommendations.append("🔆 Image appears dark - consider better lighting for reduced eye strain")
+    if width < 800 or height < 600:
+        recommendations.append("📏 Image resolution is low - viewing smaller images may require more focus")
+
+    if avg_brightness is None:
+        details = [f"• Format: {result.get('format') or 'unknown'}"]
+    else:
+        details = [f"• Average Brightness: {avg_brightness:.1f}/255"]
+
+    return "\n".join([
+        "📸 Image Analysis for Focus:",
+        f"• Size: {width}x{height}",
+        *details,
+        "\n🎯 Focus Recommendations:",
+        *recommendations,
+        "\n💡 Tip: Take a 20-second break every 20 minutes when viewing images"
+    ])
+
+
+# ---------------------------------------------------------------------------
+# Result cache: the same wallpaper uploaded twice is analyzed once
+# ---------------------------------------------------------------------------
+
+result_cache = TieredCache(LRUCache(CACHE_MAX_BYTES), DiskCache(CACHE_DIR) if CACHE_DIR else None)
+
+# Per-result fields that describe one particular run rather than the image
+_RUN_FIELDS = ("ok", "report", "elapsed_ms", "error", "type", "name", "cached")
+
+
+def cache_key(data: bytes, mode: str) -> str:
+    """Content hash plus every parameter that can change the answer."""
+    params = f"fast:{FAST_MAX_PIXELS}" if mode == "fast" else mode
+    return f"v{_CACHE_VERSION}:{hashlib.sha256(data).hexdigest()}:{params}"
+
+
+def analyze_bytes(data: bytes, mode: str = "full") -> dict:
+    """Analyzes encoded image bytes (JPEG, PNG, ...) without touching the cache."""
+    with Image.open(io.BytesIO(data)) as img:
+        return analyze_image(img, mode)
+
+
+def analyze_cached(data: bytes, mode: str = "full") -> dict:
+    """Analyzes encoded image bytes, reusing an earlier result for identical content."""
+    key = cache_key(data, mode)
+    result = result_cache.get(key)
+    if result is None:
+        result = analyze_bytes(data, mode)
+        result_cache.set(key, result)
+    return dict(result)
+
+
+def cache_stats() -> dict:
+    """Hit/miss counters for the image result cache."""
+    return result_cache.stats()
+
+
+# ---------------------------------------------------------------------------
+# Batch analysis: a whole day of screenshots, spread across every CPU core
+# ---------------------------------------------------------------------------
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """
+    Lazily starts one shared process pool sized to the machine's core count.
+    Workers never fork from the server itself: a child forked while a
+    scheduler or provider thread holds a lock would wait on it forever.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1,
+                                        mp_context=multiprocessing.get_context(method))
+        return _pool
+
+
+def shutdown_pool() -> None:
+    """Stops the worker processes (they'll be restarted on the next batch)."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+atexit.register(shutdown_pool)
+
+
+def analyze_image_source(source, mode: str = "full") -> dict:
+    """
+    Opens and analyzes a file path or raw image bytes, never raising.
+    Runs inside pool workers, so failures come back as data instead of
+    taking the rest of the batch down with them.
+    """
+    started = time.perf_counter()
+    try:
+        if isinstance(source, bytes):
+            result = analyze_bytes(source, mode)
+        else:
+            with Image.open(source) as img:
+                result = analyze_image(img, mode)
+        result["ok"] = True
+        result["report"] = format_focus_report(result)
+    except Exception as e:
+        result = {"ok": False, "error": str(e)}
+    result["elapsed_ms"] = (time.perf_counter() - started) * 1000
+    return result
+
+
+def _percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def iter_batch_analysis(items, mode: str = "full"):
+    """
+    Fans ``(name, source)`` pairs out across the process pool and yields each
+    result as soon as its image finishes (completion order, not input order).
+
+    Images already in the result cache skip the pool entirely, and identical
+    images in one batch are analyzed once (``cached`` is True on every
+    result that reused another's work). Every yielded dict carries ``type``: ``"result"``
+    for an image, and one final ``"summary"`` with batch latency, throughput
+    and cache numbers.
+    """
+    if mode not in ANALYSIS_MODES:
+        raise ValueError(f"Unknown analysis mode '{mode}' (choose from {', '.join(ANALYSIS_MODES)})")
+
+    started = time.perf_counter()
+    latencies = []
+    failed = 0
+    total = 0
+    cache_hits = []
+    reused = 0  # Duplicates of an image earlier in this batch
+    pending = {}  # cache key -> (bytes, [names]) still needing real work
+
+    for name, source in items:
+        total += 1
+        try:
+            if isinstance(source, bytes):
+                data = source
+            else:
+                with open(source, "rb") as f:
+                    data = f.read()
+        except OSError as e:
+            failed += 1
+            latencies.append(0.0)
+            yield {"type": "result", "name": name, "ok": False, "error": str(e), "elapsed_ms": 0.0}
+            continue
+        key = cache_key(data, mode)
+        if key in pending:
+            pending[key][1].append(name)  # Same content as one already queued - analyze it once
+            continue
+        cached = result_cache.get(key)
+        if cached is not None:
+            cache_hits.append((name, cached))
+            continue
+        try:
+            # Header peek: bombs and non-images never make it to a worker
+            with Image.open(io.BytesIO(data)) as img:
+                check_dimensions(img)
+        except Exception as e:
+            failed += 1
+            latencies.append(0.0)
+            yield {"type": "result", "name": name, "ok": False, "error": str(e), "elapsed_ms": 0.0}
+            continue
+        pending[key] = (data, [name])
+
+    futures = {}
+    if pending:
+        try:
+            pool = _get_pool()
+            futures = {pool.submit(analyze_image_source, data, mode): (names, key)
+                       for key, (data, names) in pending.items()}
+        except BrokenProcessPool:
+            # A worker died in an earlier batch - start fresh rather than fail forever
+            shutdown_pool()
+            pool = _get_pool()
+            futures = {pool.submit(analyze_image_source, data, mode): (names, key)
+                       for key, (data, names) in pending.items()}
+    del pending
+
+    # Cached answers go out first while the pool chews on the rest
+    for name, cached in cache_hits:
+        result = dict(cached, type="result", name=name, ok=True, cached=True, elapsed_ms=0.0)
+        result["report"] = format_focus_report(result)
+        latencies.append(0.0)
+        yield result
+
+    for future in as_completed(futures):
+        names, key = futures[future]
+        try:
+            result = future.result()
+        except Exception as e:  # Broken worker, unpicklable input, etc.
+            result = {"ok": False, "error": str(e), "elapsed_ms": 0.0}
+        if result["ok"]:
+            result_cache.set(key, {k: v for k, v in result.items() if k not in _RUN_FIELDS})
+        for copy, name in enumerate(names):
+            reused += bool(copy)
+            named = dict(result, type="result", name=name, cached=bool(copy))
+            if copy:
+                named["elapsed_ms"] = 0.0
+            latencies.append(named["elapsed_ms"])
+            failed += not result["ok"]
+            yield named
+
+    wall_seconds = time.perf_counter() - started
+    latencies.sort()
+    yield {
+        "type": "summary",
+        "images": total,
+        "succeeded": total - failed,
+        "failed": failed,
+        "cache_hits": len(cache_hits) + reused,
+        "workers": os.cpu_count() or 1,
+        "wall_ms": wall_seconds * 1000,
+        "images_per_second": total / wall_seconds if wall_seconds > 0 else 0.0,
+        "latency_ms": {
+            "p50": _percentile(latencies, 0.50),
+            "p95": _percentile(latencies, 0.95),
+            "max": latencies[-1] if latencies else 0.0,
+        },
+    }
@@ -0,0 +1,207 @@
+"""
+Usage Ingestion: real screen-time numbers, one line at a time 📥
+
+Phones, browser extensions and desktop trackers report app usage as
+newline-delimited JSON - one event per line, same spirit as requests.jsonl:
+
+    {"app": "instagram", "seconds": 420, "ts": 1760781600}
+    {"app": "slack", "seconds": 95}
+
+``ts`` (epoch seconds, when the usage happened) defaults to "now".
+
+The body is consumed as a stream: lines are parsed and validated as they
+arrive, collected into batches, and each batch is recorded in the
+time-bucketed usage store (which journals it, see usage_store) and folded
+into the user's running totals with one atomic session update. Memory stays flat no matter how big the upload is.
+
+Backpressure, two ways: a bounded number of concurrent ingest streams (the
+next one gets ``IngestBusyError`` - a 503 with Retry-After over HTTP), and
+since every batch is written before the next is read, a slow disk or session
+store simply slows down how fast we pull bytes off the socket.
+"""
+import io
+import json
+import os
+import threading
+import time
+from datetime import date
+
+from reminders import reminder_scheduler
+from usage_store import UsageStore, usage_store
+from user_state import ScreenTimeTally
+
+# Events folded into totals per round trip
+BATCH_SIZE = 2000
+# Concurrent ingest streams before new ones are turned away
+MAX_STREAMS = int(os.environ.get("DETOX_INGEST_STREAMS", "4"))
+# Longest acceptable event line; anything longer is rejected without being buffered
+MAX_LINE_BYTES = 4096
+# A single event can't claim more than a day of screen time
+MAX_EVENT_SECONDS = 24 * 60 * 60
+# Upload cap for one ingest request (the app-wide cap is sized for images)
+MAX_BODY_BYTES = int(os.environ.get("DETOX_INGEST_MAX_MB", "512")) * 1024 * 1024
+# Line errors echoed back (the rest are only counted)
+MAX_REPORTED_ERRORS = 20
+# How often usage rings of users whose session has gone are dropped (seconds)
+USAGE_SWEEP_SECONDS = float(os.environ.get("DETOX_USAGE_SWEEP_SECONDS", "300"))
+
+
+class IngestBusyError(RuntimeError):
+    """Too many ingest streams in flight - try again shortly."""
+
+
+def iter_lines(stream, limit: int = MAX_LINE_BYTES):
+    """
+    Yields the stream's lines (bytes, newline stripped) without ever holding
+    more than ``limit`` bytes of one line. Overlong lines come back as None.
+    """
+    if not isinstance(stream, io.BufferedIOBase):
+        stream = io.BufferedReader(stream, 64 * 1024)
+    while True:
+        line = stream.readline(limit + 1)
+        if not line:
+            return
+        if len(line) > limit and not line.endswith(b"\n"):
+            while line and not line.endswith(b"\n"):  # Skip the rest of the monster
+                line = stream.readline(64 * 1024)
+            yield None
+            continue
+        yield line.rstrip(b"\r\n")
+
+
+def parse_event(line: bytes, now: float) -> tuple:
+    """One validated event as (ts, app, seconds); ValueError says what's wrong."""
+    if line is None:
+        raise ValueError(f"line longer than {MAX_LINE_BYTES} bytes")
+    try:
+        event = json.loads(line)
+    except ValueError:
+        raise ValueError("not valid JSON") from None
+    if not isinstance(event, dict):
+        raise ValueError("expected a JSON object")
+    app = event.get("app")
+    if not isinstance(app, str) or not app.strip() or len(app) > 100:
+        raise ValueError("'app' must be a non-empty string")
+    seconds = event.get("seconds")
+    if isinstance(seconds, bool) or not isinstance(seconds, (int, float)) or not 0 < seconds <= MAX_EVENT_SECONDS:
+        raise ValueError(f"'seconds' must be a number between 0 and {MAX_EVENT_SECONDS}")
+    ts = event.get("ts", now)
+    if isinstance(ts, bool) or not isinstance(ts, (int, float)) or not 0 < ts <= now + 300:
+        raise ValueError("'ts' must be epoch seconds, not in the future")
+    return ts, app.strip(), seconds
+
+
+class Ingestor:
+    """Streams events into the session store's per-user screen-time totals."""
+
+    def __init__(self, store, usage: UsageStore = None, batch_size: int = BATCH_SIZE,
+                 max_streams: int = MAX_STREAMS):
+        self.store = store
+        self.usage = usage
+        self.batch_size = batch_size
+        self._streams = threading.BoundedSemaphore(max_streams)
+        self.accepted = 0
+        self.rejected = 0
+        self.busy_rejections = 0
+        self._sweeping = False
+
+    def ingest(self, user_key: str, stream, wait: float = 0.0) -> dict:
+        """
+        Consumes an NDJSON byte stream for one user and returns a summary.
+        Waits up to ``wait`` seconds for a free stream slot, then raises
+        IngestBusyError.
+        """
+        if not self._streams.acquire(timeout=wait):
+            self.busy_rejections += 1
+            raise IngestBusyError("Ingestion is at capacity")
+        try:
+            return self._consume(user_key, stream)
+        finally:
+            self._streams.release()
+
+    def _consume(self, user_key: str, stream) -> dict:
+        started = time.perf_counter()
+        now = time.time()
+        accepted = rejected = batches = 0
+        errors = []
+        batch = []
+        tally = None
+        for number, line in enumerate(iter_lines(stream), 1):
+            if line is not None and not line.strip():
+                continue
+            try:
+                batch.append(parse_event(line, now))
+            except ValueError as e:
+                rejected += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({"line": number, "error": str(e)})
+                continue
+            if len(batch) >= self.batch_size:
+                tally = self._flush(user_key, batch)
+                accepted += len(batch)
+                batches += 1
+                batch = []
+        if batch:
+            tally = self._flush(user_key, batch)
+            accepted += len(batch)
+            batches += 1
+        self.accepted += accepted
+        self.rejected += rejected
+
+        elapsed = time.perf_counter() - started
+        if tally is None:
+            tally = ScreenTimeTally.from_dict((self.store.get(user_key) or {}).get("screen_time", {}))
+        return {
+            "accepted": accepted,
+            "rejected": rejected,
+            "errors": errors,
+            "batches": batches,
+            "elapsed_ms": round(elapsed * 1000, 1),
+            "events_per_second": round((accepted + rejected) / elapsed) if elapsed > 0 else None,
+            "today_hours": round(tally.hours_on(date.today().toordinal()), 2),
+        }
+
+    def _flush(self, user_key: str, batch: list) -> ScreenTimeTally:
+        """Record the batch in the usage store, then fold it into the user's totals in one atomic update."""
+        if self.usage is not None:
+            self.usage.add_batch(user_key, batch)
+            self._schedule_sweep()
+        per_day = {}
+        for ts, _, seconds in batch:
+            day = date.fromtimestamp(ts).toordinal()
+            per_day[day] = per_day.get(day, 0.0) + seconds
+        result = {}
+
+        def apply(state):
+            tally = ScreenTimeTally.from_dict(state.get("screen_time", {}))
+            for day in sorted(per_day):  # Oldest first, so "today" ends up the latest day
+                tally.add(day, per_day[day], events=0)
+            tally.events += len(batch)
+            state["screen_time"] = tally.to_dict()
+            result["tally"] = tally
+            return state
+
+        self.store.update(user_key, apply)
+        return result["tally"]
+
+    def _schedule_sweep(self) -> None:
+        """Once usage is being recorded, periodically forget users whose session expired."""
+        if not self._sweeping:
+            self._sweeping = True
+            reminder_scheduler().add(("usage-sweep", id(self)), USAGE_SWEEP_SECONDS, self.sweep)
+
+    def sweep(self) -> int:
+        """Drops usage rings of users the session store no longer has; returns how many."""
+        return self.usage.forget_missing(lambda user: self.store.peek(user) is not None)
+
+    def stats(self) -> dict:
+        return {
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "busy_rejections": self.busy_rejections,
+        }
+
+
+def ingestor_for(store) -> Ingestor:
+    """An ingestor over the given session store and the process-wide usage store."""
+    return Ingestor(store, usage_store())
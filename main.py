@@ -7,28 +7,49 @@ This assistant helps users maintain a healthy relationship with technology
 through mindful reminders, activity suggestions, and a dash of digital wisdom.
 Think of it as your personal Cal Newport with a sense of humor!
 """
-import requests
-import schedule
+import asyncio
 import time
 import random
-import threading
-from datetime import datetime
-from PIL import Image
+from datetime import date, datetime
 import io
-from flask import Flask, render_template, request, jsonify
-import spotipy # Added import
-import openai # Added import
+import json
+from flask import Flask, Response, g, render_template, request, jsonify
 import os
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+from catalog import catalog
+from http_caching import dynamic_json, static_cache_stats, static_json
+from ingest import MAX_BODY_BYTES, IngestBusyError, ingestor_for
+from metrics import histogram, instrumented, profiler, register_collector, render as render_metrics
+from prompt_pool import shared_pool
+from providers import ProviderClients, default_clients, response_cache
+from rate_limit import in_flight, rate_limiter
+from reminder_stream import SSE_PORT, STREAM_PATH, reminder_broker
+from reminders import reminder_scheduler
+from resilience import breaker_stats, breakers
+from sessions import InMemorySessionStore, session_store_from_env
+from usage_store import usage_store
+from user_state import ActivityLog, UserState
+
+# Integration credentials, read once per process (all optional)
+API_KEYS = {
+    'spotify': os.getenv('SPOTIFY_API_KEY', ''),
+    'fitbit': os.getenv('FITBIT_API_KEY', ''),
+    'openai': os.getenv('OPENAI_API_KEY', ''),
+}
+
+# The CLI user's key for usage events and reminders (web users go by session id)
+LOCAL_USER = 'local'
+
+# Shared worker threads for integration calls (so slow APIs can run side by side)
+_provider_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="provider")
+
+
+def _state_field(name: str) -> property:
+    """Exposes a UserState field as an assistant attribute."""
+    return property(lambda self: getattr(self.state, name),
+                    lambda self, value: setattr(self.state, name, value))
 
-app = Flask(__name__)
-
-@app.route('/')
-def home():
-    return render_template('index.html')
-
-if __name__ == '__main__':
-    port = int(os.environ.get("PORT", 5000))  # 👈 this is required!
-    app.run(host='0.0.0.0', port=port)         # 👈 this too!
 
 class DigitalDetoxAssistant:
     """
@@ -36,454 +57,468 @@ class DigitalDetoxAssistant:
     maintain healthy screen time habits while keeping their sanity intact.
     """
 
-    def __init__(self):
+    # Integration lookups: provider name -> (method, seconds we're willing to wait, fallback)
+    PROVIDERS = {
+        'music': ('get_music_recommendation', 2.0, "🎵 Explore calming instrumental music"),
+        'workout': ('get_workout_suggestion', 2.0, "💪 Try basic stretching exercises"),
+        'creative': ('get_creative_prompt', 3.0, "🎨 Express yourself through simple sketching"),
+    }
+
+    # Menus never change at runtime, so they live here once (and the JSON API can cache them)
+    MENUS = {
+        'main': """
+            📋 Digital Wellness Menu:
+            1️⃣ Focus Tips & Techniques
+            2️⃣ Screen-Free Activity Suggestions
+            3️⃣ Check Screen Time Goal
+            4️⃣ Productivity Enhancement
+            5️⃣ Social Media Reality Check
+            6️⃣ Digital Wellness Report
+            7️⃣ Image Focus Analysis
+            8️⃣ Exit Program
+
+            Enter a number (1-7) to choose your path to digital wellness! 🌟
+            """,
+        'activities': """
+            🎯 Screen-Free Activities:
+            a) 🎵 Music & Rhythm - Connect with melodies and rhythms
+            b) 💪 Physical Activity - Get moving and energized
+            c) 🎨 Creative Expression - Unleash your artistic side
+            d) 📚 Reading Adventure - Dive into a good book
+            e) 🤝 Social Connection - Connect offline
+            f) 🌈 Activity Sampler - A taste of every category
+            r) Return to main menu
+
+            Choose your adventure (a-f, or r): """,
+        'productivity': """
+            ⚡ Productivity Enhancement:
+            a) ⏲️ Pomodoro Technique - Work in focused sprints
+            b) 🧠 Deep Work Rituals - Design your focus fortress
+            c) 📦 Task Batching - Group similar tasks
+            d) 📅 Calendar Blocking - Time architecture
+            e) 🎯 Distraction Audit - Track focus destroyers
+            r) Return to main menu
+
+            Choose your technique (a-e, or r): """,
+    }
+
+    # Main menu choices -> what get_smart_response answers with (8 is the way out)
+    SMART_RESPONSES = {
+        1: lambda self: self.get_focus_tip(),
+        2: lambda self: self.show_menu("activities"),
+        3: lambda self: self.get_screen_time_progress(),
+        4: lambda self: self.show_menu("productivity"),
+        5: lambda self: random.choice(catalog().challenges).rendered,
+        6: lambda self: self.get_wellness_summary(),
+        7: lambda self: self.read_and_focus_image("user_image.jpg"),
+        8: lambda self: self.say_farewell(),
+    }
+
+    # CLI navigation: main menu choices that open a submenu, and what each menu does with a selection
+    CLI_SUBMENUS = {'2': 'activities', '4': 'productivity'}
+    CLI_HANDLERS = {'main': 'get_smart_response', 'activities': 'get_activity_suggestion',
+                    'productivity': 'get_productivity_technique'}
+
+    # Content catalogs are shared, read-only, and hot-reloaded from content.json
+    tips = property(lambda self: catalog().tip_texts)
+    deep_work_suggestions = property(lambda self: catalog().deep_work_suggestions)
+    responses = property(lambda self: catalog().responses)
+
+    # Per-user state lives in a slotted record; the assistant adds only what it needs to act
+    __slots__ = ('state', 'running', 'api_keys', 'clients', 'usage_key', 'prefetched', 'notify')
+
+    def __init__(self, clients: ProviderClients = None, state: UserState = None, usage_key: str = LOCAL_USER,
+                 prefetched: dict = None):
         # Core attributes (or as we like to call them, "digital vital signs")
-        self.screen_time_goal = None  # The user's ambitious screen time target
-        self.reminder_interval = None  # How often we'll gently nudge (not nag!)
+        self.state = state or UserState()
         self.running = True  # Like a meditation timer, but for your whole digital life
-        self.interaction_count = 0  # Counting conversations (cheaper than therapy!)
-        self.last_mood = "neutral"  # Because even chatbots have feelings
-        self.user_name = None  # Your digital identity (minus the @ symbol)
-        self.activity_history = []  # The chronicles of your digital detox journey
-
-        # Deep work wisdom (carefully curated brain food)
-        self.tips = [
-            "Schedule specific times for deep work - your brain will thank you later!",
-            "Create a dedicated workspace free from digital distractions (yes, that means hiding your phone)",
-            "Practice 'analog leisure' - remember those things called books?",
-            "Use technology with intention, not like a squirrel chasing notifications",
-            "Implement a daily digital sunset - let your brain know it's bedtime",
-            "Focus on one task at a time - your brain isn't a browser with multiple tabs",
-            "Schedule email checks - inbox zero isn't a life goal",
-            "Keep your phone in another room during deep work (it'll survive without you)"
-        ]
-
-        # Deep work activities (a.k.a. "Screen-Free Fun")
-        self.deep_work_suggestions = [
-            "Find your focus fortress: 90 minutes of uninterrupted genius time",
-            "Embrace the ancient art of pen and paper (no, they're not obsolete)",
-            "Take a nature walk - where notifications are just birds chirping",
-            "Read a physical book (warning: may cause actual page-turning)",
-            "Think without digital crutches - like our ancestors did!",
-            "Have a real conversation (yes, with actual humans)",
-            "Practice a hobby that doesn't need charging",
-            "Organize your physical workspace (Marie Kondo would be proud)"
-        ]
-
-        # Contextual responses (wisdom for every digital dilemma)
-        self.responses = {
-            "social_media": [
-                "Plot twist: Real life has better resolution than Instagram",
-                "Breaking news: Your best life isn't waiting in your feed",
-                "Consider this: Friends in real life don't need filters"
-            ],
-            "focus": [
-                "Your focus is your superpower (no cape required)",
-                "Time-blocking: Like Tetris for your productivity",
-                "Deep work: Where the magic happens (and notifications don't)"
-            ],
-            "productivity": [
-                "Productivity isn't about tools, it's about intentions (mind blown)",
-                "Simple tools, remarkable results - like a pencil, but for your life",
-                "Less apps, more naps - the secret to true productivity"
-            ]
-        }
-
-    def read_and_focus_image(self, image_path: str) -> str:
+        self.usage_key = usage_key  # Whose ingested usage events are ours (session id on the web)
+        # Integration texts already fetched by the async server, so fetch_providers needn't block
+        self.prefetched = prefetched or {}
+        # Where the CLI user's reminders go (the event-driven CLI queues them between prompts)
+        self.notify = print
+
+        # Integration credentials (all optional - we have analog fallbacks for everything)
+        self.api_keys = API_KEYS
+        # Long-lived integration clients (shared process-wide unless you bring your own)
+        self.clients = clients or default_clients()
+        if self.api_keys['openai']:
+            # Start baking creative prompts now so the first 'c' request finds some ready
+            shared_pool(('openai', self.api_keys['openai']), self._generate_creative_prompt)
+
+    # Friendly accessors so the rest of the class can keep saying self.user_name
+    user_name = _state_field('user_name')
+    screen_time_goal = _state_field('screen_time_goal')
+    reminder_interval = _state_field('reminder_interval')
+    interaction_count = _state_field('interaction_count')
+    last_mood = _state_field('last_mood')
+
+    @property
+    def activity_history(self) -> ActivityLog:
+        return self.state.activities
+
+    def export_state(self) -> dict:
+        """This user's state as a plain dict, ready for the session store."""
+        return self.state.to_dict()
+
+    def load_state(self, state: dict) -> "DigitalDetoxAssistant":
+        """Restores a user's state from the session store (missing fields keep defaults)."""
+        self.state = UserState.from_dict(state)
+        return self
+
+    @instrumented()
+    def read_and_focus_image(self, image_path: str, mode: str = "full") -> str:
         """
         Read an image and provide focus-related insights.
+        Use mode="fast" for a downsampled estimate on huge screenshots
+        (see image_analysis for the error bound), or mode="metadata" when
+        only size/format matter - that one never decodes pixels.
         """
+        from image_analysis import analyze_cached, format_focus_report  # Pillow loads on first image
+
         try:
-            with Image.open(image_path) as img:
-                width, height = img.size
-                brightness = 0
-                pixels = 0
-
-                # Convert to grayscale for brightness analysis
-                gray_img = img.convert('L')
-                for pixel in gray_img.getdata():
-                    brightness += pixel
-                    pixels += 1
-
-                avg_brightness = brightness / pixels if pixels > 0 else 0
-
-                # Generate focus recommendations based on image properties
-                recommendations = []
-                if avg_brightness < 128:
-                    recommendations.append("🔆 Image appears dark - consider better lighting for reduced eye strain")
-                if width < 800 or height < 600:
-                    recommendations.append("📏 Image resolution is low - viewing smaller images may require more focus")
-
-                return "\n".join([
-                    "📸 Image Analysis for Focus:",
-                    f"• Size: {width}x{height}",
-                    f"• Average Brightness: {avg_brightness:.1f}/255",
-                    "\n🎯 Focus Recommendations:",
-                    *recommendations,
-                    "\n💡 Tip: Take a 20-second break every 20 minutes when viewing images"
-                ])
+            with open(image_path, 'rb') as f:
+                return format_focus_report(analyze_cached(f.read(), mode))
         except Exception as e:
             return f"⚠️ Could not process image: {str(e)}"
 
+    def read_and_focus_images(self, image_paths: list, mode: str = "full"):
+        """
+        Batch version of read_and_focus_image for a whole day of screenshots.
+        Images are analyzed across a process pool and yielded as they finish,
+        followed by a latency/throughput summary. One bad file won't spoil the batch.
+        """
+        from image_analysis import iter_batch_analysis
+
+        return iter_batch_analysis(((path, path) for path in image_paths), mode)
+
     def get_time_appropriate_activity(self) -> str:
         """
         Suggests activities based on the time of day, because timing is everything!
         Returns a mindful activity suggestion that matches the current hour.
         """
         hour = datetime.now().hour
-
         if 5 <= hour < 12:  # Morning wisdom
-            morning_activities = [
-                "Start your day with focused work (before the world wakes up)",
-                "Morning meditation (because your mind needs breakfast too)",
-                "Plan your deep work sessions (while your caffeine kicks in)",
-                "Review goals (no screens needed, just clarity)"
-            ]
-            return random.choice(morning_activities)
+            part_of_day = "morning"
         elif 12 <= hour < 17:  # Afternoon enlightenment
-            afternoon_activities = [
-                "Take a mindful walk (yes, leave the phone behind)",
-                "Deep work power hour (your afternoon coffee's best friend)",
-                "Strategic screen break (your eyes will write you a thank-you note)",
-                "Real human interaction time (remember those?)"
-            ]
-            return random.choice(afternoon_activities)
+            part_of_day = "afternoon"
         else:  # Evening zen
-            evening_activities = [
-                "Journal your wins (old school paper style)",
-                "Read a real book (swipe-free entertainment)",
-                "Non-digital hobby time (unleash your inner artist)",
-                "Plan tomorrow's success (while today's still fresh)"
-            ]
-            return random.choice(evening_activities)
-
-    def __init__(self):
-        # Existing initialization code...
-        self.api_keys = {
-            'spotify': os.getenv('SPOTIFY_API_KEY', ''),
-            'fitbit': os.getenv('FITBIT_API_KEY', ''),
-            'openai': os.getenv('OPENAI_API_KEY', ''),
-        }
+            part_of_day = "evening"
+        return random.choice(catalog().time_of_day[part_of_day])
 
+    def _cache_key(self, provider: str) -> str:
+        """Provider responses are cached per session - your playlist isn't mine, even if we're both 'Sam'."""
+        return f"{provider}:{self.usage_key}"
 
+    @instrumented()
     def get_music_recommendation(self) -> str:
         """Get personalized music recommendations from Spotify"""
         try:
             if self.api_keys['spotify']:
-                sp = spotipy.Spotify(auth=self.api_keys['spotify'])
-                playlists = sp.user_playlists('spotify')
-                return "🎵 Recommended Playlist: Lo-fi Focus Beats"
+                return response_cache.get_or_load(self._cache_key('spotify'), self._fetch_music_recommendation)
             return "🎵 Default Recommendation: Try ambient music or nature sounds"
         except Exception:
             return "🎵 Explore calming instrumental music"
 
+    def _fetch_music_recommendation(self) -> str:
+        """The actual Spotify round-trip (behind the response cache)."""
+        sp = self.clients.spotify(self.api_keys['spotify'])
+        return self._music_text(self._call_provider('spotify', sp.user_playlists, 'spotify'))
+
+    @staticmethod
+    def _music_text(playlists: dict) -> str:
+        featured = next((item['name'] for item in playlists.get('items') or () if item and item.get('name')), None)
+        return f"🎵 Recommended Playlist: {featured or 'Lo-fi Focus Beats'}"
+
+    @instrumented()
     def get_workout_suggestion(self) -> str:
         """Get personalized workout suggestions from Fitbit"""
         try:
             if self.api_keys['fitbit']:
-                # Fitbit integration would go here
-                return "💪 Suggested Activity: 10-minute cardio"
+                return response_cache.get_or_load(self._cache_key('fitbit'), self._fetch_workout_suggestion)
             return "💪 Default Exercise: Basic stretching routine"
         except Exception:
             return "💪 Try basic stretching exercises"
 
+    def _fetch_workout_suggestion(self) -> str:
+        """The actual Fitbit lookup (behind the response cache)."""
+        return self._workout_text(self._call_provider('fitbit', self.clients.fitbit_goals, self.api_keys['fitbit']))
+
+    @staticmethod
+    def _workout_text(goals: dict) -> str:
+        return f"💪 Suggested Activity: {goals.get('activeMinutes') or 10}-minute cardio"
+
+    @instrumented()
     def get_creative_prompt(self) -> str:
-        """Get creative writing prompt from OpenAI"""
+        """
+        Get creative writing prompt from OpenAI.
+        Prompts are pre-generated in the background (see prompt_pool), so this
+        never waits on a completion - an empty pool (or a user over their
+        rate limit) means the static default.
+        """
+        try:
+            # Each prompt taken is one the pool has to buy back, so takes count against the user's budget
+            return self._creative_prompt_text(
+                bool(self.api_keys['openai']) and rate_limiter.allow_user('openai', self.usage_key or None))
+        except Exception:
+            return "🎨 Express yourself through simple sketching"
+
+    def _creative_prompt_text(self, allowed: bool) -> str:
+        """A pooled prompt if the user may take one (and there is one), the static default otherwise."""
+        if allowed:
+            prompt = shared_pool(('openai', self.api_keys['openai']), self._generate_creative_prompt).take()
+            if prompt:
+                return f"🎨 Prompt: {prompt}"
+        return "🎨 Default Prompt: Draw your favorite memory"
+
+    def _generate_creative_prompt(self) -> str:
+        """One blocking OpenAI completion (runs on the prompt pool's refill threads)."""
+        rate_limiter.check('openai')  # Over budget: the pool backs off and callers get the default
+        client = self.clients.openai(self.api_keys['openai'])
+        response = breakers['openai'].call(
+            client.completions.create,
+            model="gpt-3.5-turbo-instruct",
+            prompt="Generate a creative writing prompt",
+            max_tokens=50
+        )
+        return response.choices[0].text.strip()
+
+    def _call_provider(self, provider: str, fn, *args):
+        """
+        One outbound integration call. Joins an identical call already in
+        flight; otherwise spends a token from this user's and the provider's
+        budgets and runs behind the breaker. Over budget raises RateLimited,
+        which callers' fallbacks (stale cache entry, then default) absorb.
+        """
+        def call():
+            rate_limiter.check(provider, self.usage_key or None)
+            return breakers[provider].call(fn, *args)
+
+        return in_flight.call((provider, fn.__name__, args), call)
+
+    async def _call_provider_async(self, provider: str, fn, *args):
+        """_call_provider for coroutine functions."""
+        async def call():
+            await rate_limiter.check_async(provider, self.usage_key or None)
+            return await breakers[provider].call_async(fn, *args)
+
+        return await in_flight.call_async((provider, fn.__name__, args), call)
+
+    # Native async twins of the integration calls above, for the ASGI server (see asgi.py).
+    # Same caches, same breakers, same fallbacks - just no thread parked on the network.
+
+    @instrumented()
+    async def get_music_recommendation_async(self) -> str:
+        try:
+            if self.api_keys['spotify']:
+                return await response_cache.get_or_load_async(self._cache_key('spotify'),
+                                                              self._fetch_music_recommendation_async)
+            return "🎵 Default Recommendation: Try ambient music or nature sounds"
+        except Exception:
+            return "🎵 Explore calming instrumental music"
+
+    async def _fetch_music_recommendation_async(self) -> str:
+        return self._music_text(await self._call_provider_async(
+            'spotify', self.clients.spotify_playlists_async, self.api_keys['spotify']))
+
+    @instrumented()
+    async def get_workout_suggestion_async(self) -> str:
+        try:
+            if self.api_keys['fitbit']:
+                return await response_cache.get_or_load_async(self._cache_key('fitbit'),
+                                                              self._fetch_workout_suggestion_async)
+            return "💪 Default Exercise: Basic stretching routine"
+        except Exception:
+            return "💪 Try basic stretching exercises"
+
+    async def _fetch_workout_suggestion_async(self) -> str:
+        return self._workout_text(await self._call_provider_async(
+            'fitbit', self.clients.fitbit_goals_async, self.api_keys['fitbit']))
+
+    async def get_creative_prompt_async(self) -> str:
+        """Prompts come from the pre-generated pool; only a shared rate limit's check leaves the process."""
         try:
-            if self.api_keys['openai']:
-                client = openai.OpenAI(api_key=self.api_keys['openai'])
-                response = client.completions.create(
-                    model="gpt-3.5-turbo-instruct",
-                    prompt="Generate a creative writing prompt",
-                    max_tokens=50
-                )
-                return f"🎨 Prompt: {response.choices[0].text.strip()}"
-            return "🎨 Default Prompt: Draw your favorite memory"
+            return self._creative_prompt_text(
+                bool(self.api_keys['openai'])
+                and await rate_limiter.allow_user_async('openai', self.usage_key or None))
         except Exception:
             return "🎨 Express yourself through simple sketching"
 
+    @staticmethod
+    def providers_for(category: str) -> list:
+        """The integrations a get_activity_suggestion(category) call will ask for."""
+        categories = catalog().categories
+        if category == 'f':
+            return [details['provider'] for details in categories.values() if details['provider']]
+        provider = categories.get(category, {}).get('provider')
+        return [provider] if provider else []
+
+    async def fetch_providers_async(self, names) -> dict:
+        """fetch_providers on the event loop: every integration concurrently, each on its own budget."""
+        async def fetch(name):
+            method, budget, fallback = self.PROVIDERS[name]
+            try:
+                return name, await asyncio.wait_for(getattr(self, method + '_async')(), budget)
+            except Exception:  # Timed out (or blew up) - analog fallback it is
+                return name, fallback
+
+        return dict(await asyncio.gather(*(fetch(name) for name in set(names))))
+
+    def fetch_providers(self, names) -> dict:
+        """
+        Calls several integrations at once, each on its own timeout budget.
+        Returns {provider name: text}; anything too slow gets its fallback,
+        so one sluggish API can't hold the others hostage. Texts the async
+        server already fetched (self.prefetched) are used as they are.
+        """
+        started = time.monotonic()
+        results = {name: self.prefetched[name] for name in set(names) if name in self.prefetched}
+        futures = {name: _provider_pool.submit(getattr(self, self.PROVIDERS[name][0]))
+                   for name in set(names) if name not in results}
+        for name, future in futures.items():
+            _, budget, fallback = self.PROVIDERS[name]
+            remaining = budget - (time.monotonic() - started)
+            try:
+                results[name] = future.result(timeout=max(0.0, remaining))
+            except Exception:  # Timed out (or blew up) - analog fallback it is
+                future.cancel()  # Still queued? Then it never runs - nobody's waiting for it any more
+                results[name] = fallback
+        return results
+
+    def shutdown(self) -> None:
+        """Stops the assistant and closes pooled integration connections."""
+        self.running = False
+        self.stop_reminders()
+        self.clients.close()
+
+    @instrumented()
     def get_activity_suggestion(self, category: str) -> str:
         """
         Returns a detailed activity suggestion based on category.
         Includes benefits, instructions, and motivation.
+        Only the chosen category's integration is called - reading and letter
+        writing never wait on Spotify or OpenAI.
+        """
+        if category == 'f':
+            return self.get_activity_sampler()
+        activities = catalog().activities_by_category.get(category)
+        if not activities:
+            return "Category not found. Please try again."
+
+        activity = random.choice(activities)
+        provided = self.fetch_providers([activity.provider])[activity.provider] if activity.provider else ""
+        self.activity_history.append(activity.title)
+        return activity.render(provided)
+
+    def get_activity_sampler(self) -> str:
         """
-        suggestions = {
-            'a': {  # Music & Rhythm
-                'activities': [
-                    {
-                        'title': "API-Powered Music Meditation",
-                        'description': f"""🎵 {self.get_music_recommendation()}
-
-Transform your mood with focused music listening! Find a comfortable spot, and just listen. No multitasking, no scrolling - just you and the music.
-
-Benefits: Reduces stress, improves focus, resets your mental state
-Getting Started: Pick ONE album (recommended: Lo-fi beats or Mozart)
-Tip: Use physical media like vinyl or CD to avoid digital distractions
-Time Needed: 30 minutes
-
-Remember: Music isn't background noise - it's a journey for your mind! Ready to press play?"""
-                    }
-                ]
-            },
-            'b': {  # Physical Activity
-                'activities': [
-                    {
-                        'title': "Smart Movement Break",
-                        'description': f"""💪 {self.get_workout_suggestion()}
-
-Time for a body and brain refresh! Let's do a simple but effective movement sequence that requires zero equipment and zero screentime.
-
-The Flow:
-1. 10 slow, mindful stretches
-2. 20 jumping jacks
-3. 1-minute quiet standing meditation
-
-Benefits: Boosts energy, improves focus, reduces screen fatigue
-Getting Started: Just stand up - that's step one!
-Obstacle Buster: "No time?" These 5 minutes will make the next hour more productive!
-
-Your body was designed to move, not scroll. Shall we begin?"""
-                    }
-                ]
-            },
-            'c': {  # Creative Expression
-                'activities': [
-                    {
-                        'title': "AI-Inspired Creative Session",
-                        'description': f"""🎨 {self.get_creative_prompt()}
-
-Grab a paper and pencil - we're going analog! No judgment, no perfection needed - just pure creative flow.
-
-Why This Works:
-- Exercises different brain regions than digital work
-- Improves hand-eye coordination
-- Creates a mindful break from screens
-
-Pro Tip: Don't erase! Embrace the beautiful imperfections.
-Time Investment: Just 5 minutes
-
-Remember: This isn't about art - it's about being present and playful!"""
-                    }
-                ]
-            },
-            'd': {  # Reading
-                'activities': [
-                    {
-                        'title': "Digital Minimalism by Cal Newport",
-                        'description': """📚 Today's Reading Adventure: "Digital Minimalism" by Cal Newport - a perfect guide for your journey towards intentional technology use.
-
-Key Themes:
-- Choosing attention over distraction
-- Building meaningful offline activities
-- Creating rules for digital engagement
-
-Start With: Chapter 1, just 20 minutes
-Reading Spot: Find a cozy, screen-free corner
-Mindset: This isn't just reading - it's investing in your digital wellness!
-
-Ready to dive into some life-changing wisdom?"""
-                    }
-                ]
-            },
-            'e': {  # Social Connection
-                'activities': [
-                    {
-                        'title': "The Letter Writing Revival",
-                        'description': """✉️ Let's bring back the lost art of letter writing! Choose one person you usually text with and write them a physical letter instead.
-
-Materials Needed:
-- Paper (any kind!)
-- Pen
-- Envelope (optional - even folded paper works!)
-
-Why It's Special:
-- Creates a unique, tangible connection
-- Forces slow, thoughtful communication
-- Gives both writer and recipient a screen-free moment
-
-Challenge: Write about something you'd never text about.
-Time Needed: 15-20 minutes
-
-Ready to make someone's day in an unexpectedly analog way?"""
-                    }
-                ]
-            }
-        }
-
-        if category in suggestions:
-            activity = random.choice(suggestions[category]['activities'])
-            self.activity_history.append(activity['title'])
-            return f"\n🌟 {activity['title']}\n\n{activity['description']}"
-        return "Category not found. Please try again."
+        One suggestion from every category, with all integrations fetched
+        concurrently - total wait is the slowest provider, not the sum. Each
+        one is recorded in the history, like a single suggestion would be.
+        """
+        content = catalog()
+        provided = self.fetch_providers(
+            [category['provider'] for category in content.categories.values() if category['provider']])
+        sections = []
+        for activities in content.activities_by_category.values():
+            activity = random.choice(activities)
+            self.activity_history.append(activity.title)
+            sections.append(activity.render(provided.get(activity.provider, "")).lstrip("\n"))
+        return "\n🌈 Activity Sampler - a taste of everything:\n\n" + "\n\n―――\n\n".join(sections)
+
+    def reminder_message(self) -> str:
+        """
+        Picks the right nudge for the hour - wisdom by day, digital sunset by night.
+        """
+        current_hour = datetime.now().hour
+        if 22 <= current_hour or current_hour < 6:
+            return f"\n🌙 {self.user_name}, time for digital sunset. Your brain's night mode thanks you!"
+        return f"\n⏰ {self.user_name}, mindful moment alert!\n💭 Wisdom drop: {random.choice(self.tips)}"
 
     def send_reminder(self) -> None:
         """
         Sends mindful reminders - like a gentle tap on the shoulder from
-        your digital wellness coach.
+        your digital wellness coach. The CLI prints them; web users get
+        them pushed to their open reminder streams.
         """
-        if self.running:
-            current_hour = datetime.now().hour
-            if 22 <= current_hour or current_hour < 6:
-                print(f"\n🌙 {self.user_name}, time for digital sunset. Your brain's night mode thanks you!")
-            else:
-                print(f"\n⏰ {self.user_name}, mindful moment alert!")
-                print("💭 Wisdom drop:", random.choice(self.tips))
+        if not self.running:
+            return
+        if self.usage_key == LOCAL_USER:
+            self.notify(self.reminder_message())
+        else:
+            reminder_broker().publish(self.usage_key, self.reminder_message())
 
     def start_reminders(self) -> None:
         """
-        Keeps the reminder schedule running - like a mindfulness metronome.
+        Signs this user up with the shared reminder scheduler - like a
+        mindfulness metronome, minus the private thread ticking every second.
         """
-        schedule.every(self.reminder_interval).minutes.do(self.send_reminder)
-        while self.running:
-            schedule.run_pending()
-            time.sleep(1)
+        reminder_scheduler().add(id(self), self.reminder_interval * 60, self.send_reminder)
+
+    def stop_reminders(self) -> None:
+        """No more nudges for this user (the scheduler keeps serving everyone else)."""
+        reminder_scheduler().cancel(id(self))
 
     def show_menu(self, menu_type="main", category=None) -> str:
         """
         Displays menus based on type (main/sub) and category.
         Returns a formatted menu string.
         """
-        if menu_type == "main":
-            return """
-            📋 Digital Wellness Menu:
-            1️⃣ Focus Tips & Techniques
-            2️⃣ Screen-Free Activity Suggestions
-            3️⃣ Check Screen Time Goal
-            4️⃣ Productivity Enhancement
-            5️⃣ Social Media Reality Check
-            6️⃣ Digital Wellness Report
-            7️⃣ Image Focus Analysis
-            8️⃣ Exit Program
-
-            Enter a number (1-7) to choose your path to digital wellness! 🌟
-            """
-        elif menu_type == "activities":
-            return """
-            🎯 Screen-Free Activities:
-            a) 🎵 Music & Rhythm - Connect with melodies and rhythms
-            b) 💪 Physical Activity - Get moving and energized
-            c) 🎨 Creative Expression - Unleash your artistic side
-            d) 📚 Reading Adventure - Dive into a good book
-            e) 🤝 Social Connection - Connect offline
-            r) Return to main menu
-
-            Choose your adventure (a-e, or r): """
-        elif menu_type == "productivity":
-            return """
-            ⚡ Productivity Enhancement:
-            a) ⏲️ Pomodoro Technique - Work in focused sprints
-            b) 🧠 Deep Work Rituals - Design your focus fortress
-            c) 📦 Task Batching - Group similar tasks
-            d) 📅 Calendar Blocking - Time architecture
-            e) 🎯 Distraction Audit - Track focus destroyers
-            r) Return to main menu
-
-            Choose your technique (a-e, or r): """
+        return self.MENUS.get(menu_type)
 
     def get_focus_tip(self) -> str:
         """Provides a detailed focus tip with implementation guidance."""
-        tip = random.choice(self.tips)
-        explanation = {
-            "Schedule specific times": "→ Implementation: Block your calendar for 2-3 deep work sessions (90 mins each)\n→ Pro tip: Start with your most challenging task during peak energy hours",
-            "Create a dedicated workspace": "→ Implementation: Choose a quiet corner, remove visible devices\n→ Pro tip: Use a simple timer instead of your phone's timer",
-            "Practice 'analog leisure'": "→ Implementation: Set aside 30 minutes for reading or journaling\n→ Pro tip: Keep a book and notebook within arm's reach",
-            "Use technology with intention": "→ Implementation: Write down your purpose before opening any app\n→ Pro tip: Use app timers to enforce boundaries",
-            "Implement a daily digital sunset": "→ Implementation: Stop screen use 1 hour before bed\n→ Pro tip: Switch to reading or light stretching",
-        }.get(tip[:25], "→ Implementation: Start with 25 minutes of focused work\n→ Pro tip: Take a 5-minute break between sessions")
-
-        return f"\n🎯 Focus Wisdom:\n{tip}\n\n{explanation}"
+        return random.choice(catalog().tips).rendered
 
     def get_productivity_technique(self, technique: str) -> str:
         """Returns detailed explanation of productivity techniques."""
-        techniques = {
-            'a': """⏲️ Pomodoro Technique - Your Focus Sprint Guide:
-            Step 1: Set a timer for 25 minutes
-            Step 2: Focus on one task until the timer rings
-            Step 3: Take a 5-minute break
-            Step 4: After 4 sessions, take a longer 15-30 minute break
-
-            Pro Tip: It's like giving your brain a workout with built-in rest periods!
-            Challenge: Complete 4 Pomodoros today without checking social media.""",
-
-            'b': """🧠 Deep Work Rituals - Build Your Focus Fortress:
-            1. Choose your quiet space (a room, corner, or desk)
-            2. Set a 90-minute deep work window
-            3. Shut off ALL notifications
-            4. Put up a "Do Not Disturb" sign
-            5. Keep only essential tools visible
-
-            Key Point: Deep work is like weightlifting for your concentration muscles!
-            Start Small: Begin with 45 minutes and work your way up.""",
-
-            'c': """📦 Task Batching - Group Similar Tasks:
-            • Email Time: Check all emails in one 30-minute block
-            • Call Time: Schedule all calls back-to-back
-            • Creative Time: Group all writing/design tasks
-            • Admin Time: Handle paperwork in one session
-
-            Why It Works: Your brain stays in one mode, saving mental energy!
-            Try This: Batch all your meetings into "Meeting Mondays" or "Talk Tuesdays".""",
-
-            'd': """📅 Calendar Blocking - Time Architecture:
-            Morning Block (8-10 AM): Deep Focus Work
-            Mid-Morning (10-11 AM): Email & Communication
-            Afternoon (2-4 PM): Creative Tasks
-            Late Day (4-5 PM): Planning Tomorrow
-
-            Color Code Your Calendar:
-            🔵 Deep Work
-            🟢 Meetings
-            🟡 Admin Tasks
-            🔴 Breaks""",
-
-            'e': """🎯 Distraction Audit - Track Your Focus Destroyers:
-            Step 1: Log every interruption for one day
-            Step 2: Categorize them (notifications, people, noise)
-            Step 3: Create solutions for top 3 distractions
-
-            Common Solutions:
-            • Put phone in another room
-            • Use website blockers
-            • Wear noise-canceling headphones"""
-        }
-        return techniques.get(technique, "Technique not found")
+        return catalog().techniques.get(technique, "Technique not found")
 
     def get_social_media_challenge(self) -> str:
         """Returns a random social media reality check challenge."""
-        challenges = [
-            """24-Hour Digital Detox Challenge:
-            → No social media for 24 hours
-            → Use this time for analog activities
-            → Notice how your mind feels clearer
-            → Track what you accomplished instead""",
-
-            """Compare Time vs. Value Test:
-            → Check your screen time stats
-            → List what you gained from each hour
-            → Rate each platform's value (1-10)
-            → Delete apps scoring below 5""",
-
-            """Mindful Scroll Test:
-            → Before opening any social app, ask:
-               "What am I looking for?"
-            → Set a 5-minute timer
-            → Close the app when it rings
-            → Write down if you found what you needed""",
-
-            """Notification Fasting:
-            → Mute all non-essential apps for 48 hours
-            → Keep only calls & messages
-            → Experience the mental clarity
-            → Notice improved focus""",
-
-            """1 App, 1 Hour Rule:
-            → Choose ONE social platform per day
-            → Limit usage to 1 hour
-            → Use a timer to stay honest
-            → Log what you miss (probably nothing!)"""
-        ]
-        return random.choice(challenges)
-
+        return random.choice(catalog().challenges).text
+
+    def usage_report(self):
+        """Rolling usage numbers from ingested events (None until some arrive)."""
+        return usage_store().report(self.usage_key, self.screen_time_goal)
+
+    def usage_summary(self) -> str:
+        """The measured-usage lines of the wellness report - empty without tracked data."""
+        report = self.usage_report()
+        if not report:
+            return ""
+        lines = [f"\n• Screen Time Today: {report['today_hours']:.1f} hours",
+                 f"• 7-Day Average: {report['seven_day_average_hours']:.1f} hours/day"]
+        if report['peak_hour'] is not None:
+            lines.append(f"• Peak Hour: {report['peak_hour']:02d}:00")
+        if report['top_apps']:
+            lines.append("• Top Apps: " + ", ".join(f"{app} ({hours:.1f}h)" for app, hours in report['top_apps']))
+        if report['streak_days']:
+            lines.append(f"• Under-Goal Streak: {report['streak_days']} days 🔥")
+        return "\n".join(lines)
+
+    def get_screen_time_progress(self) -> str:
+        """Today's usage against the goal - tracked if events were ingested, estimated otherwise."""
+        if self.state.screen_time.events:  # Real numbers from ingested usage events
+            used, label = self.state.screen_time.hours_on(date.today().toordinal()), "Tracked Usage"
+        else:
+            used, label = self.interaction_count * 0.05, "Estimated Usage"  # Rough estimate
+        remaining = self.screen_time_goal - used
+        trend = self.usage_report()
+        trend = f"\n• 7-Day Average: {trend['seven_day_average_hours']:.1f} hours/day" if trend else ""
+        return f"\n🎯 Screen Time Progress:\n• Daily Goal: {self.screen_time_goal} hours\n• {label}: {used:.1f} hours\n• Remaining: {max(0, remaining):.1f} hours{trend}\n\n→ Remember: Quality over quantity!"
+
+    def get_wellness_summary(self) -> str:
+        """The option 6 report: interactions, mindful moments, mood and measured usage."""
+        return f"\n📊 Digital Wellness Summary:\n• Interactions Today: {self.interaction_count}\n• Mindful Moments: {self.activity_history.total}\n• Current Mood: {self.last_mood}{self.usage_summary()}\n\n→ Keep going, {self.user_name}! Every mindful choice counts."
+
+    def say_farewell(self) -> str:
+        """Stops the assistant (and its reminders) with a parting word."""
+        self.running = False
+        self.stop_reminders()
+        return f"✨ Farewell, {self.user_name}! Your journey to digital wellness continues offline."
+
+    @instrumented()
     def get_smart_response(self, user_input: str, current_menu: str = "main") -> str:
         """
         Generates detailed responses based on numbered menu selection.
@@ -492,133 +527,641 @@ Ready to make someone's day in an unexpectedly analog way?"""
         self.interaction_count += 1
 
         try:
-            choice = int(user_input)
-            if choice == 1:
-                return self.get_focus_tip()
-            elif choice == 2:
-                activity = self.get_random_activity()
-                return f"\n🌟 Offline Adventure Suggestion:\n{activity}\n\n→ Getting Started: Set a specific time today\n→ Duration: 30-60 minutes\n→ Benefits: Reduced screen fatigue, increased creativity"
-            elif choice == 3:
-                remaining = self.screen_time_goal - (self.interaction_count * 0.05)  # Rough estimate
-                return f"\n🎯 Screen Time Progress:\n• Daily Goal: {self.screen_time_goal} hours\n• Estimated Usage: {self.interaction_count * 0.05:.1f} hours\n• Remaining: {max(0, remaining):.1f} hours\n\n→ Remember: Quality over quantity!"
-            elif choice == 4:
-                return self.show_menu("productivity")
-            elif choice == 5:
-                challenge = self.get_social_media_challenge()
-                return f"\n📱 Social Media Reality Check Challenge:\n{challenge}\n\n→ Ready to level up your digital wellness?"
-            elif choice == 6:
-                return f"\n📊 Digital Wellness Summary:\n• Interactions Today: {self.interaction_count}\n• Mindful Moments: {len(self.activity_history)}\n• Current Mood: {self.last_mood}\n\n→ Keep going, {self.user_name}! Every mindful choice counts."
-            elif choice == 7:
-                return self.read_and_focus_image("user_image.jpg")
-            elif choice == 8:
-                self.running = False
-                return f"✨ Farewell, {self.user_name}! Your journey to digital wellness continues offline."
-            else:
-                return f"\n❓ Please choose a number between 1-7\n{self.show_menu()}"
+            respond = self.SMART_RESPONSES.get(int(user_input))
         except ValueError:
             return f"\n❓ Please enter a number to select an option\n{self.show_menu()}"
+        if respond is None:
+            return f"\n❓ Please choose a number between 1-7\n{self.show_menu()}"
+        return respond(self)
 
-    def run(self):
+    def onboarding(self):
         """
-        The main show - where digital wellness meets friendly guidance!
+        The get-to-know-you conversation, as a generator any front end can
+        drive: it yields the text to show (ending in a question), is sent the
+        user's answer, and finally returns the welcome message and menu.
         """
-        # Welcome message (first impressions matter!)
-        print("✨ Welcome to Digital Minimalism Assistant ✨")
-        print("🌟 Let's make technology work for you, not the other way around! 🌟")
+        said = ("✨ Welcome to Digital Minimalism Assistant ✨\n"
+                "🌟 Let's make technology work for you, not the other way around! 🌟\n")
 
         # Get to know you (the human behind the screen)
-        self.user_name = input("👋 What shall I call you? ").strip()
-        print(f"\n🎉 Welcome aboard the digital wellness journey, {self.user_name}! 🎯")
+        self.user_name = (yield said + "👋 What shall I call you? ").strip()
+        said = f"\n🎉 Welcome aboard the digital wellness journey, {self.user_name}! 🎯\n"
 
         # Set mindful limits (because boundaries are healthy)
         while not self.screen_time_goal:
+            answer = yield said + "⏰ What's your ideal daily screen time target (in hours)? "
             try:
-                hours = float(input("⏰ What's your ideal daily screen time target (in hours)? "))
+                hours = float(answer)
                 if 0 < hours <= 24:
                     self.screen_time_goal = hours
-                    print(f"📱 Excellent choice! {hours} hours of intentional screen time it is!")
+                    said = f"📱 Excellent choice! {hours} hours of intentional screen time it is!\n"
                 else:
-                    print("❌ Let's keep it real - between 0 and 24 hours, please!")
+                    said = "❌ Let's keep it real - between 0 and 24 hours, please!\n"
             except ValueError:
-                print("❌ Numbers only, friend! Let's try again.")
+                said = "❌ Numbers only, friend! Let's try again.\n"
 
         # Set reminder frequency (gentle nudges, not digital nagging)
         while not self.reminder_interval:
+            answer = yield said + "⏱️ How often should I remind you to take mindful breaks (in minutes)? "
             try:
-                mins = int(input("⏱️ How often should I remind you to take mindful breaks (in minutes)? "))
+                mins = int(answer)
                 if 1 <= mins <= 60:
                     self.reminder_interval = mins
-                    print(f"✅ Roger that! A mindful nudge every {mins} minutes coming right up!")
+                    said = f"✅ Roger that! A mindful nudge every {mins} minutes coming right up!\n"
                 else:
-                    print("⚠️ Let's keep it between 1 and 60 minutes - we want balance, not burnout!")
+                    said = "⚠️ Let's keep it between 1 and 60 minutes - we want balance, not burnout!\n"
             except ValueError:
-                print("❌ Numbers only - we're digital minimalists, not magicians!")
-
-        # Start the reminder thread (your personal mindfulness timer)
-        reminder_thread = threading.Thread(target=self.start_reminders)
-        reminder_thread.daemon = True
-        reminder_thread.start()
-
-        # Display welcome message and menu
-        print(f"\n🙏 Welcome to your digital wellness journey, {self.user_name}!")
-        print("Let's make technology work for you, not the other way around.")
-        print(self.show_menu())
-
-        # Main interaction loop with nested menus
-        current_menu = "main"
-        while self.running:
-            if current_menu == "main":
-                user_input = input(f"💭 Enter your choice (1-7), {self.user_name}: ").strip()
-                if user_input == "2":
-                    current_menu = "activities"
-                    print(self.show_menu("activities"))
-                    continue
-                elif user_input == "4":
-                    current_menu = "productivity"
-                    print(self.show_menu("productivity"))
-                    continue
-                response = self.get_smart_response(user_input, current_menu)
-            else:
-                user_input = input("Choose your option: ").strip().lower()
-                if user_input == 'r':
-                    current_menu = "main"
-                    print(self.show_menu())
-                    continue
-                elif current_menu == "activities":
-                    response = self.get_activity_suggestion(user_input)
-                    print(response)
-                    print("\nReturn to activities menu? (y/n): ")
-                    if input().lower() != 'y':
-                        current_menu = "main"
-                        print(self.show_menu())
-                    else:
-                        print(self.show_menu("activities"))
-                    continue
-
-            print(response)
-            if self.running and not response.startswith("✨ Farewell"):
-                print("\nWhat's next on your digital wellness journey?")
-                if current_menu == "main":
-                    print(self.show_menu())
-
-
-from flask import Flask, render_template, request, jsonify
-
-app = Flask(__name__)
-assistant = DigitalDetoxAssistant()
+                said = "❌ Numbers only - we're digital minimalists, not magicians!\n"
+
+        return (f"{said}\n🙏 Welcome to your digital wellness journey, {self.user_name}!\n"
+                f"Let's make technology work for you, not the other way around.\n{self.show_menu()}")
+
+    def cli_prompt(self, menu: str) -> str:
+        """The input prompt shown at menu."""
+        if menu == "main":
+            return f"💭 Enter your choice (1-7), {self.user_name}: "
+        return "Choose your option (r to return): "
+
+    def cli_step(self, menu: str, user_input: str) -> tuple:
+        """
+        Where one line of CLI input at menu leads: (next menu, respond), with
+        respond() producing the text to show. Deciding is instant; responding
+        may wait on integrations, so each front end runs respond() as suits it.
+        """
+        user_input = user_input.strip()
+        if menu == "main" and user_input in self.CLI_SUBMENUS:
+            submenu = self.CLI_SUBMENUS[user_input]
+            return submenu, lambda: self.show_menu(submenu)
+        if menu != "main":
+            user_input = user_input.lower()
+            if user_input == 'r':
+                return "main", self.show_menu
+        handler = getattr(self, self.CLI_HANDLERS[menu])
+        return menu, lambda: handler(user_input)
+
+    def cli_waits_on_providers(self, menu: str, user_input: str) -> bool:
+        """Whether answering user_input at menu calls integrations (the event-driven CLI answers those off the input loop)."""
+        return menu == "activities" and bool(self.providers_for(user_input.strip().lower()))
+
+    def run(self):
+        """
+        The main show - where digital wellness meets friendly guidance!
+        Runs the event-driven CLI (see cli.py): reminders and slow
+        integrations never hold up the prompt.
+        """
+        import cli
+
+        try:
+            asyncio.run(cli.interactive(self))
+        except KeyboardInterrupt:
+            print(f"\n{self.say_farewell()}")
+
+
+# The HTML templates live next to this file rather than in templates/
+app = Flask(__name__, template_folder='.')
+# Whole-request upload cap - oversized bodies get a 413 before we read a byte of image
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('DETOX_MAX_UPLOAD_MB', '64')) * 1024 * 1024
+sessions = session_store_from_env()
+ingestor = ingestor_for(sessions)
+
+# Clients identify themselves with this cookie (or an X-Session-Id header)
+SESSION_COOKIE = 'detox_sid'
+# Where the async server leaves integration texts it fetched ahead of the request (see asgi.py)
+PREFETCHED_ENVIRON_KEY = 'detox.prefetched'
+
+
+def current_session_id() -> str:
+    """The caller's session id, minting a new one (and a cookie) for first-timers."""
+    session_id = request.headers.get('X-Session-Id') or request.cookies.get(SESSION_COOKIE)
+    if not session_id:
+        session_id = g.new_session_id = secrets.token_urlsafe(16)
+    return session_id
+
+
+@app.after_request
+def remember_session(response):
+    if getattr(g, 'new_session_id', None):
+        response.set_cookie(SESSION_COOKIE, g.new_session_id, httponly=True, samesite='Lax')
+    return response
+
+
+def prefetch_providers(session_id: str) -> dict:
+    """
+    The integration texts this request will need, fetched before the
+    session is locked - so a slow provider, a prompt-pool take or a
+    rate-limit token is never held (or, on redis, retried) inside an update.
+    """
+    params = request.form or request.get_json(silent=True) or {}
+    names = providers_needed(request.method, request.path, params if isinstance(params, dict) else {})
+    if not names:
+        return {}
+    state = sessions.get(session_id) or {}  # Provider cache keys are per user name
+    return DigitalDetoxAssistant(usage_key=session_id).load_state(state).fetch_providers(names)
+
+
+def with_assistant(action):
+    """
+    Runs action(assistant) against the caller's own state and saves any
+    changes atomically. Returns whatever the action returned. Integration
+    calls happen first, outside the store's update (see prefetch_providers),
+    so the update itself only does milliseconds of work.
+    """
+    outcome = {}
+    session_id = current_session_id()
+    prefetched = request.environ.get(PREFETCHED_ENVIRON_KEY)
+    if prefetched is None:
+        prefetched = prefetch_providers(session_id)
+
+    def apply(state):
+        user_assistant = DigitalDetoxAssistant(usage_key=session_id, prefetched=prefetched).load_state(state)
+        outcome['result'] = action(user_assistant)
+        return user_assistant.export_state()
+
+    sessions.update(session_id, apply)
+    return outcome['result']
+
 
 @app.route('/')
 def home():
     return render_template('index.html')
 
+@app.route('/login', methods=['POST'])
+def login():
+    """Starts (or resumes) a user's session from the welcome form."""
+    try:
+        goal = float(request.form['ideal_time'])
+    except (KeyError, ValueError):
+        return jsonify({'error': "Ideal daily screen time must be a number of hours"}), 400
+    if not 0 < goal <= 24:
+        return jsonify({'error': "Let's keep it real - between 0 and 24 hours, please!"}), 400
+
+    def sign_in(user_assistant):
+        user_assistant.user_name = request.form.get('name', '').strip() or None
+        user_assistant.screen_time_goal = goal
+        return user_assistant.user_name
+
+    name = with_assistant(sign_in)
+    return render_template('start.html', name=name)
+
 @app.route('/start', methods=['GET'])
 def start():
-    # Initialize assistant data here if needed
-    return jsonify({'message': 'Digital Detox Assistant started!', 'data': {'name': assistant.user_name, 'goal': assistant.screen_time_goal}})
+    state = sessions.get(current_session_id()) or {}
+    return jsonify({'message': 'Digital Detox Assistant started!', 'data': {'name': state.get('user_name'), 'goal': state.get('screen_time_goal')}})
+
+# What the dashboard buttons on start.html ask for
+START_ACTIVITIES = {'physical': 'b', 'mental': 'd'}
+START_ACTIONS = {
+    'focus_tip': lambda user_assistant: user_assistant.get_focus_tip(),
+    'physical': lambda user_assistant: user_assistant.get_activity_suggestion(START_ACTIVITIES['physical']),
+    'mental': lambda user_assistant: user_assistant.get_activity_suggestion(START_ACTIVITIES['mental']),
+    'progress': lambda user_assistant: user_assistant.get_smart_response('3'),
+}
+
+def providers_needed(method: str, path: str, params: dict) -> list:
+    """
+    Integrations a request is going to call, so the async server can fetch
+    them on its event loop before handing the request to Flask.
+    params are the request's form or JSON fields.
+    """
+    if method != 'POST':
+        return []
+    if path.startswith('/api/activities/'):
+        return DigitalDetoxAssistant.providers_for(path.rsplit('/', 1)[1])
+    if path == '/start' and params.get('action') in START_ACTIVITIES:
+        return DigitalDetoxAssistant.providers_for(START_ACTIVITIES[params['action']])
+    return []
+
+@app.route('/start', methods=['POST'])
+def start_action():
+    """Backs the dashboard buttons: one menu operation per action, against the caller's session."""
+    action = request.form.get('action') or (request.get_json(silent=True) or {}).get('action')
+    if action not in START_ACTIONS:
+        return dynamic_json({'error': f"Unknown action '{action}'", 'actions': list(START_ACTIONS)}, status=400)
+    if action == 'progress' and not (sessions.get(current_session_id()) or {}).get('screen_time_goal'):
+        return dynamic_json({'error': "Set a screen time goal first (log in from the home page)"}, status=409)
+    return dynamic_json({'action': action, 'response': with_assistant(START_ACTIONS[action])})
+
+
+# -- JSON API: the menu engine for web and mobile front ends ----------------------
+# Menus, techniques and individual tips/challenges are static per content
+# version, so they get ETags and long-lived caching; random picks and anything
+# touching a user's state are per-request.
+
+@app.route('/api/menus/<menu_type>', methods=['GET'])
+def api_menu(menu_type):
+    return static_json(('menu', menu_type), lambda: _menu_payload(menu_type))
+
+def _menu_payload(menu_type):
+    text = DigitalDetoxAssistant.MENUS.get(menu_type)
+    return {'menu': menu_type, 'text': text} if text else None
+
+@app.route('/api/techniques/<key>', methods=['GET'])
+def api_technique(key):
+    content = catalog()
+    return static_json(('technique', key, content.mtime),
+                       lambda: {'technique': key, 'text': content.techniques[key]} if key in content.techniques else None)
+
+@app.route('/api/tips', methods=['GET'])
+def api_tips():
+    content = catalog()
+    return static_json(('tips', content.mtime), lambda: {'tips': [
+        {'id': tip.id, 'text': tip.text, 'guidance': tip.guidance} for tip in content.tips]})
+
+@app.route('/api/tips/random', methods=['GET'])
+def api_random_tip():
+    tip = random.choice(catalog().tips)
+    return dynamic_json({'id': tip.id, 'text': tip.rendered})
+
+@app.route('/api/tips/<tip_id>', methods=['GET'])
+def api_tip(tip_id):
+    content = catalog()
+    tip = content.tips_by_id.get(tip_id)
+    return static_json(('tip', tip_id, content.mtime), lambda: tip and {'id': tip.id, 'text': tip.rendered})
+
+@app.route('/api/challenges/random', methods=['GET'])
+def api_random_challenge():
+    challenge = random.choice(catalog().challenges)
+    return dynamic_json({'id': challenge.id, 'text': challenge.rendered})
+
+@app.route('/api/challenges/<challenge_id>', methods=['GET'])
+def api_challenge(challenge_id):
+    content = catalog()
+    challenge = content.challenges_by_id.get(challenge_id)
+    return static_json(('challenge', challenge_id, content.mtime),
+                       lambda: challenge and {'id': challenge.id, 'text': challenge.rendered})
+
+@app.route('/api/activities/<category>', methods=['POST'])
+def api_activity(category):
+    """A fresh activity suggestion (recorded in the caller's history)."""
+    if category != 'f' and category not in catalog().categories:
+        return dynamic_json({'error': f"Unknown category '{category}'"}, status=404)
+    return dynamic_json({'category': category,
+                         'text': with_assistant(lambda user_assistant: user_assistant.get_activity_suggestion(category))})
+
+@app.route('/api/respond', methods=['POST'])
+def api_respond():
+    """The numbered main menu, exactly as the CLI answers it (choice in JSON or form data)."""
+    choice = str((request.get_json(silent=True) or {}).get('choice') or request.form.get('choice', ''))
+    if choice in ('7', '8'):
+        # Image analysis reads a server-side file and exit ends the CLI loop - neither fits a web request
+        return dynamic_json({'error': f"Option {choice} is CLI-only - try /images/analyze instead"}, status=409)
+    if choice == '3' and not (sessions.get(current_session_id()) or {}).get('screen_time_goal'):
+        return dynamic_json({'error': "Set a screen time goal first (log in from the home page)"}, status=409)
+    return dynamic_json({'choice': choice,
+                         'text': with_assistant(lambda user_assistant: user_assistant.get_smart_response(choice))})
+
+@app.route('/api/cache', methods=['GET'])
+def api_cache_stats():
+    """How often static API payloads were served from their pre-encoded form."""
+    return jsonify(static_cache_stats())
+
+@app.route('/usage/events', methods=['POST'])
+def ingest_usage():
+    """
+    Streams NDJSON app-usage events into the caller's screen-time totals.
+    Replies with accepted/rejected counts; 503 + Retry-After when we're swamped.
+    """
+    request.max_content_length = MAX_BODY_BYTES
+    try:
+        summary = ingestor.ingest(current_session_id(), request.stream)
+    except IngestBusyError as e:
+        response = dynamic_json({'error': str(e)}, status=503)
+        response.headers['Retry-After'] = '1'
+        return response
+    return dynamic_json(summary, status=200 if summary['accepted'] or not summary['rejected'] else 400)
+
+# Public address of the reminder stream, if a proxy maps it somewhere other than :DETOX_SSE_PORT
+SSE_PUBLIC_URL = os.environ.get('DETOX_SSE_PUBLIC_URL')
+
+
+def send_session_reminder(session_id: str) -> None:
+    """
+    Scheduler callback for web users: build their reminder from fresh state
+    and push it. Reads with peek, so reminders alone never keep a session alive.
+    """
+    state = sessions.peek(session_id)
+    # Session expired, or reminders were turned off (maybe on another worker) - stop nudging
+    if state is None or not state.get('reminder_interval'):
+        reminder_scheduler().cancel(('session', session_id))
+        return
+    DigitalDetoxAssistant(usage_key=session_id).load_state(state).send_reminder()
+
+
+def reminder_settings(interval) -> dict:
+    broker = reminder_broker()
+    broker.start()
+    stream_url = SSE_PUBLIC_URL or f"{request.scheme}://{request.host.rsplit(':', 1)[0]}:{SSE_PORT}{STREAM_PATH}"
+    return {'interval_minutes': interval, 'stream_url': stream_url, 'streaming': broker.address is not None}
+
+@app.route('/reminders', methods=['GET'])
+def get_reminders():
+    """Current reminder interval and where to open the EventSource."""
+    return dynamic_json(reminder_settings((sessions.get(current_session_id()) or {}).get('reminder_interval')))
+
+@app.route('/reminders', methods=['POST'])
+def set_reminders():
+    """Schedules pushed reminders every interval_minutes (1-60) for the caller's session."""
+    try:
+        interval = int((request.get_json(silent=True) or {}).get('interval_minutes') or request.form['interval_minutes'])
+    except (KeyError, TypeError, ValueError):
+        return dynamic_json({'error': "interval_minutes must be a whole number"}, status=400)
+    if not 1 <= interval <= 60:
+        return dynamic_json({'error': "Let's keep it between 1 and 60 minutes - we want balance, not burnout!"}, status=400)
+
+    def set_interval(user_assistant):
+        user_assistant.reminder_interval = interval
+
+    session_id = current_session_id()
+    with_assistant(set_interval)
+    reminder_scheduler().add(('session', session_id), interval * 60, lambda: send_session_reminder(session_id))
+    return dynamic_json(reminder_settings(interval))
+
+@app.route('/reminders', methods=['DELETE'])
+def cancel_reminders():
+    def clear_interval(user_assistant):
+        user_assistant.reminder_interval = None
+
+    with_assistant(clear_interval)
+    reminder_scheduler().cancel(('session', current_session_id()))
+    return dynamic_json(reminder_settings(None))
+
+@app.route('/reminders/stats', methods=['GET'])
+def reminder_stats():
+    """Scheduler and stream fan-out counters for this worker."""
+    return jsonify({'scheduler': reminder_scheduler().stats(), 'stream': reminder_broker().stats()})
+
+@app.route('/images/analyze', methods=['POST'])
+def analyze_images():
+    """
+    Analyzes many uploaded images (form field 'images') in parallel.
+    Streams one JSON line per image as it finishes, then a summary line.
+    """
+    from image_analysis import ANALYSIS_MODES, iter_batch_analysis
+
+    uploads = request.files.getlist('images')
+    mode = request.form.get('mode', 'full')
+    if not uploads:
+        return jsonify({'error': "No images uploaded - attach them as 'images'"}), 400
+    if mode not in ANALYSIS_MODES:
+        return jsonify({'error': f"Unknown mode '{mode}'", 'modes': list(ANALYSIS_MODES)}), 400
+
+    items = [(upload.filename or f"image-{i}", upload.read()) for i, upload in enumerate(uploads)]
+
+    worker_latency = histogram('analyze_image_worker')
+
+    def generate():
+        for event in iter_batch_analysis(items, mode):
+            if event['type'] == 'result' and event.get('cached') is False:
+                worker_latency.observe(event['elapsed_ms'] / 1000, error=not event['ok'])
+            yield json.dumps(event) + "\n"
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+@app.route('/images/cache', methods=['GET'])
+def image_cache_stats():
+    """Image result cache hit/miss counters - proof the cache is earning its keep."""
+    from image_analysis import cache_stats
+
+    return jsonify(cache_stats())
+
+@app.route('/integrations/stats', methods=['GET'])
+def integration_stats():
+    """Client reuse, connection, response cache, circuit breaker and rate limit counters for the integrations."""
+    return jsonify({**default_clients().stats(), 'response_cache': response_cache.stats(),
+                    'circuit_breakers': breaker_stats(), 'rate_limits': rate_limiter.stats(),
+                    'coalescing': in_flight.stats()})
+
+@app.route('/usage/stats', methods=['GET'])
+def usage_stats():
+    """Ingestion and usage store counters for this worker."""
+    return jsonify({**ingestor.stats(), 'store': usage_store().stats()})
+
+
+# Bulk exports of every user's data only exist when a token is configured
+EXPORT_TOKEN = os.environ.get('DETOX_EXPORT_TOKEN')
+
+
+@app.route('/export', methods=['GET'])
+def export_sessions():
+    """
+    Every user's activity history, interaction count and goal progress,
+    streamed as ?format=ndjson (default) or csv with chunked transfer.
+    ?cursor= resumes after the row that carried it; ?limit= caps the rows.
+    Requires the X-Export-Token header.
+    """
+    from export import FORMATS, iter_export
+
+    if not EXPORT_TOKEN or not secrets.compare_digest(request.headers.get('X-Export-Token', ''), EXPORT_TOKEN):
+        return jsonify({'error': "Not found"}), 404
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in FORMATS:
+        return jsonify({'error': f"Unknown format '{fmt}'", 'formats': list(FORMATS)}), 400
+    limit = request.args.get('limit', type=int)
+    chunks = iter_export(sessions, fmt, request.args.get('cursor') or None, limit)
+    return Response(chunks, mimetype=FORMATS[fmt], headers={'Cache-Control': 'no-store'})
+
+
+def export_file(path: str, fmt: str, resume: bool = False) -> None:
+    """CLI twin of GET /export: to a file (or - for stdout); resume picks up where an interrupted file stopped."""
+    import sys
+    from export import iter_export, resume_point
+
+    if path == '-':
+        for chunk in iter_export(sessions, fmt):
+            sys.stdout.write(chunk)
+        return
+    cursor, complete = resume_point(path, fmt) if resume and os.path.exists(path) else (None, 0)
+    with open(path, 'a' if complete else 'w', encoding='utf-8', newline='') as f:
+        f.truncate(complete)  # Drop a torn last row
+        for chunk in iter_export(sessions, fmt, cursor, header=not complete):
+            f.write(chunk)
+            f.flush()
+
+
+# Without REDIS_URL the CLI user's ingested usage lives here between runs - the in-memory store dies with the process
+LOCAL_STATE_PATH = os.environ.get('DETOX_LOCAL_STATE', os.path.join(os.path.expanduser('~'), '.digital_detox_local.json'))
+
+# What a CLI run keeps from the last one: measured usage only. Name, goal, reminders and history start fresh
+LOCAL_STATE_FIELDS = ('screen_time',)
+
+
+def load_local_session() -> dict:
+    """
+    The CLI user's state for a new run: the saved usage (from LOCAL_STATE_PATH,
+    or the shared store) with every per-session field back at its default.
+    """
+    saved = sessions.get(LOCAL_USER) or {}
+    if isinstance(sessions, InMemorySessionStore) and os.path.exists(LOCAL_STATE_PATH):
+        with open(LOCAL_STATE_PATH, encoding='utf-8') as f:
+            saved = json.load(f)
+    kept = {field: saved[field] for field in LOCAL_STATE_FIELDS if field in saved}
+    sessions.update(LOCAL_USER, lambda state: kept)
+    return kept
+
+
+def save_local_session(state: dict) -> None:
+    """Stores the CLI user's state - and writes its usage to LOCAL_STATE_PATH when sessions aren't shared."""
+    sessions.update(LOCAL_USER, lambda _: state)
+    if isinstance(sessions, InMemorySessionStore):
+        os.makedirs(os.path.dirname(LOCAL_STATE_PATH) or '.', exist_ok=True)
+        temporary = LOCAL_STATE_PATH + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump({field: state[field] for field in LOCAL_STATE_FIELDS if field in state}, f,
+                      separators=(',', ':'))
+        os.replace(temporary, LOCAL_STATE_PATH)  # Never a half-written state file
+
+
+def ingest_file(path: str, session_id: str) -> dict:
+    """
+    CLI twin of POST /usage/events: stream a file (or '-' for stdin) into
+    one session. Web sessions only outlive this process in redis, so other
+    sessions than the CLI's own need REDIS_URL.
+    """
+    import sys
+
+    if session_id != LOCAL_USER and isinstance(sessions, InMemorySessionStore):
+        raise SystemExit(f"Ingesting into session '{session_id}' needs REDIS_URL - "
+                         f"without it only the CLI's own ('{LOCAL_USER}') is kept between runs")
+    load_local_session()
+    if path == '-':
+        summary = ingestor.ingest(session_id, sys.stdin.buffer, wait=60)
+    else:
+        with open(path, 'rb') as f:
+            summary = ingestor.ingest(session_id, f, wait=60)
+    if session_id == LOCAL_USER:
+        save_local_session(sessions.get(LOCAL_USER) or {})
+    return summary
+
+
+# -- Metrics & profiling -------------------------------------------------------------
+
+def collect_metrics() -> list:
+    """Scrape-time view of the counters every component already keeps."""
+    import sys
+
+    # Importing image_analysis would load Pillow on the first scrape - until an image comes along it's all zeros
+    image_analysis = sys.modules.get('image_analysis')
+    images = image_analysis.cache_stats() if image_analysis else {'hits': 0, 'misses': 0}
+    provider, static = response_cache.stats(), static_cache_stats()
+    caches = {'provider': (provider['hits'] + provider['stale_hits'], provider['misses']),
+              'image': (images['hits'], images['misses']),
+              'http_static': (static['hits'], static['misses'])}
+    breaker_states = {'closed': 0, 'half_open': 1, 'open': 2}
+    breaker_numbers = breaker_stats()
+    limits = rate_limiter.stats()
+    usage = ingestor.stats()
+    return [
+        ('cache_hits_total', 'counter', "Cache lookups answered from cache.",
+         [({'cache': cache}, hits) for cache, (hits, _) in caches.items()]),
+        ('cache_misses_total', 'counter', "Cache lookups that had to do the work.",
+         [({'cache': cache}, misses) for cache, (_, misses) in caches.items()]),
+        ('cache_hit_ratio', 'gauge', "Hits / lookups since start.",
+         [({'cache': cache}, hits / (hits + misses) if hits + misses else 0.0)
+          for cache, (hits, misses) in caches.items()]),
+        ('provider_cache_stale_hits_total', 'counter', "Provider answers served stale while refreshing.",
+         [({}, provider['stale_hits'])]),
+        ('circuit_breaker_state', 'gauge', "0 closed, 1 half-open, 2 open.",
+         [({'provider': name}, breaker_states.get(numbers['state'], -1)) for name, numbers in breaker_numbers.items()]),
+        ('circuit_breaker_failures_total', 'counter', "Provider calls that failed or timed out.",
+         [({'provider': name}, numbers['failures']) for name, numbers in breaker_numbers.items()]),
+        ('circuit_breaker_short_circuited_total', 'counter', "Calls refused while the breaker was open.",
+         [({'provider': name}, numbers['short_circuited']) for name, numbers in breaker_numbers.items()]),
+        ('rate_limited_total', 'counter', "Integration calls refused by a rate limit (served cached or fallback).",
+         [({'bucket': bucket}, count) for bucket, count in limits['limited'].items()]),
+        ('provider_calls_coalesced_total', 'counter', "Integration calls that joined an identical one in flight.",
+         [({}, in_flight.stats()['coalesced'])]),
+        # Counting redis sessions means scanning the keyspace - not something to do on every scrape
+        ('sessions', 'gauge', "Sessions held by this worker's store.",
+         [({}, len(sessions))] if isinstance(sessions, InMemorySessionStore) else []),
+        ('reminders_scheduled', 'gauge', "Reminders on the shared scheduler.", [({}, len(reminder_scheduler()))]),
+        ('reminder_stream_connections', 'gauge', "Open SSE reminder streams.",
+         [({}, reminder_broker().connections)]),
+        ('usage_events_total', 'counter', "Ingested usage events.",
+         [({'result': 'accepted'}, usage['accepted']), ({'result': 'rejected'}, usage['rejected'])]),
+    ]
+
+
+register_collector(collect_metrics)
+
+# Debug endpoints (profiler) only exist when a token is configured
+DEBUG_TOKEN = os.environ.get('DETOX_DEBUG_TOKEN')
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus scrape target: operation latencies plus cache, breaker and queue counters."""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/debug/profile', methods=['GET', 'POST', 'DELETE'])
+def profile_endpoint():
+    """
+    Opt-in sampling profiler. POST ?seconds=30 starts it, GET returns the
+    collapsed stacks so far (or the status as JSON with ?format=json),
+    DELETE stops it early. Requires the X-Debug-Token header.
+    """
+    if not DEBUG_TOKEN or not secrets.compare_digest(request.headers.get('X-Debug-Token', ''), DEBUG_TOKEN):
+        return dynamic_json({'error': "Not found"}, status=404)
+    if request.method == 'POST':
+        seconds = request.args.get('seconds', type=float) if 'seconds' in request.args else 30.0
+        if seconds is None or not 0 < seconds < float('inf'):  # None: not a number at all
+            return dynamic_json({'error': "seconds must be a positive number"}, status=400)
+        profiler.start(seconds)
+    elif request.method == 'DELETE':
+        profiler.stop()
+    if request.method == 'GET' and request.args.get('format') != 'json':
+        return Response(profiler.collapsed(), mimetype='text/plain')
+    return dynamic_json(profiler.status())
 
 
 # Gunicorn configuration
 if __name__ == "__main__":
-    if os.environ.get('FLASK_ENV') == 'development':
-        app.run(host='0.0.0.0', port=5000, debug=True)
-        
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Digital Detox Assistant")
+    commands = parser.add_subparsers(dest='command')
+    commands.add_parser('serve', help="Run the web app (the default)")
+    ingest_command = commands.add_parser(
+        'ingest', help="Load NDJSON app-usage events into a session (the 7-day rings persist with DETOX_USAGE_STORE)")
+    ingest_command.add_argument('path', help="Events file, or - for stdin")
+    ingest_command.add_argument('--session', default=LOCAL_USER,
+                                help=f"Session id the events belong to (the CLI's own is '{LOCAL_USER}')")
+    export_command = commands.add_parser('export', help="Stream every user's history and goal progress")
+    export_command.add_argument('path', nargs='?', default='-', help="Output file, or - for stdout (the default)")
+    export_command.add_argument('--format', choices=['ndjson', 'csv'], default='ndjson')
+    export_command.add_argument('--resume', action='store_true',
+                                help="Continue an interrupted export file after its last complete row")
+    commands.add_parser('cli', help="Chat with the assistant in the terminal")
+    batch_command = commands.add_parser('batch', help="Replay scripted menu selections at full speed")
+    batch_command.add_argument('path', help="Script with one selection per line, or - for stdin")
+    batch_command.add_argument('--name', default='replay', help="User name to answer as")
+    batch_command.add_argument('--goal', type=float, default=3.0, help="Daily screen time goal in hours")
+    batch_command.add_argument('--seed', type=int, help="Seed the randomness so replays give identical answers")
+    batch_command.add_argument('--quiet', action='store_true', help="Only print the timing summary")
+    args = parser.parse_args()
+
+    if args.command == 'ingest':
+        print(json.dumps(ingest_file(args.path, args.session)))
+    elif args.command == 'export':
+        export_file(args.path, args.format, args.resume)
+    elif args.command == 'cli':
+        assistant = DigitalDetoxAssistant().load_state(load_local_session())
+        try:
+            assistant.run()
+        finally:
+            save_local_session(assistant.export_state())
+    elif args.command == 'batch':
+        import sys
+        from cli import run_batch
+
+        if args.seed is not None:
+            random.seed(args.seed)
+        replay = DigitalDetoxAssistant()
+        replay.user_name, replay.screen_time_goal = args.name, args.goal
+        out = None if args.quiet else sys.stdout
+        with (sys.stdin if args.path == '-' else open(args.path, encoding='utf-8')) as script:
+            summary = run_batch(replay, script, out)
+        replay.shutdown()
+        print(json.dumps(summary), file=sys.stderr)  # Timing on stderr keeps stdout diffable
+    else:
+        port = int(os.environ.get("PORT", 5000))  # 👈 this is required!
+        app.run(host='0.0.0.0', port=port, debug=os.environ.get('FLASK_ENV') == 'development')
@@ -0,0 +1,241 @@
+"""
+Metrics: where does the time go? 🔬
+
+A deliberately small instrumentation layer. ``@instrumented`` wraps a hot
+function with two clock reads, a bisect and a locked add - about a
+microsecond, next to calls measured in milliseconds - and feeds a fixed-bucket latency histogram plus call and error
+counters. Caches, breakers, sessions and friends already keep their own
+counters, so they're not instrumented twice: collectors read their
+``stats()`` at scrape time instead.
+
+``render()`` produces the Prometheus text exposition format for
+``/metrics``.
+
+For the "why is *this* slow in production?" moments there's an opt-in
+sampling profiler: a background thread that peeks at every thread's stack
+every few milliseconds (no tracing hooks, so the app runs at full speed) and
+folds the samples into flamegraph-ready collapsed stacks.
+"""
+import functools
+import inspect
+import math
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+
+# Latency bucket upper bounds in seconds - 100µs (a cache hit) to 10s (a provider timing out)
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+NAMESPACE = "detox"
+
+
+class Histogram:
+    """Cumulative-on-export latency histogram with call and error counts."""
+
+    __slots__ = ("bounds", "counts", "total", "calls", "errors", "_lock")
+
+    def __init__(self, bounds: tuple = LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # The last slot is +Inf
+        self.total = 0.0
+        self.calls = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, error: bool = False) -> None:
+        index = bisect_left(self.bounds, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.total += seconds
+            self.calls += 1
+            if error:
+                self.errors += 1
+
+    def snapshot(self) -> tuple:
+        with self._lock:
+            return list(self.counts), self.total, self.calls, self.errors
+
+
+_histograms = {}  # operation -> Histogram
+_collectors = []  # callables returning [(name, type, help, [(labels dict, value)])]
+
+
+def histogram(operation: str) -> Histogram:
+    hist = _histograms.get(operation)
+    if hist is None:
+        hist = _histograms.setdefault(operation, Histogram())
+    return hist
+
+
+def instrumented(operation: str = None):
+    """Decorator: time every call (and count the ones that raise) under operation - coroutines included."""
+    def decorate(fn):
+        hist = histogram(operation or fn.__name__)
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    result = await fn(*args, **kwargs)
+                except BaseException:
+                    hist.observe(time.perf_counter() - started, error=True)
+                    raise
+                hist.observe(time.perf_counter() - started)
+                return result
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException:
+                hist.observe(time.perf_counter() - started, error=True)
+                raise
+            hist.observe(time.perf_counter() - started)
+            return result
+
+        return wrapper
+
+    return decorate
+
+
+def register_collector(collect) -> None:
+    """Adds a scrape-time source of metrics (see _collectors for the shape)."""
+    _collectors.append(collect)
+
+
+# -- Prometheus text format ----------------------------------------------------
+
+def _format_value(value) -> str:
+    if value is True or value is False:
+        return "1" if value else "0"
+    if isinstance(value, float) and math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def render() -> str:
+    """Every histogram and collector, in Prometheus text exposition format 0.0.4."""
+    lines = []
+    name = f"{NAMESPACE}_operation_duration_seconds"
+    lines += [f"# HELP {name} Latency of instrumented operations.", f"# TYPE {name} histogram"]
+    errors = []
+    for operation, hist in sorted(_histograms.items()):
+        counts, total, calls, failed = hist.snapshot()
+        cumulative = 0
+        for bound, count in zip(hist.bounds + (math.inf,), counts):
+            cumulative += count
+            labels = _format_labels({'operation': operation, 'le': _format_value(float(bound))})
+            lines.append(f"{name}_bucket{labels} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels({'operation': operation})} {_format_value(total)}")
+        lines.append(f"{name}_count{_format_labels({'operation': operation})} {calls}")
+        errors.append((operation, failed))
+    name = f"{NAMESPACE}_operation_errors_total"
+    lines += [f"# HELP {name} Instrumented calls that raised.", f"# TYPE {name} counter"]
+    lines += [f"{name}{_format_labels({'operation': operation})} {failed}" for operation, failed in errors]
+
+    for collect in _collectors:
+        try:
+            families = collect()
+        except Exception:  # One broken collector shouldn't blank the whole scrape
+            continue
+        for family, kind, help_text, samples in families:
+            family = f"{NAMESPACE}_{family}"
+            lines += [f"# HELP {family} {help_text}", f"# TYPE {family} {kind}"]
+            lines += [f"{family}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples]
+    return "\n".join(lines) + "\n"
+
+
+# -- Sampling profiler -------------------------------------------------------------
+
+PROFILE_INTERVAL = float(os.environ.get("DETOX_PROFILE_INTERVAL_MS", "5")) / 1000
+PROFILE_MAX_SECONDS = 300  # A forgotten profiler shouldn't sample forever
+
+
+class SamplingProfiler:
+    """Samples every thread's stack on a timer and counts identical stacks."""
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.samples = {}  # "outer;...;inner" -> count
+        self.started_at = None
+        self.stopped_at = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds: float = 30.0) -> None:
+        """Starts a fresh profile that stops by itself after seconds."""
+        with self._lock:
+            if self.running:
+                return
+            self.samples = {}
+            self.started_at, self.stopped_at = time.time(), None
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(min(seconds, PROFILE_MAX_SECONDS),),
+                                            name="sampling-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self, seconds: float) -> None:
+        own = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stacks.append(";".join(reversed(stack)))
+            with self._lock:  # Readers snapshot under the same lock, so they never see the dict mid-resize
+                for key in stacks:
+                    self.samples[key] = self.samples.get(key, 0) + 1
+        self.stopped_at = time.time()
+
+    def collapsed(self) -> str:
+        """Samples in collapsed-stack format (feed it to flamegraph.pl or speedscope)."""
+        with self._lock:
+            samples = dict(self.samples)
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(samples.items(), key=lambda item: -item[1]))
+
+    def status(self) -> dict:
+        with self._lock:
+            samples = dict(self.samples)
+        return {
+            "running": self.running,
+            "started_at": self.started_at,
+            "stopped_at": self.stopped_at,
+            "interval_ms": self.interval * 1000,
+            "samples": sum(samples.values()),
+            "distinct_stacks": len(samples),
+        }
+
+
+profiler = SamplingProfiler()
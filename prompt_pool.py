@@ -0,0 +1,160 @@
+"""
+Prompt Pool: creative prompts, baked ahead of time and served warm 🎨
+
+Waiting on an AI completion while someone is trying to go analog is a bit
+ironic. ``PromptPool`` keeps a small shelf of pre-generated prompts, quietly
+restocks it in the background whenever it drops below a low-water mark, and
+hands prompts out in O(1). If the shelf is empty (or the provider is having
+a bad day) ``take()`` returns ``None`` and the caller serves its static
+default - the user never waits on the network.
+
+Knobs (all env-overridable) trade API spend against freshness and latency:
+``size`` is how many prompts we keep ready, ``ttl`` how long one stays
+fresh, and ``concurrency`` how many completions may be in flight at once.
+"""
+import atexit
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+POOL_SIZE = int(os.environ.get("DETOX_PROMPT_POOL_SIZE", "8"))
+POOL_LOW_WATER = int(os.environ.get("DETOX_PROMPT_POOL_LOW_WATER", "3"))
+POOL_TTL = float(os.environ.get("DETOX_PROMPT_POOL_TTL", "3600"))  # seconds
+POOL_CONCURRENCY = int(os.environ.get("DETOX_PROMPT_POOL_CONCURRENCY", "2"))
+
+# After a failed refill, wait this long (doubling up to the max) before retrying
+RETRY_BACKOFF = 5.0
+RETRY_BACKOFF_MAX = 300.0
+
+
+class PromptPool:
+    """
+    A bounded, self-refilling pool of generated prompts.
+
+    ``generate`` is any zero-argument callable returning a prompt string; it
+    runs on background threads only, never on the caller's.
+    """
+
+    def __init__(self, generate, size: int = POOL_SIZE, low_water: int = POOL_LOW_WATER,
+                 ttl: float = POOL_TTL, concurrency: int = POOL_CONCURRENCY):
+        self.generate = generate
+        self.size = size
+        self.low_water = min(low_water, size)
+        self.ttl = ttl
+        self.concurrency = concurrency
+        self._items = deque()  # (expires_at, prompt), oldest first
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._retry_at = 0.0
+        self._backoff = RETRY_BACKOFF
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="prompt-refill")
+        self._closed = False
+        self.served = 0
+        self.empty = 0
+        self.generated = 0
+        self.failures = 0
+        self.expired = 0
+
+    def take(self):
+        """Pops a fresh prompt, or returns None if none are ready. Never blocks on I/O."""
+        now = time.monotonic()
+        with self._lock:
+            while self._items and self._items[0][0] <= now:
+                self._items.popleft()  # Everything behind an expired prompt is newer
+                self.expired += 1
+            prompt = self._items.popleft()[1] if self._items else None
+            if prompt is None:
+                self.empty += 1
+            else:
+                self.served += 1
+        self.refill()
+        return prompt
+
+    def refill(self) -> None:
+        """Tops the pool up in the background if it's at or below the low-water mark."""
+        with self._lock:
+            if self._closed or time.monotonic() < self._retry_at:
+                return
+            if len(self._items) + self._in_flight > self.low_water:
+                return
+            wanted = self.size - len(self._items) - self._in_flight
+            starts = max(0, min(wanted, self.concurrency - self._in_flight))
+            self._in_flight += starts
+        for _ in range(starts):
+            self._submit()
+
+    def _refill_one(self) -> None:
+        try:
+            prompt = self.generate()
+            if not prompt:
+                raise ValueError("Provider returned an empty prompt")
+        except Exception:
+            with self._lock:
+                self._in_flight -= 1
+                self.failures += 1
+                # Provider is down - back off instead of hammering it
+                self._retry_at = time.monotonic() + self._backoff
+                self._backoff = min(self._backoff * 2, RETRY_BACKOFF_MAX)
+            return
+
+        with self._lock:
+            self._in_flight -= 1
+            self.generated += 1
+            self._backoff = RETRY_BACKOFF
+            if len(self._items) < self.size:
+                self._items.append((time.monotonic() + self.ttl, prompt))
+            keep_going = len(self._items) + self._in_flight < self.size
+        if keep_going:
+            # Keep filling up to size once we've started (low water only triggers the refill)
+            with self._lock:
+                if self._closed or self._in_flight >= self.concurrency:
+                    return
+                self._in_flight += 1
+            self._submit()
+
+    def _submit(self) -> None:
+        # The in-flight slot is already reserved by the caller
+        try:
+            self._executor.submit(self._refill_one)
+        except RuntimeError:  # Closed between reserving and submitting
+            with self._lock:
+                self._in_flight -= 1
+
+    def close(self) -> None:
+        """Stops background refills; prompts already generated are discarded."""
+        with self._lock:
+            self._closed = True
+            self._items.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "ready": len(self._items),
+                "in_flight": self._in_flight,
+                "served": self.served,
+                "empty": self.empty,
+                "generated": self.generated,
+                "failures": self.failures,
+                "expired": self.expired,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def shared_pool(key, generate, **options) -> PromptPool:
+    """
+    One pool per key (e.g. per API key) for the whole process, so every
+    assistant instance draws from the same shelf. Starts filling right away.
+    """
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool._closed:
+            pool = _pools[key] = PromptPool(generate, **options)
+            atexit.register(pool.close)
+    pool.refill()
+    return pool
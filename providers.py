@@ -0,0 +1,278 @@
+"""
+Provider Clients: one well-rested connection pool per integration 🔌
+
+Creating a fresh Spotify or OpenAI client for every request means a fresh
+TCP + TLS handshake every time - the networking equivalent of introducing
+yourself to the same barista every morning. ``ProviderClients`` builds each
+client once, keeps its keep-alive connections warm, and hands the same
+instance to every thread that asks.
+
+Both underlying HTTP stacks are thread-safe for concurrent requests:
+Spotify (and anything else plain-HTTP) shares a ``requests.Session`` backed
+by a sized urllib3 pool, and OpenAI gets a dedicated ``httpx.Client``.
+Under the async server (see asgi.py) the ``*_async`` methods do the same
+calls natively on shared ``httpx.AsyncClient`` pools - thousands of requests
+can wait on Spotify at once without a thread apiece.
+
+The client libraries themselves are imported on first use, too: openai alone
+takes longer to import than the rest of the app takes to boot, and a worker
+that never talks to an integration shouldn't pay for it.
+"""
+import asyncio
+import atexit
+import os
+import threading
+from typing import TYPE_CHECKING
+
+from caching import TTLCache, backend_from_env
+
+# Keep-alive connections per host - roughly one per gunicorn thread is plenty
+POOL_MAXSIZE = 16
+# Connections per host for the async transport - coroutines are cheap, sockets less so
+ASYNC_POOL_MAXSIZE = int(os.environ.get("DETOX_ASYNC_POOL_MAXSIZE", "128"))
+# ...split across AsyncClients of this many connections each: httpcore rescans its whole pool
+# on every event, so one 128-connection pool is several times slower than eight of 16
+ASYNC_POOL_SHARD_SIZE = 16
+# Seconds before an integration call is considered lost at sea
+HTTP_TIMEOUT = 10
+
+# API base URLs - override to point at staging, a proxy, or the benchmark stand-ins
+SPOTIFY_API_URL = os.environ.get("DETOX_SPOTIFY_API_URL", "https://api.spotify.com/v1/")
+FITBIT_API_URL = os.environ.get("DETOX_FITBIT_API_URL", "https://api.fitbit.com")
+OPENAI_API_URL = os.environ.get("DETOX_OPENAI_API_URL")  # None: the SDK's default
+
+if TYPE_CHECKING:  # Annotations only - the real imports happen on first use
+    import httpx
+    import openai
+    import requests
+    import spotipy
+
+
+class ProviderClients:
+    """
+    Registry of long-lived integration clients, created lazily on first use
+    and shared by every thread (and every assistant) in the process.
+    """
+
+    def __init__(self, pool_maxsize: int = POOL_MAXSIZE, timeout: float = HTTP_TIMEOUT):
+        self.pool_maxsize = pool_maxsize
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._clients = {}  # (provider, api key) -> client
+        self._session = None
+        self._httpx = None
+        self._async_http = []  # Round-robin AsyncClient shards
+        self._async_loop = None  # The event loop they belong to
+        self._async_next = 0
+        self._async_lock = threading.Lock()  # Only ever held for a few instructions once the clients exist
+        self.created = {}  # provider -> clients built
+        self.reused = {}  # provider -> times an existing client was handed out
+        self.httpx_requests = 0
+        self.httpx_connects = 0
+        self.closed = False
+
+    # -- shared transports -------------------------------------------------
+
+    def http_session(self) -> "requests.Session":
+        """The shared requests session (Spotify, Fitbit and friends)."""
+        with self._lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_maxsize)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._session = session
+            return self._session
+
+    def _httpx_client(self) -> "httpx.Client":
+        # Only called from a _get factory, i.e. with self._lock already held
+        if self._httpx is None:
+            import httpx
+
+            self._httpx = httpx.Client(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_keepalive_connections=self.pool_maxsize,
+                                    max_connections=self.pool_maxsize * 2),
+                event_hooks={"request": [self._trace_request]},
+            )
+        return self._httpx
+
+    def _trace_request(self, request: "httpx.Request") -> None:
+        """Counts requests and brand-new TCP connections (the difference is reuse)."""
+        self.httpx_requests += 1
+
+        def trace(event_name, info):
+            if event_name == "connection.connect_tcp.complete":
+                self.httpx_connects += 1
+
+        request.extensions["trace"] = trace
+
+    async def _trace_request_async(self, request: "httpx.Request") -> None:
+        self.httpx_requests += 1
+
+        async def trace(event_name, info):
+            if event_name == "connection.connect_tcp.complete":
+                self.httpx_connects += 1
+
+        request.extensions["trace"] = trace
+
+    def async_http(self) -> "httpx.AsyncClient":
+        """A shared async client for the running event loop (an async client can't hop loops)."""
+        loop = asyncio.get_running_loop()
+        if self.closed:
+            raise RuntimeError("Provider clients have been shut down")
+        # Not self._lock: a thread importing openai under it would stall the whole event loop
+        with self._async_lock:
+            if self._async_loop is not loop:
+                import httpx
+
+                shard_size = min(ASYNC_POOL_SHARD_SIZE, ASYNC_POOL_MAXSIZE)
+                ssl_context = httpx.create_ssl_context()  # Loading the CA bundle once is plenty
+                self._async_http = [
+                    httpx.AsyncClient(
+                        verify=ssl_context,
+                        timeout=self.timeout,
+                        limits=httpx.Limits(max_keepalive_connections=shard_size, max_connections=shard_size),
+                        event_hooks={"request": [self._trace_request_async]},
+                    )
+                    for _ in range(max(1, ASYNC_POOL_MAXSIZE // shard_size))
+                ]
+                self._async_loop = loop
+            self._async_next = (self._async_next + 1) % len(self._async_http)
+            return self._async_http[self._async_next]
+
+    # -- integration clients -----------------------------------------------
+
+    def _get(self, provider: str, api_key: str, factory):
+        # A dict lookup under a lock is nanoseconds next to the handshake it saves
+        with self._lock:
+            if self.closed:
+                raise RuntimeError("Provider clients have been shut down")
+            client = self._clients.get((provider, api_key))
+            if client is None:
+                client = self._clients[(provider, api_key)] = factory()
+                self.created[provider] = self.created.get(provider, 0) + 1
+            else:
+                self.reused[provider] = self.reused.get(provider, 0) + 1
+            return client
+
+    def spotify(self, api_key: str) -> "spotipy.Spotify":
+        """A Spotify client riding on the shared keep-alive session."""
+        session = self.http_session()
+
+        def build():
+            import spotipy
+
+            client = spotipy.Spotify(auth=api_key, requests_session=session, requests_timeout=self.timeout)
+            client.prefix = SPOTIFY_API_URL
+            return client
+
+        return self._get("spotify", api_key, build)
+
+    def openai(self, api_key: str) -> "openai.OpenAI":
+        """An OpenAI client with its own pooled httpx transport."""
+        def build():
+            import openai
+
+            return openai.OpenAI(api_key=api_key, base_url=OPENAI_API_URL, http_client=self._httpx_client())
+
+        return self._get("openai", api_key, build)
+
+    def fitbit_goals(self, api_key: str) -> dict:
+        """Today's activity goals from the Fitbit Web API, over the shared session."""
+        response = self.http_session().get(f"{FITBIT_API_URL}/1/user/-/activities/goals/daily.json",
+                                           headers={"Authorization": f"Bearer {api_key}"}, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json().get("goals", {})
+
+    # -- native async variants ----------------------------------------------
+
+    async def spotify_playlists_async(self, api_key: str, user: str = "spotify") -> dict:
+        """The same playlists call as Spotify.user_playlists(user), without a thread."""
+        response = await self.async_http().get(f"{SPOTIFY_API_URL}users/{user}/playlists", params={"limit": 50},
+                                               headers={"Authorization": f"Bearer {api_key}"})
+        response.raise_for_status()
+        return response.json()
+
+    async def fitbit_goals_async(self, api_key: str) -> dict:
+        response = await self.async_http().get(f"{FITBIT_API_URL}/1/user/-/activities/goals/daily.json",
+                                               headers={"Authorization": f"Bearer {api_key}"})
+        response.raise_for_status()
+        return response.json().get("goals", {})
+
+    # -- housekeeping ------------------------------------------------------
+
+    def stats(self) -> dict:
+        """Client and connection reuse counters."""
+        http_requests = http_connections = 0
+        if self._session is not None:
+            for adapter in set(self._session.adapters.values()):
+                for pool_key in adapter.poolmanager.pools.keys():
+                    pool = adapter.poolmanager.pools.get(pool_key)
+                    if pool is not None:
+                        http_requests += pool.num_requests
+                        http_connections += pool.num_connections
+        return {
+            "clients_created": dict(self.created),
+            "clients_reused": dict(self.reused),
+            "requests_session": {
+                "requests": http_requests,
+                "connections_opened": http_connections,
+                "connections_reused": max(0, http_requests - http_connections),
+            },
+            "httpx": {
+                "requests": self.httpx_requests,
+                "connections_opened": self.httpx_connects,
+                "connections_reused": max(0, self.httpx_requests - self.httpx_connects),
+            },
+        }
+
+    async def aclose(self) -> None:
+        """Closes the async clients from their own event loop (e.g. at ASGI shutdown)."""
+        with self._async_lock:
+            async_http, self._async_http, self._async_loop = self._async_http, [], None
+        for client in async_http:
+            await client.aclose()
+
+    def close(self) -> None:
+        """
+        Closes every pooled connection. Safe to call more than once. Async
+        clients still open by now (no aclose) are just dropped - their loop is gone.
+        """
+        with self._lock:
+            self.closed = True
+            session, self._session = self._session, None
+            httpx_client, self._httpx = self._httpx, None
+            self._clients.clear()
+        with self._async_lock:
+            self._async_http, self._async_loop = [], None
+        if session is not None:
+            session.close()
+        if httpx_client is not None:
+            httpx_client.close()
+
+
+_default_clients = None
+_default_lock = threading.Lock()
+
+
+def default_clients() -> ProviderClients:
+    """The process-wide registry (created on first use, closed at exit)."""
+    global _default_clients
+    with _default_lock:
+        if _default_clients is None or _default_clients.closed:
+            _default_clients = ProviderClients()
+            atexit.register(_default_clients.close)
+        return _default_clients
+
+
+# Provider responses that rarely change (playlists, workout plans), keyed per
+# user and provider. Set REDIS_URL to share one cache across gunicorn workers.
+response_cache = TTLCache(
+    ttl=float(os.environ.get("DETOX_PROVIDER_TTL", "300")),
+    stale_ttl=float(os.environ.get("DETOX_PROVIDER_STALE_TTL", "3600")),
+    backend=backend_from_env(int(os.environ.get("DETOX_PROVIDER_CACHE_SIZE", "4096"))),
+)
@@ -0,0 +1,271 @@
+"""
+Rate limiting: moderation in all things, API calls included 🚰
+
+Caches and breakers keep us from calling a provider *needlessly*; this
+module keeps us from calling it *too often* when a burst of traffic (or one
+user's tight client loop) misses the cache anyway.
+
+* ``RateLimiter`` - token buckets per provider (our total outbound budget)
+  and per user per provider (so one session can't spend everyone's share).
+  Buckets live in process (``MemoryBucketBackend``) or in redis
+  (``RedisBucketBackend``), where every worker draws from the same budget.
+  Being over the limit is not an error for the user: callers raise
+  ``RateLimited`` into their existing fallbacks, so they get the cached
+  answer if there is one and the analog default if there isn't.
+* ``Coalescer`` - single-flight for outbound calls. Identical calls already
+  in flight are joined rather than repeated, so fifty users asking for the
+  same playlists at once cost one request (and one token).
+
+Limits are env-tunable per provider (``DETOX_<PROVIDER>_RATE`` tokens per
+second, ``DETOX_<PROVIDER>_BURST`` bucket size) and per user
+(``DETOX_USER_RATE`` / ``DETOX_USER_BURST``).
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class RateLimited(Exception):
+    """Over the rate limit; serve what we have instead of calling out."""
+
+
+class MemoryBucketBackend:
+    """Token buckets in a process-local dict, least recently used dropped past max_buckets."""
+
+    blocking = False  # Lock-and-dict fast: fine to call straight from an event loop
+
+    def __init__(self, max_buckets: int = 100_000):
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()  # key -> (tokens, refilled_at)
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: float) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            tokens, refilled_at = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - refilled_at) * rate)
+            allowed = tokens >= 1
+            self._buckets[key] = (tokens - allowed, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)  # A forgotten bucket comes back full - the lenient failure
+            return allowed
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+# Refill and take in one round-trip, atomically, on redis' clock (workers' clocks may disagree)
+_TAKE_SCRIPT = """
+local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'at')
+local tokens = tonumber(bucket[1]) or burst
+local at = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - at) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'at', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return allowed
+"""
+
+
+class RedisBucketBackend:
+    """
+    Token buckets as redis hashes, shared by every worker. A bucket expires
+    once it would have refilled anyway, so idle users cost nothing.
+    """
+
+    blocking = True  # A round-trip per take - coroutines run it off the event loop
+
+    def __init__(self, url: str, prefix: str = "detox:rate:"):
+        import redis  # Only needed when limits are shared
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._take = self.client.register_script(_TAKE_SCRIPT)
+
+    def take(self, key: str, rate: float, burst: float) -> bool:
+        return bool(self._take(keys=[self.prefix + key], args=[rate, burst]))
+
+
+class RateLimiter:
+    """
+    Per-provider and per-user token buckets.
+
+    ``limits`` maps provider name -> (tokens per second, burst); every user
+    additionally gets ``user_limit`` per provider. A provider without an
+    entry is unlimited.
+    """
+
+    def __init__(self, limits: dict, user_limit: tuple, backend=None):
+        self.limits = limits
+        self.user_limit = user_limit
+        self.backend = backend if backend is not None else MemoryBucketBackend()
+        self._lock = threading.Lock()
+        self._counts = {}  # (scope, provider, allowed) -> count
+        self.errors = 0
+
+    def _take(self, scope: str, provider: str, key: str, limit: tuple) -> bool:
+        try:
+            allowed = self.backend.take(key, *limit)
+        except Exception:
+            allowed = True  # A flaky limiter shouldn't take the integrations down with it
+            with self._lock:
+                self.errors += 1
+        with self._lock:
+            self._counts[scope, provider, allowed] = self._counts.get((scope, provider, allowed), 0) + 1
+        return allowed
+
+    def allow_user(self, provider: str, user: str) -> bool:
+        """Takes a token from user's bucket for provider."""
+        if provider not in self.limits:
+            return True
+        return self._take("user", provider, f"user:{provider}:{user}", self.user_limit)
+
+    def allow_provider(self, provider: str) -> bool:
+        """Takes a token from provider's shared bucket."""
+        if provider not in self.limits:
+            return True
+        return self._take("provider", provider, f"provider:{provider}", self.limits[provider])
+
+    def allow(self, provider: str, user: str = None) -> bool:
+        """Both: the user's bucket first, so an over-eager user doesn't drain everyone's budget."""
+        return (user is None or self.allow_user(provider, user)) and self.allow_provider(provider)
+
+    def check(self, provider: str, user: str = None) -> None:
+        """allow() for call sites with fallbacks: raises RateLimited when over the limit."""
+        if not self.allow(provider, user):
+            raise RateLimited(f"{provider} rate limit reached")
+
+    async def _off_loop(self, fn, *args) -> bool:
+        """fn(*args) from a coroutine: a blocking (redis) backend's takes go to a thread, not the event loop."""
+        if not getattr(self.backend, "blocking", False):
+            return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    async def allow_user_async(self, provider: str, user: str) -> bool:
+        """allow_user() for coroutines."""
+        return await self._off_loop(self.allow_user, provider, user)
+
+    async def check_async(self, provider: str, user: str = None) -> None:
+        """check() for coroutines."""
+        if not await self._off_loop(self.allow, provider, user):
+            raise RateLimited(f"{provider} rate limit reached")
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+            errors = self.errors
+        return {
+            "backend": type(self.backend).__name__,
+            "errors": errors,
+            "limits": {provider: {"rate": rate, "burst": burst} for provider, (rate, burst) in self.limits.items()},
+            "user_limit": {"rate": self.user_limit[0], "burst": self.user_limit[1]},
+            "allowed": {f"{scope}:{provider}": count for (scope, provider, allowed), count in counts.items() if allowed},
+            "limited": {f"{scope}:{provider}": count
+                        for (scope, provider, allowed), count in counts.items() if not allowed},
+        }
+
+
+class Coalescer:
+    """
+    Single-flight for outbound calls: while a call for ``key`` is in flight,
+    identical calls wait for its result (or its exception) instead of making
+    their own. Nothing is kept once the call finishes - that's the caches' job.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> Future shared by everyone waiting on it
+        self._async_calls = {}  # (event loop, key) -> asyncio.Future, the same for coroutines
+        self.calls = 0
+        self.coalesced = 0
+
+    def call(self, key, fn):
+        """Returns fn(), or the result of the identical call already in flight."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    async def call_async(self, key, fn):
+        """call() for a coroutine function, coalesced per event loop."""
+        slot = (asyncio.get_running_loop(), key)
+        future = self._async_calls.get(slot)
+        if future is not None:
+            with self._lock:
+                self.coalesced += 1
+            return await asyncio.shield(future)  # One waiter giving up mustn't cancel everyone's call
+        future = self._async_calls[slot] = slot[0].create_future()
+        with self._lock:
+            self.calls += 1
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Retrieved - nobody else may be waiting
+            raise
+        finally:
+            self._async_calls.pop(slot, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"calls": self.calls, "coalesced": self.coalesced,
+                    "in_flight": len(self._calls) + len(self._async_calls)}
+
+
+def _env_limit(prefix: str, rate: float, burst: float) -> tuple:
+    return (float(os.environ.get(f"{prefix}_RATE", rate)), float(os.environ.get(f"{prefix}_BURST", burst)))
+
+
+def bucket_backend_from_env():
+    """Redis when REDIS_URL is set (one budget for all workers), in-process buckets otherwise."""
+    url = os.environ.get("REDIS_URL")
+    return RedisBucketBackend(url) if url else MemoryBucketBackend()
+
+
+# Outbound budgets per integration: (tokens per second, burst). OpenAI costs real money, so it's the tightest.
+rate_limiter = RateLimiter(
+    limits={
+        "spotify": _env_limit("DETOX_SPOTIFY", 10.0, 20),
+        "fitbit": _env_limit("DETOX_FITBIT", 5.0, 10),
+        "openai": _env_limit("DETOX_OPENAI", 0.5, 4),
+    },
+    # Each user, per integration: a handful right away, then one every 10 seconds
+    user_limit=_env_limit("DETOX_USER", 0.1, 5),
+    backend=bucket_backend_from_env(),
+)
+
+# Identical outbound integration calls in flight, shared
+in_flight = Coalescer()
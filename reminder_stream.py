@@ -0,0 +1,267 @@
+"""
+Reminder Stream: mindful nudges, pushed to the browser 📣
+
+Web users can't see ``print()``, and making every open tab poll "any
+reminders yet?" would be the very screen habit we're trying to break. So
+reminders are pushed over Server-Sent Events instead.
+
+The SSE side is a tiny asyncio HTTP server running on its own event-loop
+thread. Each connected client costs a coroutine, a socket and a small
+queue - not a thread - so one process holds thousands of idle subscribers.
+The reminder scheduler (or anything else, from any thread) calls
+``publish(session_id, text)`` and the loop fans it out to every stream that
+session has open. Idle streams get a comment ping every so often so
+proxies don't hang up on them.
+
+With REDIS_URL set, publishes go through a redis channel and whichever
+process owns the SSE port delivers them. That way reminders fired in any
+gunicorn worker reach the client. Run the stream server in its own process
+with ``python reminder_stream.py`` in that setup.
+
+Streams are found by the session cookie, so only pages from the app's own
+host name - or the origins in DETOX_SSE_ALLOWED_ORIGINS, when the app is
+served from elsewhere - may open one cross-origin.
+"""
+import asyncio
+import json
+import os
+import threading
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs, urlsplit
+
+# Where the SSE server listens (the Flask app hands out this address)
+SSE_HOST = os.environ.get("DETOX_SSE_HOST", "0.0.0.0")
+SSE_PORT = int(os.environ.get("DETOX_SSE_PORT", "5001"))
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT_SECONDS = 15.0
+# Undelivered reminders kept per stream (a slow reader loses the oldest)
+QUEUE_SIZE = 16
+SESSION_COOKIE = "detox_sid"
+STREAM_PATH = "/reminders/stream"
+REDIS_CHANNEL = "detox:reminders"
+# Pages allowed to open a stream cross-origin (comma-separated, e.g. "https://detox.example").
+# Unset: only pages served from the stream's own host name (the Flask app on its usual port).
+ALLOWED_ORIGINS = {origin.strip().rstrip("/") for origin in
+                   os.environ.get("DETOX_SSE_ALLOWED_ORIGINS", "").split(",") if origin.strip()}
+
+
+def origin_allowed(origin: str, host: str) -> bool:
+    """Whether a page from origin may read reminders - which are personal, and found by cookie."""
+    if ALLOWED_ORIGINS:
+        return origin.rstrip("/") in ALLOWED_ORIGINS
+    return bool(host) and urlsplit(origin).hostname == urlsplit("//" + host).hostname
+
+
+class ReminderBroker:
+    """Session id -> open SSE streams, fed from any thread, served by one event loop."""
+
+    def __init__(self, redis_url: str = None):
+        self.redis_url = redis_url
+        self._subscribers = {}  # session id -> set of asyncio.Queue (only touched on the loop)
+        self._loop = None
+        self._thread = None
+        self._server = None
+        self._started = threading.Event()
+        self._lock = threading.Lock()
+        self._redis = None
+        self.address = None
+        self.start_error = None
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.connections = 0
+
+    # -- publishing (any thread) ---------------------------------------------
+
+    def publish(self, session_id: str, text: str, event: str = "reminder") -> None:
+        self.published += 1
+        if self.redis_url:
+            if self._redis is None:
+                import redis  # Only needed when reminders cross processes
+
+                self._redis = redis.Redis.from_url(self.redis_url)
+            self._redis.publish(REDIS_CHANNEL, json.dumps({"session": session_id, "event": event, "text": text}))
+        elif self._loop is not None:
+            self._loop.call_soon_threadsafe(self._deliver, session_id, event, text)
+
+    def _deliver(self, session_id: str, event: str, text: str) -> None:
+        frame = f"event: {event}\ndata: {json.dumps({'text': text})}\n\n".encode()
+        for queue in self._subscribers.get(session_id, ()):
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(frame)
+            self.delivered += 1
+
+    # -- server lifecycle ----------------------------------------------------
+
+    def start(self, host: str = SSE_HOST, port: int = SSE_PORT, timeout: float = 5.0) -> bool:
+        """
+        Starts the SSE server on a background event-loop thread (once).
+        Returns False if the port couldn't be bound - e.g. another worker
+        already serves it, which is fine when redis relays the reminders.
+        """
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, args=(host, port), name="reminder-stream",
+                                                daemon=True)
+                self._thread.start()
+        self._started.wait(timeout)
+        return self._server is not None
+
+    def _run(self, host: str, port: int) -> None:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            self._server = loop.run_until_complete(
+                asyncio.start_server(self._handle, host, port, backlog=4096, limit=16 * 1024))
+            self.address = self._server.sockets[0].getsockname()[:2]
+            if self.redis_url:
+                loop.create_task(self._relay())
+        except OSError as e:
+            self.start_error = str(e)
+            self._started.set()
+            loop.close()
+            return
+        self._loop = loop
+        self._started.set()
+        loop.run_forever()
+        loop.close()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Closes the server and every open stream."""
+        loop = self._loop
+        if loop is None:
+            return
+        self._loop = None
+        asyncio.run_coroutine_threadsafe(self._shutdown(), loop).result(timeout)
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join(timeout)
+
+    async def _shutdown(self) -> None:
+        self._server.close()
+        handlers = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in handlers:
+            task.cancel()
+        await asyncio.gather(*handlers, return_exceptions=True)
+
+    async def _relay(self) -> None:
+        """Forwards reminders published by other processes to our streams."""
+        import redis.asyncio
+
+        pubsub = redis.asyncio.Redis.from_url(self.redis_url).pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(REDIS_CHANNEL)
+        async for message in pubsub.listen():
+            try:
+                payload = json.loads(message["data"])
+                self._deliver(payload["session"], payload.get("event", "reminder"), payload["text"])
+            except (ValueError, KeyError, TypeError):
+                continue
+
+    # -- one client ----------------------------------------------------------
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            session_id, origin, host = await self._read_request(reader)
+        except (ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            session_id, origin, host = None, None, None
+        if not session_id:
+            writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            await self._close(writer)
+            return
+        if origin and not origin_allowed(origin, host):  # Someone else's page fishing with the user's cookie
+            writer.write(b"HTTP/1.1 403 Forbidden\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            await self._close(writer)
+            return
+
+        headers = ["HTTP/1.1 200 OK", "Content-Type: text/event-stream", "Cache-Control: no-cache",
+                   "Connection: keep-alive", "X-Accel-Buffering: no"]
+        if origin:  # The page lives on the Flask port, so this is a cross-origin request
+            headers += [f"Access-Control-Allow-Origin: {origin}", "Access-Control-Allow-Credentials: true",
+                        "Vary: Origin"]
+        writer.write(("\r\n".join(headers) + "\r\n\r\nretry: 5000\n\n").encode())
+
+        queue = asyncio.Queue(QUEUE_SIZE)
+        self._subscribers.setdefault(session_id, set()).add(queue)
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    frame = await asyncio.wait_for(queue.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    frame = b": ping\n\n"
+                writer.write(frame)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.connections -= 1
+            streams = self._subscribers.get(session_id)
+            if streams is not None:
+                streams.discard(queue)
+                if not streams:
+                    del self._subscribers[session_id]
+            await self._close(writer)
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader) -> tuple:
+        """(session id, Origin header, Host header) from the request head; no session id means 404."""
+        request_line = (await reader.readuntil(b"\r\n")).decode("latin-1")
+        method, target, _ = request_line.split(" ", 2)
+        headers = {}
+        while True:
+            line = (await reader.readuntil(b"\r\n")).decode("latin-1")
+            if line == "\r\n":
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        url = urlsplit(target)
+        if method != "GET" or url.path != STREAM_PATH:
+            return None, None, None
+        session_id = headers.get("x-session-id") or parse_qs(url.query).get("session", [None])[0]
+        if not session_id and "cookie" in headers:
+            morsel = SimpleCookie(headers["cookie"]).get(SESSION_COOKIE)
+            session_id = morsel.value if morsel else None
+        return session_id, headers.get("origin"), headers.get("host")
+
+    @staticmethod
+    async def _close(writer: asyncio.StreamWriter) -> None:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+
+    def stats(self) -> dict:
+        return {
+            "listening": list(self.address) if self.address else None,
+            "start_error": self.start_error,
+            "connections": self.connections,
+            "sessions": len(self._subscribers),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "relay": "redis" if self.redis_url else "local",
+        }
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def reminder_broker() -> ReminderBroker:
+    """The process-wide broker (relaying through redis when REDIS_URL is set)."""
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = ReminderBroker(os.environ.get("REDIS_URL"))
+        return _broker
+
+
+if __name__ == "__main__":
+    # Standalone stream server for multi-worker deployments (needs REDIS_URL to hear the workers)
+    broker = reminder_broker()
+    if not broker.start():
+        raise SystemExit(f"Could not listen on {SSE_HOST}:{SSE_PORT}: {broker.start_error}")
+    print(f"📣 Reminder stream on http://{broker.address[0]}:{broker.address[1]}{STREAM_PATH}")
+    threading.Event().wait()
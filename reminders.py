@@ -0,0 +1,166 @@
+"""
+Reminder Scheduler: one patient alarm clock for everybody ⏰
+
+Instead of every user getting their own thread that wakes up once a second
+to ask "is it time yet?", all reminders live in a single heap ordered by
+their next fire time. One thread sleeps until exactly the earliest one is
+due, fires it, and goes back to sleep - tens of thousands of users cost one
+thread and a few hundred bytes each.
+
+Adding or rescheduling is O(log n); cancelling marks the entry dead in O(1)
+and the heap quietly sweeps it out later.
+"""
+import heapq
+import itertools
+import threading
+import time
+
+# Rebuild the heap once more than this fraction of it is cancelled entries
+_COMPACT_RATIO = 0.5
+
+
+class _Reminder:
+    __slots__ = ("reminder_id", "interval", "callback", "next_at", "cancelled")
+
+    def __init__(self, reminder_id, interval: float, callback, next_at: float):
+        self.reminder_id = reminder_id
+        self.interval = interval
+        self.callback = callback
+        self.next_at = next_at
+        self.cancelled = False
+
+
+class ReminderScheduler:
+    """A heap of next-fire times served by one sleeping thread."""
+
+    def __init__(self):
+        self._heap = []  # (next_at, tiebreak, reminder)
+        self._reminders = {}  # reminder_id -> live _Reminder
+        self._tiebreak = itertools.count()
+        self._cancelled = 0
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        self.fired = 0
+        self.errors = 0
+
+    def add(self, reminder_id, interval_seconds: float, callback, first_in: float = None):
+        """
+        Calls callback() every interval_seconds (first after first_in seconds,
+        defaulting to one interval). Re-adding an existing id replaces it.
+        """
+        if interval_seconds <= 0:
+            raise ValueError("Reminder interval must be positive")
+        with self._condition:
+            self._cancel_locked(reminder_id)
+            delay = interval_seconds if first_in is None else first_in
+            reminder = _Reminder(reminder_id, interval_seconds, callback, time.monotonic() + delay)
+            self._reminders[reminder_id] = reminder
+            heapq.heappush(self._heap, (reminder.next_at, next(self._tiebreak), reminder))
+            self._ensure_thread()
+            # Wake the sleeper only if the new reminder jumped the queue
+            if self._heap[0][2] is reminder:
+                self._condition.notify()
+        return reminder_id
+
+    def cancel(self, reminder_id) -> bool:
+        """Stops a reminder. Returns False if it wasn't scheduled."""
+        with self._condition:
+            return self._cancel_locked(reminder_id)
+
+    def reschedule(self, reminder_id, interval_seconds: float, first_in: float = None) -> bool:
+        """Changes a reminder's interval, keeping its callback."""
+        with self._condition:
+            reminder = self._reminders.get(reminder_id)
+            if reminder is None:
+                return False
+            self.add(reminder_id, interval_seconds, reminder.callback, first_in)  # Condition is re-entrant
+            return True
+
+    def __len__(self) -> int:
+        return len(self._reminders)
+
+    def __contains__(self, reminder_id) -> bool:
+        return reminder_id in self._reminders
+
+    def stop(self) -> None:
+        """Stops the scheduler thread; pending reminders are dropped."""
+        with self._condition:
+            self._stopped = True
+            self._heap.clear()
+            self._reminders.clear()
+            self._condition.notify()
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                "scheduled": len(self._reminders),
+                "heap_size": len(self._heap),
+                "fired": self.fired,
+                "errors": self.errors,
+            }
+
+    # -- internals -------------------------------------------------------------
+
+    def _cancel_locked(self, reminder_id) -> bool:
+        reminder = self._reminders.pop(reminder_id, None)
+        if reminder is None:
+            return False
+        reminder.cancelled = True
+        self._cancelled += 1
+        if self._cancelled > len(self._heap) * _COMPACT_RATIO:
+            self._heap = [item for item in self._heap if not item[2].cancelled]
+            heapq.heapify(self._heap)
+            self._cancelled = 0
+        return True
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name="reminder-scheduler", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._stopped:
+                    while self._heap and self._heap[0][2].cancelled:
+                        heapq.heappop(self._heap)
+                        self._cancelled = max(0, self._cancelled - 1)
+                    if not self._heap:
+                        self._condition.wait()
+                        continue
+                    delay = self._heap[0][0] - time.monotonic()
+                    if delay <= 0:
+                        break
+                    self._condition.wait(delay)
+                if self._stopped:
+                    return
+                _, _, reminder = heapq.heappop(self._heap)
+                # Next slot on the original cadence, skipping any we slept through
+                now = time.monotonic()
+                reminder.next_at += reminder.interval
+                if reminder.next_at <= now:
+                    reminder.next_at = now + reminder.interval
+                heapq.heappush(self._heap, (reminder.next_at, next(self._tiebreak), reminder))
+                callback = reminder.callback
+
+            # Fire outside the lock so a chatty callback can't block add/cancel
+            try:
+                callback()
+                self.fired += 1
+            except Exception:
+                self.errors += 1
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def reminder_scheduler() -> ReminderScheduler:
+    """The process-wide scheduler shared by every user session."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = ReminderScheduler()
+        return _scheduler
@@ -0,0 +1,181 @@
+"""
+Resilience: knowing when to stop calling someone who never picks up 🔌✂️
+
+When an integration is slow or down, politely waiting out the full client
+timeout on every request just spreads the misery. A ``CircuitBreaker`` per
+provider watches for repeated failures and slow calls, then "opens" and
+fails instantly - so callers serve their analog fallback right away. After
+``reset_timeout`` seconds one probe call is let through (half-open); if it
+succeeds, normal service resumes.
+
+Every call also runs under an explicit latency deadline, so no single
+request can wait longer than its budget, however sick the dependency is.
+Coroutines get the same treatment through ``call_async`` - same breaker
+state, no thread needed to watch the clock.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Threads that actually wait on the network while callers watch the clock
+_deadline_pool = ThreadPoolExecutor(max_workers=int(os.environ.get("DETOX_PROVIDER_THREADS", "16")),
+                                    thread_name_prefix="provider-call")
+
+
+class CircuitOpenError(Exception):
+    """The provider is known to be unhealthy; we didn't even try."""
+
+
+class DeadlineExceeded(Exception):
+    """The provider didn't answer within its latency budget."""
+
+
+class CircuitBreaker:
+    """
+    Per-provider failure detector with closed / open / half-open states.
+
+    A call counts against the provider when it raises, misses its deadline,
+    or succeeds slower than ``slow_call_threshold`` seconds.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, slow_call_threshold: float = 1.0,
+                 reset_timeout: float = 30.0, deadline: float = 2.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_threshold = slow_call_threshold
+        self.reset_timeout = reset_timeout
+        self.deadline = deadline
+        self.state = CLOSED
+        self._lock = threading.Lock()
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.calls = 0
+        self.failures = 0
+        self.slow_calls = 0
+        self.timeouts = 0
+        self.short_circuited = 0
+        self.times_opened = 0
+
+    def _allow(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True  # Exactly one probe at a time
+                return True
+            self.short_circuited += 1
+            return False
+
+    def _record(self, ok: bool, slow: bool = False, timed_out: bool = False) -> None:
+        with self._lock:
+            self.calls += 1
+            self.slow_calls += slow
+            self.timeouts += timed_out
+            if ok and not slow:
+                self._consecutive_failures = 0
+                if self.state == HALF_OPEN:
+                    self.state = CLOSED
+                self._probe_in_flight = False
+                return
+            self.failures += 1
+            self._consecutive_failures += 1
+            if self.state == HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.times_opened += 1
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def call(self, fn, *args, deadline: float = None, **kwargs):
+        """
+        Runs fn under the breaker and a latency deadline.
+        Raises CircuitOpenError, DeadlineExceeded or fn's own exception -
+        callers keep their existing try/except fallbacks.
+        """
+        if not self._allow():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+        budget = self.deadline if deadline is None else deadline
+        started = time.monotonic()
+        future = _deadline_pool.submit(fn, *args, **kwargs)
+        try:
+            result = future.result(timeout=budget)
+        except FutureTimeoutError:
+            future.cancel()  # Only helps if it never started; otherwise it finishes unobserved
+            self._record(False, timed_out=True)
+            raise DeadlineExceeded(f"{self.name} took longer than {budget:.1f}s")
+        except Exception:
+            self._record(False)
+            raise
+        self._record(True, slow=time.monotonic() - started > self.slow_call_threshold)
+        return result
+
+    async def call_async(self, fn, *args, deadline: float = None, **kwargs):
+        """call() for coroutine functions: awaited on the caller's event loop, cancelled at the deadline."""
+        if not self._allow():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+        budget = self.deadline if deadline is None else deadline
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(fn(*args, **kwargs), budget)
+        except asyncio.TimeoutError:
+            self._record(False, timed_out=True)
+            raise DeadlineExceeded(f"{self.name} took longer than {budget:.1f}s")
+        except asyncio.CancelledError:
+            with self._lock:
+                self._probe_in_flight = False  # Our caller gave up - not the provider's fault
+            raise
+        except Exception:
+            self._record(False)
+            raise
+        self._record(True, slow=time.monotonic() - started > self.slow_call_threshold)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "calls": self.calls,
+                "failures": self.failures,
+                "slow_calls": self.slow_calls,
+                "timeouts": self.timeouts,
+                "short_circuited": self.short_circuited,
+                "times_opened": self.times_opened,
+            }
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.environ.get(name, default))
+
+
+# One breaker per integration; deadlines are env-tunable per provider
+breakers = {
+    name: CircuitBreaker(
+        name,
+        failure_threshold=int(os.environ.get("DETOX_BREAKER_FAILURES", "5")),
+        slow_call_threshold=_env_float(f"DETOX_{name.upper()}_SLOW", slow),
+        reset_timeout=_env_float("DETOX_BREAKER_RESET", 30.0),
+        deadline=_env_float(f"DETOX_{name.upper()}_DEADLINE", deadline),
+    )
+    for name, slow, deadline in (
+        ("spotify", 1.0, 1.5),
+        ("fitbit", 1.0, 1.5),
+        ("openai", 2.0, 4.0),
+    )
+}
+
+
+def breaker_stats() -> dict:
+    return {name: breaker.stats() for name, breaker in breakers.items()}
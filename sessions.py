@@ -0,0 +1,217 @@
+"""
+Session Store: everybody gets their own digital wellness journey 🗂️
+
+Per-user state (name, goal, interaction count, activity history...) lives
+here, keyed by session or user id, instead of on one assistant shared by the
+whole server. Two interchangeable backends:
+
+* ``InMemorySessionStore`` - a dict with striped locks and idle eviction.
+  Each state is kept as compact JSON bytes (a few hundred bytes per user)
+  rather than a live object graph. Perfect for the CLI or a single worker.
+* ``RedisSessionStore`` - JSON blobs in redis with optimistic (WATCH/MULTI)
+  transactions and sliding expiry. Any worker can serve any request, so no
+  sticky sessions are needed.
+
+Both expose the same small API: ``get``, ``peek`` (a read that doesn't
+count as activity), ``update`` (atomic read-modify-write), ``delete``, ``__len__`` and ``iter_states`` (every
+session, resumable from a cursor - for exports). State is a plain dict; the
+store doesn't care what's inside.
+"""
+import bisect
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+# Sessions untouched for this long are evicted (seconds)
+IDLE_TIMEOUT = int(os.environ.get("DETOX_SESSION_IDLE_TIMEOUT", str(30 * 60)))
+# Hard cap for the in-memory backend - oldest-idle sessions go first
+MAX_SESSIONS = int(os.environ.get("DETOX_MAX_SESSIONS", "100000"))
+
+_LOCK_STRIPES = 64
+
+
+class InMemorySessionStore:
+    """
+    Sessions in a process-local dict, most recently used last.
+
+    ``update`` holds a per-session lock (one of 64 stripes) while the update
+    function runs, so two requests for the same user can't interleave.
+    Different users can share a stripe, so update functions must stay quick
+    and stay off the network - then neighbours only ever wait microseconds.
+    """
+
+    def __init__(self, idle_timeout: float = IDLE_TIMEOUT, max_sessions: int = MAX_SESSIONS):
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()  # session id -> (last_access, encoded state)
+        self._lock = threading.Lock()
+        self._stripes = [threading.Lock() for _ in range(_LOCK_STRIPES)]
+        self.evictions = 0
+
+    def _stripe(self, session_id: str) -> threading.Lock:
+        return self._stripes[zlib.crc32(session_id.encode()) % _LOCK_STRIPES]
+
+    def get(self, session_id: str):
+        """Returns a copy of the session's state, or None if it doesn't exist."""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] > self.idle_timeout:
+                del self._sessions[session_id]
+                self.evictions += 1
+                return None
+            self._sessions[session_id] = (time.monotonic(), entry[1])
+            self._sessions.move_to_end(session_id)
+            return json.loads(entry[1])
+
+    def peek(self, session_id: str):
+        """get() for background readers: doesn't reset the session's idle timer."""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None or time.monotonic() - entry[0] > self.idle_timeout:
+                return None
+            return json.loads(entry[1])
+
+    def update(self, session_id: str, fn) -> dict:
+        """
+        Atomically replaces the session's state with fn(state) and returns it.
+        fn receives a private copy ({} for a new session) and may mutate it;
+        it runs under a lock other sessions share, so keep it quick (no I/O).
+        """
+        with self._stripe(session_id):
+            state = fn(self.get(session_id) or {})
+            encoded = json.dumps(state, separators=(",", ":")).encode()
+            with self._lock:
+                self._sessions[session_id] = (time.monotonic(), encoded)
+                self._sessions.move_to_end(session_id)
+                self._evict_locked()
+            return state
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def iter_states(self, cursor: str = None):
+        """
+        Yields (session_id, state, cursor) for every live session in id
+        order, without touching them - an export isn't activity. Pass a
+        yielded cursor back in to carry on right after that session.
+        Holds a sorted snapshot of the ids (references, not states) while
+        it runs; states are decoded one at a time.
+        """
+        with self._lock:
+            ids = sorted(self._sessions)
+        deadline = time.monotonic() - self.idle_timeout
+        for index in range(bisect.bisect_right(ids, cursor) if cursor else 0, len(ids)):
+            with self._lock:
+                entry = self._sessions.get(ids[index])
+            if entry is None or entry[0] <= deadline:
+                continue  # Gone (or as good as) since the snapshot
+            yield ids[index], json.loads(entry[1]), ids[index]
+
+    def evict_idle(self) -> int:
+        """Drops idle sessions now; returns how many went."""
+        with self._lock:
+            return self._evict_locked()
+
+    def _evict_locked(self) -> int:
+        evicted = 0
+        deadline = time.monotonic() - self.idle_timeout
+        while self._sessions:
+            session_id, (last_access, _) = next(iter(self._sessions.items()))
+            if last_access > deadline and len(self._sessions) <= self.max_sessions:
+                break
+            del self._sessions[session_id]
+            evicted += 1
+        self.evictions += evicted
+        return evicted
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "sessions": len(self), "evictions": self.evictions}
+
+
+class RedisSessionStore:
+    """
+    Sessions as JSON strings in redis, shared by every worker and host.
+    Each write refreshes the key's expiry, so redis does the idle eviction.
+    """
+
+    def __init__(self, url: str, idle_timeout: float = IDLE_TIMEOUT, prefix: str = "detox:session:"):
+        import redis  # Only needed when sessions are shared
+
+        self.client = redis.Redis.from_url(url)
+        self.idle_timeout = int(idle_timeout)
+        self.prefix = prefix
+
+    def get(self, session_id: str):
+        key = self.prefix + session_id
+        pipe = self.client.pipeline()
+        pipe.get(key)
+        pipe.expire(key, self.idle_timeout)
+        raw, _ = pipe.execute()
+        return json.loads(raw) if raw is not None else None
+
+    def peek(self, session_id: str):
+        """get() for background readers: no expiry refresh."""
+        raw = self.client.get(self.prefix + session_id)
+        return json.loads(raw) if raw is not None else None
+
+    def update(self, session_id: str, fn) -> dict:
+        """
+        Optimistic transaction: WATCH the key, apply fn, MULTI/EXEC - and
+        retry from the top if another worker changed the session meanwhile.
+        fn may therefore run more than once, so keep it side-effect free.
+        """
+        key = self.prefix + session_id
+        result = {}
+
+        def apply(pipe):
+            raw = pipe.get(key)
+            state = fn(json.loads(raw) if raw is not None else {})
+            pipe.multi()
+            pipe.set(key, json.dumps(state, separators=(",", ":")), ex=self.idle_timeout)
+            result["state"] = state
+
+        self.client.transaction(apply, key)
+        return result["state"]
+
+    def delete(self, session_id: str) -> None:
+        self.client.delete(self.prefix + session_id)
+
+    def iter_states(self, cursor: str = None, count: int = 500):
+        """
+        Yields (session_id, state, cursor) for every session: one SCAN page
+        and one MGET per ``count`` keys, no expiry refresh. A row's cursor
+        is the SCAN cursor its page started from, so resuming re-emits that
+        whole page: rows may repeat, but (as SCAN guarantees) no session
+        that existed throughout is ever skipped.
+        """
+        scan_cursor = int(cursor) if cursor else 0
+        while True:
+            next_cursor, keys = self.client.scan(scan_cursor, match=self.prefix + "*", count=count)
+            values = self.client.mget(keys) if keys else []
+            for key, raw in zip(keys, values):
+                if raw is not None:  # Expired between SCAN and MGET
+                    yield key.decode()[len(self.prefix):], json.loads(raw), str(scan_cursor)
+            if next_cursor == 0:
+                return
+            scan_cursor = next_cursor
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.client.scan_iter(self.prefix + "*"))
+
+    def stats(self) -> dict:
+        return {"backend": "redis", "sessions": len(self)}
+
+
+def session_store_from_env():
+    """Redis when REDIS_URL is set (scale out freely), in-memory otherwise."""
+    url = os.environ.get("REDIS_URL")
+    return RedisSessionStore(url) if url else InMemorySessionStore()
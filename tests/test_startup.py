@@ -0,0 +1,26 @@
+"""
+Cold start guard: the first menu stays fast and the heavy libraries stay lazy ⏱️
+
+Runs the same measurement as ``benchmarks/startup.py`` (a fresh interpreter
+importing ``main`` up to the first menu) and fails instead of printing a
+table. The budget is ``DETOX_STARTUP_BUDGET_MS`` (400 ms by default).
+"""
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from startup import HEAVY_MODULES, STARTUP_BUDGET_MS, measure_once  # noqa: E402
+
+# Median over a few runs, so one slow process start doesn't fail the build
+RUNS = 3
+
+
+def test_startup_imports_no_heavy_modules():
+    assert measure_once()["heavy_loaded"] == [], f"expected none of {HEAVY_MODULES} before first use"
+
+
+def test_startup_within_budget():
+    to_menu = statistics.median(measure_once()["to_menu_ms"] for _ in range(RUNS))
+    assert to_menu <= STARTUP_BUDGET_MS, f"cold start to first menu took {to_menu:.1f} ms"
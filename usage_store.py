@@ -0,0 +1,284 @@
+"""
+Usage Store: screen time, filed by the minute, hour and day 🗃️
+
+Every (user, app) pair gets three fixed-size ring buffers of float32
+seconds - the last couple of hours by minute, the last week by hour and the
+last year by day - plus one more set for the user's total across apps.
+Rings are stdlib ``array``s indexed by absolute bucket number, so adding an
+event is a modulo and an add, and every report question ("7-day average?",
+"how long is the streak?", "when do I scroll most?") is a handful of C-speed
+slice sums over at most a year of day buckets. Report cost depends on the
+ring sizes, never on how many events someone has sent us.
+
+Persistence is an append-only file of fixed 16-byte records (user id, app
+id, local minute, seconds) next to a small append-only names file. On start
+the record file is memory-mapped and replayed straight into the rings;
+a torn record at the tail (crash mid-write) is trimmed off.
+
+Each process keeps its own rings, so with several gunicorn workers point
+ingestion at one of them (or give each worker its own file).
+
+A series costs a few KB, so each user gets at most ``MAX_APPS_PER_USER``
+apps of their own - anything beyond that is folded into "(other)" - and
+users whose session is gone can be dropped with ``forget_missing``.
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+
+MINUTE_SLOTS = 120  # Two hours of minutes
+HOUR_SLOTS = 7 * 24  # A week of hours
+DAY_SLOTS = 366  # A year of days
+
+# Where the store persists itself (unset: memory only)
+STORE_PATH = os.environ.get("DETOX_USAGE_STORE")
+
+# Apps tracked separately per user; later ones share the OTHER_APP series (one series is ~2.6 KB)
+MAX_APPS_PER_USER = int(os.environ.get("DETOX_USAGE_MAX_APPS", "32"))
+OTHER_APP = "(other)"
+
+# user id, app id, local minute since the epoch, seconds
+_RECORD = struct.Struct("<IIIf")
+_TOTAL = ""  # Pseudo-app holding a user's total across apps (ingest never accepts an empty name)
+
+
+def local_minute(ts: float) -> int:
+    """Minutes since the epoch in local time, so day buckets break at local midnight."""
+    return int((ts + time.localtime(ts).tm_gmtoff) // 60)
+
+
+class _Ring:
+    """Fixed-size window of buckets ending at the newest bucket seen."""
+
+    __slots__ = ("values", "head")
+
+    def __init__(self, size: int):
+        self.values = array("f", bytes(4 * size))
+        self.head = None  # Absolute number of the newest bucket
+
+    def add(self, bucket: int, amount: float) -> None:
+        size = len(self.values)
+        if self.head is None:
+            self.head = bucket
+        elif bucket > self.head:
+            if bucket - self.head >= size:
+                self.values = array("f", bytes(4 * size))
+            else:
+                for skipped in range(self.head + 1, bucket + 1):  # Clear the slots we're lapping
+                    self.values[skipped % size] = 0.0
+            self.head = bucket
+        elif bucket <= self.head - size:
+            return  # Older than this resolution remembers
+        self.values[bucket % size] += amount
+
+    def window(self, end: int, count: int) -> list:
+        """Values for buckets end-count+1 .. end (oldest first); unknown buckets are 0."""
+        size = len(self.values)
+        count = min(count, size)
+        if self.head is None or end - count >= self.head:
+            return [0.0] * count
+        padding = max(0, end - self.head)  # Future buckets we haven't seen yet
+        known = count - padding
+        oldest_kept = self.head - size + 1
+        start = end - padding - known + 1
+        lost = max(0, oldest_kept - start)  # Buckets already lapped by the ring
+        start += lost
+        if start > end - padding:
+            return [0.0] * count
+        first, last = start % size, (end - padding) % size
+        values = self.values[first:last + 1] if first <= last else self.values[first:] + self.values[:last + 1]
+        return [0.0] * lost + values.tolist() + [0.0] * padding
+
+
+class _Series:
+    __slots__ = ("minutes", "hours", "days", "first_day")
+
+    def __init__(self):
+        self.minutes = _Ring(MINUTE_SLOTS)
+        self.hours = _Ring(HOUR_SLOTS)
+        self.days = _Ring(DAY_SLOTS)
+        self.first_day = None
+
+    def add(self, minute: int, seconds: float) -> None:
+        day = minute // 1440
+        self.minutes.add(minute, seconds)
+        self.hours.add(minute // 60, seconds)
+        self.days.add(day, seconds)
+        if self.first_day is None or day < self.first_day:
+            self.first_day = day
+
+
+class UsageStore:
+    """Per-user, per-app usage rings with an append-only on-disk journal."""
+
+    def __init__(self, path: str = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._series = {}  # user -> {app -> _Series}, app '' is the total
+        self._names = []  # id -> name
+        self._ids = {}  # name -> id
+        self._records = None
+        self._names_file = None
+        self.records_loaded = 0
+        if path:
+            self._open(path)
+
+    # -- persistence ---------------------------------------------------------
+
+    def _open(self, path: str) -> None:
+        names_path = path + ".names"
+        if os.path.exists(names_path):
+            with open(names_path, encoding="utf-8") as f:
+                for line in f:
+                    if line.endswith("\n"):  # A torn last line never got records written against it
+                        self._intern_loaded(json.loads(line))
+        self._names_file = open(names_path, "a", encoding="utf-8")
+
+        self._records = open(path, "a+b")
+        size = os.fstat(self._records.fileno()).st_size
+        usable = size - size % _RECORD.size
+        if usable != size:
+            self._records.truncate(usable)
+        if usable:
+            with mmap.mmap(self._records.fileno(), usable, access=mmap.ACCESS_READ) as mapped:
+                for user_id, app_id, minute, seconds in _RECORD.iter_unpack(memoryview(mapped)):
+                    self._add_locked(self._names[user_id], self._names[app_id], minute, seconds)
+                    self.records_loaded += 1
+
+    def _intern_loaded(self, name: str) -> None:
+        self._ids[name] = len(self._names)
+        self._names.append(name)
+
+    def _intern(self, name: str) -> int:
+        """Name -> id, journaling new names before any record can point at them."""
+        name_id = self._ids.get(name)
+        if name_id is None:
+            name_id = len(self._names)
+            self._intern_loaded(name)
+            if self._names_file is not None:
+                self._names_file.write(json.dumps(name) + "\n")
+                self._names_file.flush()
+        return name_id
+
+    def close(self) -> None:
+        with self._lock:
+            for f in (self._records, self._names_file):
+                if f is not None:
+                    f.close()
+            self._records = self._names_file = None
+
+    # -- writes ----------------------------------------------------------------
+
+    def _add_locked(self, user: str, app: str, minute: int, seconds: float) -> str:
+        """Adds to the user's app and total series; returns the app name it was filed under."""
+        apps = self._series.get(user)
+        if apps is None:
+            apps = self._series[user] = {_TOTAL: _Series()}
+        series = apps.get(app)
+        if series is None:
+            if len(apps) - (OTHER_APP in apps) > MAX_APPS_PER_USER:  # The total doesn't count
+                app = OTHER_APP
+                series = apps.get(app)
+            if series is None:
+                series = apps[app] = _Series()
+        series.add(minute, seconds)
+        apps[_TOTAL].add(minute, seconds)
+        return app
+
+    def add_batch(self, user: str, events) -> None:
+        """Records (ts, app, seconds) events for one user - one journal write per batch."""
+        with self._lock:
+            user_id = self._intern(user)
+            chunk = bytearray()
+            for ts, app, seconds in events:
+                minute = local_minute(ts)
+                app = self._add_locked(user, app, minute, seconds)  # Journal the folded name, not the flood
+                if self._records is not None:
+                    chunk += _RECORD.pack(user_id, self._intern(app), minute, seconds)
+            if chunk:
+                self._records.write(chunk)
+                self._records.flush()
+
+    def forget(self, user: str) -> None:
+        """Drops a user's rings (their journal records stay, and come back on restart)."""
+        with self._lock:
+            self._series.pop(user, None)
+
+    def forget_missing(self, alive) -> int:
+        """Drops every user for whom alive(user) is false - e.g. whose session expired. Returns how many."""
+        with self._lock:
+            users = list(self._series)
+        gone = [user for user in users if not alive(user)]
+        for user in gone:
+            self.forget(user)
+        return len(gone)
+
+    # -- reads -----------------------------------------------------------------
+
+    def __contains__(self, user: str) -> bool:
+        return user in self._series
+
+    def report(self, user: str, goal_hours: float = None, now: float = None) -> dict:
+        """
+        Rolling-window numbers for the wellness report, or None without data:
+        today, last hour, 7-day average, peak hour of day, top apps this week
+        and - given a goal - the streak of days at or under it.
+        """
+        minute = local_minute(time.time() if now is None else now)
+        hour, today = minute // 60, minute // 1440
+        with self._lock:
+            apps = self._series.get(user)
+            if apps is None:
+                return None
+            total = apps[_TOTAL]
+            week = total.days.window(today, 7)
+            last_hour = sum(total.minutes.window(minute, 60))
+            hours = total.hours.window(hour, HOUR_SLOTS)
+            by_app = {app: sum(series.days.window(today, 7)) for app, series in apps.items() if app != _TOTAL}
+            streak = 0
+            if goal_hours is not None:
+                tracked = today - total.first_day + 1
+                for seconds in reversed(total.days.window(today, min(tracked, DAY_SLOTS))):
+                    if seconds > goal_hours * 3600:
+                        break
+                    streak += 1
+
+        by_hour_of_day = [0.0] * 24
+        for offset, seconds in enumerate(hours):
+            by_hour_of_day[(hour - len(hours) + 1 + offset) % 24] += seconds
+        top_apps = sorted(by_app.items(), key=lambda item: item[1], reverse=True)[:3]
+        return {
+            "today_hours": week[-1] / 3600,
+            "last_hour_minutes": last_hour / 60,
+            "seven_day_average_hours": sum(week) / 7 / 3600,
+            "peak_hour": max(range(24), key=by_hour_of_day.__getitem__) if any(by_hour_of_day) else None,
+            "top_apps": [(app, seconds / 3600) for app, seconds in top_apps if seconds > 0],
+            "streak_days": streak if goal_hours is not None else None,
+        }
+
+    def stats(self) -> dict:
+        with self._lock:  # Ingests add users and apps concurrently - count a consistent copy
+            sizes = [len(apps) for apps in self._series.values()]
+        return {
+            "users": len(sizes),
+            "series": sum(sizes),
+            "records_loaded": self.records_loaded,
+            "persistent": self.path is not None,
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def usage_store() -> UsageStore:
+    """The process-wide usage store (journaled to DETOX_USAGE_STORE when set)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = UsageStore(STORE_PATH)
+        return _store
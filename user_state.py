@@ -0,0 +1,155 @@
+"""
+User State: everything we know about one person, packed light 🎒
+
+At tens of thousands of sessions, per-user overhead adds up fast. So the
+per-user record uses ``__slots__`` (no per-instance ``__dict__``), static
+content lives once per process in the content catalog, and the activity
+history is a fixed-size ring buffer. The ring keeps only the most recent
+titles, but its counters remember *everything* - the "Mindful Moments"
+number stays exact no matter how long someone has been at it.
+"""
+import os
+
+# How many recent activity titles each user keeps around
+ACTIVITY_HISTORY_CAPACITY = int(os.environ.get("DETOX_ACTIVITY_HISTORY", "20"))
+
+
+class ActivityLog:
+    """
+    Fixed-capacity ring of recent activity titles plus lifetime counters.
+
+    ``len()`` and iteration cover the retained titles (oldest first);
+    ``total`` and ``by_title`` count every activity ever appended.
+    """
+
+    __slots__ = ("_items", "_next", "_retained", "total", "by_title")
+
+    def __init__(self, capacity: int = ACTIVITY_HISTORY_CAPACITY):
+        self._items = [None] * capacity
+        self._next = 0  # Slot the next title goes into
+        self._retained = 0  # Filled slots - usually min(total, capacity), but not for a restored ring
+        self.total = 0
+        self.by_title = {}
+
+    @property
+    def capacity(self) -> int:
+        return len(self._items)
+
+    def append(self, title: str) -> None:
+        self._items[self._next] = title
+        self._next = (self._next + 1) % len(self._items)
+        self._retained = min(self._retained + 1, len(self._items))
+        self.total += 1
+        self.by_title[title] = self.by_title.get(title, 0) + 1
+
+    def __len__(self) -> int:
+        return self._retained
+
+    def __iter__(self):
+        retained = len(self)
+        start = (self._next - retained) % len(self._items)
+        for offset in range(retained):
+            yield self._items[(start + offset) % len(self._items)]
+
+    def to_dict(self) -> dict:
+        return {"recent": list(self), "total": self.total, "by_title": dict(self.by_title)}
+
+    @classmethod
+    def from_dict(cls, data, capacity: int = ACTIVITY_HISTORY_CAPACITY) -> "ActivityLog":
+        """Accepts the dict form, or a plain list of titles from older sessions."""
+        log = cls(capacity)
+        if isinstance(data, list):
+            for title in data:
+                log.append(title)
+            return log
+        recent = data.get("recent", [])[-capacity:]
+        for title in recent:
+            log._items[log._next] = title
+            log._next = (log._next + 1) % capacity
+        # Saved under a smaller DETOX_ACTIVITY_HISTORY? Then only those titles are retained, however many there were
+        log._retained = len(recent)
+        log.total = max(data.get("total", 0), len(recent))
+        log.by_title = dict(data.get("by_title", {}))
+        return log
+
+
+class ScreenTimeTally:
+    """
+    Running screen-time totals fed by ingested usage events.
+
+    Updated incrementally as events arrive, so "how am I doing today?" is a
+    couple of attribute reads, however many events came in. Days are local
+    calendar days (``date.toordinal()``); late events for an earlier day
+    still count towards the lifetime total.
+    """
+
+    __slots__ = ("day", "today_seconds", "total_seconds", "events")
+
+    def __init__(self):
+        self.day = 0  # Ordinal of the day today_seconds belongs to
+        self.today_seconds = 0.0
+        self.total_seconds = 0.0
+        self.events = 0
+
+    def add(self, day: int, seconds: float, events: int = 1) -> None:
+        if day > self.day:
+            self.day, self.today_seconds = day, 0.0
+        if day == self.day:
+            self.today_seconds += seconds
+        self.total_seconds += seconds
+        self.events += events
+
+    def hours_on(self, day: int) -> float:
+        return self.today_seconds / 3600 if day == self.day else 0.0
+
+    def to_dict(self) -> dict:
+        return {"day": self.day, "today_seconds": self.today_seconds,
+                "total_seconds": self.total_seconds, "events": self.events}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ScreenTimeTally":
+        tally = cls()
+        for field in cls.__slots__:
+            if field in data:
+                setattr(tally, field, data[field])
+        return tally
+
+
+class UserState:
+    """One user's digital vital signs - and nothing else."""
+
+    __slots__ = ("user_name", "screen_time_goal", "reminder_interval",
+                 "interaction_count", "last_mood", "activities", "screen_time")
+
+    def __init__(self):
+        self.user_name = None  # Your digital identity (minus the @ symbol)
+        self.screen_time_goal = None  # The user's ambitious screen time target
+        self.reminder_interval = None  # How often we'll gently nudge (not nag!)
+        self.interaction_count = 0  # Counting conversations (cheaper than therapy!)
+        self.last_mood = "neutral"  # Because even chatbots have feelings
+        self.activities = ActivityLog()  # The chronicles of your digital detox journey
+        self.screen_time = ScreenTimeTally()  # Measured, not guessed (see ingest)
+
+    def to_dict(self) -> dict:
+        return {
+            "user_name": self.user_name,
+            "screen_time_goal": self.screen_time_goal,
+            "reminder_interval": self.reminder_interval,
+            "interaction_count": self.interaction_count,
+            "last_mood": self.last_mood,
+            "activity_history": self.activities.to_dict(),
+            "screen_time": self.screen_time.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "UserState":
+        """Restores a record; missing fields keep their defaults."""
+        state = cls()
+        for field in ("user_name", "screen_time_goal", "reminder_interval", "interaction_count", "last_mood"):
+            if field in data:
+                setattr(state, field, data[field])
+        if "activity_history" in data:
+            state.activities = ActivityLog.from_dict(data["activity_history"])
+        if "screen_time" in data:
+            state.screen_time = ScreenTimeTally.from_dict(data["screen_time"])
+        return state